@@ -7,6 +7,7 @@ import pandas as pd
 from server.services.search_console import SearchConsoleService
 from server.services.similarity import SimilarityAnalyzer
 from server.services.scraper import WebScraper
+from server.services.upload_reader import read_content_file, format_content_data
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -18,10 +19,16 @@ app = Flask(__name__,
 app.secret_key = os.getenv('SECRET_KEY', 'dev_key')
 CORS(app)
 
-# Initialiser les services
-search_console_service = SearchConsoleService()
-similarity_analyzer = SimilarityAnalyzer()
-web_scraper = WebScraper()
+# Initialiser les services, sauf dans les processus de calcul du mode 'process': lancés en
+# 'spawn', ils ré-exécutent ce module sous le nom __mp_main__ et n'ont pas besoin du modèle
+if __name__ != '__mp_main__':
+    search_console_service = SearchConsoleService()
+    similarity_analyzer = SimilarityAnalyzer()
+    # Texte du corps des pages extrait seulement s'il est encodé (embeddings par passages)
+    web_scraper = WebScraper(
+        extract_content=similarity_analyzer.content_mode == 'passages',
+        max_content_words=similarity_analyzer.max_page_tokens
+    )
 
 @app.route('/')
 def index():
@@ -109,7 +116,7 @@ def analyze_search_console():
     
     # Ajouter les données scrapées aux résultats si elles existent
     if scraped_data:
-        results['scraped_data'] = scraped_data
+        results['scraped_data'] = WebScraper.without_content(scraped_data)
     
     return jsonify(results)
 
@@ -165,144 +172,14 @@ def analyze_csv():
         # Convertir le DataFrame en format attendu par le service d'analyse
         keywords_data = df.to_dict('records')
         
-        # Traiter le fichier de contenu s'il est fourni
-        content_data = None
+        # Utiliser le fichier de contenu s'il est fourni (même lecture que l'API FastAPI)
+        scraped_data = None
         if 'content_file' in request.files and request.files['content_file'].filename != '':
-            content_file = request.files['content_file']
-            
-            # Si un fichier de contenu est fourni, activer l'analyse de contenu
-            scrape_pages = True
-            
-            # Lire avec pandas
+            print("Utilisation des données de contenu fournies...")
             try:
-                encodings_to_try = ['latin1', 'utf-8', 'cp1252', 'iso-8859-1', 'utf-16']
-                success = False
-                
-                # Essayer différents séparateurs et encodages, en commençant par ";" qui est le séparateur mentionné par l'utilisateur
-                separators = [';']  # Prioriser le séparateur ";"
-                
-                for sep in separators:
-                    if success:
-                        break
-                        
-                    for encoding in encodings_to_try:
-                        try:
-                            # Ajouter on_bad_lines='skip' pour ignorer les lignes problématiques
-                            content_df = pd.read_csv(content_file, encoding=encoding, sep=sep, on_bad_lines='skip')
-                            print(f"Fichier de contenu CSV lu avec succès en utilisant l'encodage {encoding} et le séparateur '{sep}'")
-                            success = True
-                            break
-                        except Exception as e:
-                            print(f"Échec de lecture avec l'encodage {encoding} et le séparateur '{sep}': {str(e)}")
-                
-                if not success:
-                    # Essayer d'autres séparateurs si ";" ne fonctionne pas
-                    separators = [',', '\t']
-                    for sep in separators:
-                        if success:
-                            break
-                            
-                        for encoding in encodings_to_try:
-                            try:
-                                # Ajouter on_bad_lines='skip' pour ignorer les lignes problématiques
-                                content_df = pd.read_csv(content_file, encoding=encoding, sep=sep, on_bad_lines='skip')
-                                print(f"Fichier de contenu CSV lu avec succès en utilisant l'encodage {encoding} et le séparateur '{sep}'")
-                                success = True
-                                break
-                            except Exception as e:
-                                print(f"Échec de lecture avec l'encodage {encoding} et le séparateur '{sep}': {str(e)}")
-                    
-                    if not success:
-                        # Dernière tentative avec des options plus permissives
-                        try:
-                            content_df = pd.read_csv(content_file, encoding='latin1', sep=None, engine='python', on_bad_lines='skip')
-                            print("Fichier de contenu CSV lu avec l'encodage latin1 et détection automatique du séparateur")
-                            success = True
-                        except Exception as final_e:
-                            return jsonify({'error': f"Impossible de lire le fichier de contenu CSV avec aucun encodage ou séparateur connu. Erreur: {str(final_e)}"}), 400
-            
-            except Exception as e:
+                scraped_data = format_content_data(read_content_file(request.files['content_file'].stream))
+            except ValueError as e:
                 return jsonify({'error': str(e)}), 400
-            
-            # Vérifier que le fichier a au moins les colonnes url et content
-            if "url" not in content_df.columns or not any(col.startswith("content") for col in content_df.columns):
-                return jsonify({'error': 'Content file must contain at least columns: url, content'}), 400
-            
-            # Préparer les données de contenu
-            content_data = {}
-            for _, row in content_df.iterrows():
-                url = row["url"]
-                
-                # Récupérer toutes les colonnes de contenu
-                content_cols = [col for col in content_df.columns if col.startswith("content")]
-                
-                # Préparer les données de contenu dans le format attendu par le service d'analyse
-                content_values = []
-                for col in content_cols:
-                    if pd.notna(row.get(col)):
-                        content_values.append(str(row[col]))
-                
-                # Si au moins une colonne de contenu a une valeur, ajouter à content_data
-                if content_values:
-                    # Simuler le format des données scrapées
-                    content_data[url] = {
-                        'title': content_values[0] if len(content_values) > 0 else "",
-                        'meta_description': content_values[1] if len(content_values) > 1 else "",
-                        'h1': [content_values[2]] if len(content_values) > 2 else [],
-                        'h2': [content_values[3]] if len(content_values) > 3 else [],
-                        'content': " ".join(content_values)
-                    }
-        
-        # Récupérer les données de scraping si nécessaire et si aucun fichier de contenu n'est fourni
-        scraped_data = None
-        if scrape_pages:
-            if content_file and 'content_df' in locals():
-                # Utiliser les données de contenu fournies
-                print("Utilisation des données de contenu fournies...")
-                # Convertir les données de contenu au format attendu par le service d'analyse
-                formatted_content_data = {}
-                for _, row in content_df.iterrows():
-                    url = row['URL']
-                    
-                    # Initialiser le contenu avec la colonne obligatoire
-                    content = row['Contenu']
-                    
-                    # Ajouter le contenu des colonnes supplémentaires s'il y en a
-                    additional_content = []
-                    for col in content_df.columns:
-                        if col not in ['URL', 'Contenu'] and pd.notna(row[col]):
-                            additional_content.append(str(row[col]))
-                    
-                    # Fusionner tout le contenu
-                    if additional_content:
-                        content = content + " " + " ".join(additional_content)
-                    
-                    # Stocker dans le dictionnaire au format attendu
-                    formatted_content_data[url] = {
-                        'title': "",  # Par défaut, titre vide
-                        'meta_description': "",  # Par défaut, meta description vide
-                        'h1': [],  # Par défaut, h1 vide
-                        'h2': [],  # Par défaut, h2 vide
-                        'content': content  # Le contenu fusionné
-                    }
-                
-                scraped_data = formatted_content_data
-                print(f"Nombre d'URLs avec contenu: {len(scraped_data)}")
-            else:
-                # Extraire toutes les URLs uniques
-                urls = set()
-                for item in keywords_data:
-                    urls.add(item['url'])
-                
-                # Scraper les URLs
-                scraped_data = {}
-                for url in urls:
-                    try:
-                        scraped_content = web_scraper.scrape_url(url)
-                        if scraped_content:
-                            scraped_data[url] = scraped_content
-                    except Exception as e:
-                        print(f"Erreur lors du scraping de {url}: {str(e)}")
         
         # Analyser la cannibalisation avec les données scrapées si disponibles
         primary_keyword_only = request.form.get('primary_keyword_only', 'false') == 'true'
@@ -320,7 +197,7 @@ def analyze_csv():
         
         # Ajouter les données scrapées aux résultats si elles existent
         if scraped_data:
-            results['scraped_data'] = scraped_data
+            results['scraped_data'] = WebScraper.without_content(scraped_data)
         
         return jsonify(results)
     except Exception as e:
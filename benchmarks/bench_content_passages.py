@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Benchmark des embeddings de contenu par passages
+
+Génère des pages au corps long (--words mots par page) et compare, en mode 'passages':
+- l'encodage page par page (un appel au modèle par page, pour tous ses passages)
+- l'encodage groupé de SimilarityAnalyzer._encode_pages (tous les passages de toutes les
+  pages en un seul appel, puis moyenne par page)
+Les deux doivent produire les mêmes embeddings. Mesure ensuite la durée et le nombre de
+passages pour plusieurs budgets de jetons par page (max_page_tokens), et la durée du mode
+'summary' (titre, meta description et titres seulement) pour comparaison.
+
+Nécessite le modèle Sentence Transformers (téléchargé au premier lancement).
+
+Usage:
+    python benchmarks/bench_content_passages.py [--pages 500] [--words 5000] [--budgets 512,2048,8192]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.similarity import SimilarityAnalyzer
+
+WORDS = ['référencement', 'contenu', 'page', 'mot-clé', 'cannibalisation', 'recherche', 'site', 'lien',
+         'article', 'guide', 'conseils', 'analyse', 'trafic', 'position', 'requête', 'utilisateur']
+
+def generate_pages(pages, words, seed=0):
+    """Pages scrapées: titre, meta description, titres et corps de words mots"""
+    rng = random.Random(seed)
+    return {
+        f"https://www.example.com/page-{i}": {
+            'title': f"Page {i} {rng.choice(WORDS)}",
+            'meta_description': f"Description de la page {i}",
+            'h1': [f"Titre {i}"],
+            'h2': [f"Section {j} {rng.choice(WORDS)}" for j in range(5)],
+            'content': " ".join(rng.choice(WORDS) for _ in range(words))
+        }
+        for i in range(pages)
+    }
+
+def encode_per_page(analyzer, pages):
+    """Un appel au modèle par page"""
+    return np.array([analyzer._encode_pages([passages])[0][0] for passages in pages])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--words', type=int, default=5000)
+    parser.add_argument('--budgets', default='512,2048,8192')
+    parser.add_argument('--model', default='paraphrase-multilingual-MiniLM-L12-v2')
+    args = parser.parse_args()
+    
+    # Sans cache d'embeddings: chaque mesure encode tous les passages
+    os.environ.pop('EMBEDDING_CACHE_DIR', None)
+    scraped_data = generate_pages(args.pages, args.words)
+    analyzer = SimilarityAnalyzer(args.model, execution_backend='inline', content_mode='passages')
+    print(f"{args.pages} pages de {args.words} mots, passages de {analyzer.passage_tokens} jetons au plus")
+    
+    pages = [analyzer._content_passages(data) for data in scraped_data.values()]
+    start_time = time.perf_counter()
+    expected = encode_per_page(analyzer, pages)
+    per_page_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    embeddings, _ = analyzer._encode_pages(pages)
+    batched_time = time.perf_counter() - start_time
+    if not np.allclose(expected, embeddings, atol=1e-5):
+        print("ERREUR: les embeddings diffèrent entre l'encodage page par page et l'encodage groupé")
+        sys.exit(1)
+    print(f"Budget {analyzer.max_page_tokens} jetons: page par page {per_page_time:.2f} s, un seul appel {batched_time:.2f} s (embeddings identiques)")
+    
+    for budget in [int(budget) for budget in args.budgets.split(',')]:
+        analyzer.max_page_tokens = budget
+        start_time = time.perf_counter()
+        pages = [analyzer._content_passages(data) for data in scraped_data.values()]
+        split_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        analyzer._encode_pages(pages)
+        encode_time = time.perf_counter() - start_time
+        print(f"  Budget {budget} jetons: {sum(len(passages) for passages in pages)} passages, découpage {split_time:.2f} s, encodage {encode_time:.2f} s")
+    
+    analyzer.content_mode = 'summary'
+    pages = [analyzer._content_passages(data) for data in scraped_data.values()]
+    start_time = time.perf_counter()
+    analyzer._encode_pages(pages)
+    print(f"  Mode 'summary' (titres seulement): {time.perf_counter() - start_time:.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+Benchmark de la lecture des fichiers CSV envoyés
+
+Compare la lecture d'origine (fichier temporaire puis pd.read_csv avec chaque couple
+séparateur / encodage jusqu'au premier qui ne lève pas d'exception) à la lecture de
+server/services/upload_reader.py (encodage et séparateur détectés sur un échantillon,
+une seule lecture des colonnes utiles). Pour chaque format généré, indique la durée et si
+les mots-clés lus sont corrects (accents compris).
+
+Vérifie que toutes les lectures (d'un bloc, par paquets, compressées, Parquet et Arrow)
+agrègent de la même façon les lignes d'un même couple mot-clé / URL: mêmes groupes
+(KeywordFrame.keyword_groups) pour un petit fichier contenant un couple en double.
+
+Compare ensuite, sur un gros export où chaque couple mot-clé / URL apparaît plusieurs fois
+(une ligne par jour), la lecture d'un bloc à la lecture par paquets, puis la lecture du même
+export compressé (gzip, zstd) et converti en Parquet et Arrow (si pyarrow et zstandard sont
+installés): durée, mémoire maximale du processus (chaque lecture est faite dans un processus
+séparé) et groupes de mots-clés obtenus, qui doivent être identiques.
+
+Usage:
+    python benchmarks/bench_csv_upload.py [--rows 500000] [--large-rows 5000000] [--min-clicks 5]
+"""
+import io
+import os
+import sys
+import gzip
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.upload_reader import KEYWORD_COLUMN_MAPPINGS, read_keywords_file, pa, zstandard
+from server.services.keyword_frame import KeywordFrame
+
+FORMATS = [
+    ('; utf-8', ';', 'utf-8'),
+    (', utf-8 (BOM)', ',', 'utf-8-sig'),
+    ('tabulation utf-16', '\t', 'utf-16')
+]
+
+def generate_csv(rows, sep, encoding):
+    """Export de mots-clés au format standard (couples mot-clé / URL distincts)"""
+    lines = [sep.join(['Mot-clé', 'URL', 'Clics', 'Impressions', 'Position'])]
+    lines += [
+        sep.join([f"requête été {i % 50000}", f"https://example.com/page-{i}", str(i % 100), str(i % 1000), f"{i % 30 + 1}.5"])
+        for i in range(rows)
+    ]
+    return ('\n'.join(lines) + '\n').encode(encoding)
+
+def legacy_read(data):
+    """Lecture d'origine de main.analyze_csv"""
+    path = 'bench_temp_upload.csv'
+    with open(path, 'wb') as f:
+        f.write(data)
+    try:
+        for sep in [';', ',', '\t']:
+            for encoding in ['latin1', 'utf-8', 'cp1252', 'iso-8859-1', 'utf-16']:
+                try:
+                    df = pd.read_csv(path, encoding=encoding, sep=sep, on_bad_lines='skip')
+                except Exception:
+                    continue
+                for mapping in KEYWORD_COLUMN_MAPPINGS.values():
+                    if all(col in df.columns for col in mapping):
+                        return KeywordFrame.from_dataframe(df[list(mapping)].rename(columns=mapping))
+                return None
+    finally:
+        os.remove(path)
+
+def generate_large_csv(path, rows, days=30):
+    """Export Search Console quotidien: chaque couple mot-clé / URL revient une fois par jour"""
+    pairs = rows // days
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('Query,Page,Clicks,Position\n')
+        for day in range(days):
+            f.write(''.join(
+                f"requête été {i % (pairs // 4)},https://example.com/page-{i}{'#avis' if i % 97 == 0 else ''},{(i + day) % 20},{i % 30 + 1}.5\n"
+                for i in range(pairs)
+            ))
+
+def write_formats(data, directory, name):
+    """Copies d'un CSV (octets) dans les formats acceptés: liste de (nom, chemin, lecture par paquets)"""
+    path = os.path.join(directory, f'{name}.csv')
+    with open(path, 'wb') as f:
+        f.write(data)
+    files = [("CSV d'un bloc", path, False), ('CSV par paquets', path, True)]
+    return files + [(label, file_path, False) for label, file_path in convert_large(path, directory, name)]
+
+def convert_large(path, directory, name='export'):
+    """Copies de l'export dans les autres formats acceptés: liste de (nom, chemin)"""
+    files = []
+    gzip_path = os.path.join(directory, f'{name}.csv.gz')
+    with open(path, 'rb') as source, gzip.open(gzip_path, 'wb', compresslevel=1) as target:
+        shutil.copyfileobj(source, target)
+    files.append(('CSV gzip', gzip_path))
+    if zstandard is not None:
+        zstd_path = os.path.join(directory, f'{name}.csv.zst')
+        with open(path, 'rb') as source, open(zstd_path, 'wb') as target:
+            zstandard.ZstdCompressor().copy_stream(source, target)
+        files.append(('CSV zstd', zstd_path))
+    if pa is not None:
+        import pyarrow.csv
+        import pyarrow.parquet
+        table = pyarrow.csv.read_csv(path)
+        parquet_path = os.path.join(directory, f'{name}.parquet')
+        pyarrow.parquet.write_table(table, parquet_path)
+        arrow_path = os.path.join(directory, f'{name}.arrow')
+        with pa.ipc.new_file(arrow_path, table.schema) as writer:
+            writer.write_table(table)
+        files += [('Parquet', parquet_path), ('Arrow', arrow_path)]
+    return files
+
+def read_groups(path, chunked, min_clicks=0):
+    """Lecture d'un bloc ou par paquets: durée, mémoire maximale du processus, couples et groupes de mots-clés"""
+    start_time = time.perf_counter()
+    chunked_min_bytes = 0 if chunked else os.path.getsize(path) + 1
+    with open(path, 'rb') as f, contextlib.redirect_stdout(io.StringIO()):
+        keywords_data = read_keywords_file(f, min_clicks, 0, chunk_rows=100000 if chunked else None, chunked_min_bytes=chunked_min_bytes)
+    elapsed = time.perf_counter() - start_time
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, len(keywords_data), keywords_data.keyword_groups()
+
+def check_duplicates():
+    """Un couple mot-clé / URL en double doit être agrégé de la même façon par toutes les lectures"""
+    data = "Mot-clé,URL,Clics,Position\nfoo,https://a/1,3,2\nfoo,https://a/1,5,4\nfoo,https://a/2,1,3\n".encode('utf-8')
+    with tempfile.TemporaryDirectory() as directory:
+        readings = write_formats(data, directory, 'duplicates')
+        reference = None
+        for label, path, chunked in readings:
+            groups = read_groups(path, chunked)[3]
+            if reference is None:
+                reference = groups
+            elif groups != reference:
+                print(f"ERREUR: les groupes lus ({label}) diffèrent de la lecture d'un bloc: {groups} / {reference}")
+                sys.exit(1)
+    print(f"Couple en double agrégé de la même façon par les {len(readings)} lectures: {reference}")
+
+def compare_large(rows, min_clicks):
+    """Lectures d'un gros export: d'un bloc, par paquets et dans les autres formats"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'export.csv')
+        generate_large_csv(path, rows)
+        print(f"Gros export: {rows} lignes, {os.path.getsize(path) / 1024 / 1024:.0f} Mo, min_clicks={min_clicks}")
+        # Conversion dans un processus séparé: la mémoire maximale d'un processus est héritée par ses fils
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(1) as pool:
+            converted = pool.apply(convert_large, (path, directory))
+        readings = [("CSV d'un bloc", path, False), ('CSV par paquets', path, True)]
+        readings += [(label, file_path, False) for label, file_path in converted]
+        
+        reference = None
+        for label, file_path, chunked in readings:
+            with context.Pool(1) as pool:
+                elapsed, peak, pairs, groups = pool.apply(read_groups, (file_path, chunked, min_clicks))
+            print(f"  {label} ({os.path.getsize(file_path) / 1024 / 1024:.0f} Mo): {elapsed:.2f} s, {peak:.0f} Mo au maximum, {pairs} couples")
+            if reference is None:
+                reference = groups
+            elif groups != reference:
+                print(f"ERREUR: les groupes de mots-clés lus ({label}) diffèrent de la lecture d'un bloc")
+                sys.exit(1)
+    print("  Groupes de mots-clés identiques")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--large-rows', type=int, default=5000000)
+    parser.add_argument('--min-clicks', type=int, default=5)
+    args = parser.parse_args()
+    
+    check_duplicates()
+    
+    expected = [f"requête été {i % 50000}" for i in range(args.rows)]
+    for name, sep, encoding in FORMATS:
+        data = generate_csv(args.rows, sep, encoding)
+        print(f"{name}: {args.rows} lignes, {len(data) / 1024 / 1024:.0f} Mo")
+        for label, read in [('origine', legacy_read), ('détection', lambda data: read_keywords_file(io.BytesIO(data)))]:
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                keywords_data = read(data)
+            elapsed = time.perf_counter() - start_time
+            if keywords_data is None:
+                status = "format non reconnu"
+            elif keywords_data.df['keyword'].astype(str).tolist() != expected:
+                status = "mots-clés incorrects"
+            else:
+                status = "correct"
+            print(f"  {label}: {elapsed:.2f} s, {status}")
+    
+    compare_large(args.large_rows, args.min_clicks)
+
+if __name__ == '__main__':
+    main()
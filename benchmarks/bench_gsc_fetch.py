@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark de la récupération Search Analytics par périodes
+
+Démarre le serveur Search Console factice (benchmarks/fake_search_console.py) et compare
+la récupération séquentielle (une requête à la fois, comme l'ancienne boucle par période)
+à la récupération concurrente de SearchAnalyticsFetcher. Les deux doivent produire les
+mêmes lignes.
+
+Usage:
+    python benchmarks/bench_gsc_fetch.py [--days 90] [--latency 0.2] [--rows-per-day 5000] [--concurrency 8]
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import threading
+from datetime import datetime, timedelta
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_search_console import create_app
+from server.services.search_console import SearchConsoleService
+
+def start_fake_server(latency, rows_per_day, max_qps):
+    """Démarrer le serveur factice dans un thread et retourner son URL"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    
+    async def serve():
+        runner = web.AppRunner(create_app(latency, rows_per_day, max_qps))
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        ready.set()
+    
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve())
+        loop.run_forever()
+    
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{port}"
+
+def build_service(endpoint, concurrency, lookahead, qps):
+    """Service Search Console pointant vers le serveur factice"""
+    os.environ['GSC_API_ENDPOINT'] = endpoint
+    service = SearchConsoleService()
+    service.client = service._build_client(None)
+    service.fetcher.concurrency = concurrency
+    service.fetcher.lookahead = lookahead
+    service.fetcher.qps = qps
+    service.fetcher.qpm = qps * 60
+    service.client.limit_per_host = max(concurrency, 1)
+    return service
+
+def fetch(service, start_date, end_date, max_rows):
+    start_time = time.perf_counter()
+    keywords = service.get_keywords_data_by_date_chunks('https://www.example.com/', start_date, end_date, max_rows=max_rows, as_frame=True)
+    return keywords, time.perf_counter() - start_time, dict(service.fetcher.stats)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--rows-per-day', type=int, default=5000)
+    parser.add_argument('--max-rows', type=int, default=500000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--qps', type=float, default=20)
+    args = parser.parse_args()
+    
+    endpoint = start_fake_server(args.latency, args.rows_per_day, max_qps=args.qps * 2)
+    end = datetime(2024, 6, 30)
+    start_date = (end - timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    end_date = end.strftime('%Y-%m-%d')
+    print(f"Période {start_date} à {end_date}, {args.rows_per_day} lignes par jour, latence {args.latency} s")
+    
+    sequential, sequential_time, sequential_stats = fetch(build_service(endpoint, 1, 1, args.qps), start_date, end_date, args.max_rows)
+    concurrent, concurrent_time, concurrent_stats = fetch(build_service(endpoint, args.concurrency, 2, args.qps), start_date, end_date, args.max_rows)
+    
+    # Les deux modes doivent produire exactement les mêmes lignes, dans le même ordre
+    if sequential.to_records() != concurrent.to_records():
+        print("ERREUR: les lignes diffèrent entre les deux modes")
+        sys.exit(1)
+    
+    print(f"Séquentiel: {sequential_time:.2f} s ({sequential_stats['requests']} requêtes)")
+    print(f"Concurrent ({args.concurrency} requêtes simultanées): {concurrent_time:.2f} s "
+          f"({concurrent_stats['requests']} requêtes, {concurrent_stats['retries']} relancées, x{sequential_time / concurrent_time:.1f})")
+    print(f"{len(concurrent)} lignes identiques")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark de l'extraction HTML du scraper
+
+Compare les extracteurs de server/services/html_extract.py (BeautifulSoup avec html.parser,
+l'extraction d'origine, et lxml) sur des pages générées: titre, meta description, balises
+h1 à h3 au milieu de la navigation, de scripts et de paragraphes. Mesure le temps CPU par
+page, le débit sur un thread et le débit avec un pool de threads (comme le scraper).
+Les extracteurs doivent produire les mêmes éléments.
+
+Usage:
+    python benchmarks/bench_html_extract.py [--pages 200] [--sections 12] [--workers 4]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.html_extract import EXTRACTORS, etree
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'référencement', '<em>contenu</em>', '<a href="/lien">lien</a>']
+
+def generate_page(n, sections):
+    """Page HTML d'environ 4 Ko par section"""
+    rng = random.Random(n)
+    parts = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title> Page {n} &amp; co </title>"]
+    parts += [f"<link rel='stylesheet' href='/style-{i}.css'><script>var v{i} = {i};</script>" for i in range(20)]
+    parts.append(f"<meta name='description' content=' Description de la page {n} '></head><body><nav>")
+    parts += [f"<a href='/menu-{i}'>Menu {i}</a>" for i in range(150)]
+    parts.append("</nav>")
+    for section in range(sections):
+        parts.append(f"<h1>Titre {n}</h1>" if section == 0 else f"<h2>Section <b>{section}</b></h2>")
+        for _ in range(8):
+            parts.append("<div class='bloc'><p>" + " ".join(rng.choice(WORDS) for _ in range(60)) + "</p></div>")
+        parts.append(f"<h3>Sous-section {section}</h3>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+def measure(extract, pages, workers):
+    """Temps CPU par page (un thread), débit sur un thread et débit avec le pool"""
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    results = [extract(page) for page in pages]
+    cpu_per_page = (time.process_time() - cpu_start) / len(pages)
+    single_rate = len(pages) / (time.perf_counter() - wall_start)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        wall_start = time.perf_counter()
+        list(pool.map(extract, pages))
+        pool_rate = len(pages) / (time.perf_counter() - wall_start)
+    return results, cpu_per_page, single_rate, pool_rate
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--sections', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    
+    pages = [generate_page(n, args.sections) for n in range(args.pages)]
+    print(f"{args.pages} pages de {sum(map(len, pages)) / len(pages) / 1024:.0f} Ko en moyenne, pool de {args.workers} threads ({os.cpu_count()} CPU)")
+    
+    names = [name for name in EXTRACTORS if name != 'lxml' or etree is not None]
+    reference = None
+    for name in names:
+        results, cpu_per_page, single_rate, pool_rate = measure(EXTRACTORS[name], pages, args.workers)
+        if reference is None:
+            reference = results
+        elif results != reference:
+            print(f"ERREUR: les éléments extraits par {name} diffèrent de ceux de {names[0]}")
+            sys.exit(1)
+        print(f"{name}: {cpu_per_page * 1000:.1f} ms CPU par page, {single_rate:.0f} pages/s (1 thread), {pool_rate:.0f} pages/s (pool)")
+    print("Éléments extraits identiques")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Benchmark de l'ingestion des données Search Console
+
+Compare la mémoire maximale et la durée de l'ingestion complète (toutes les pages de
+l'export conservées, puis fusion des périodes) à l'ingestion par lots dans un
+KeywordIndex (chaque page est agrégée dès son arrivée puis libérée). Les pages sont
+générées comme des réponses JSON de l'API (listes de dictionnaires).
+
+Usage:
+    python benchmarks/bench_keyword_ingestion.py [--rows 1000000] [--windows 13] [--pairs 400000]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.keyword_frame import KeywordFrame
+from server.services.keyword_index import KeywordIndex
+
+PAGE_SIZE = 25000
+
+def generate_pages(n_rows, n_windows, n_pairs, seed=0):
+    """Pages de l'API: (rang de la première ligne, lignes), les couples se répétant d'une période à l'autre"""
+    rng = np.random.default_rng(seed)
+    rows_per_window = n_rows // n_windows
+    for window in range(n_windows):
+        for start in range(0, rows_per_window, PAGE_SIZE):
+            size = min(PAGE_SIZE, rows_per_window - start)
+            pairs = rng.integers(0, n_pairs, size).tolist()
+            clicks = rng.poisson(2, size).tolist()
+            impressions = rng.poisson(50, size).tolist()
+            positions = rng.uniform(1, 100, size).tolist()
+            yield window * rows_per_window + start, [
+                {
+                    'keys': [f"mot-clé {pair % (n_pairs // 4)}", f"https://www.example.com/page-{pair}"],
+                    'clicks': clicks[i],
+                    'impressions': impressions[i],
+                    'ctr': clicks[i] / impressions[i] if impressions[i] else 0.0,
+                    'position': positions[i]
+                }
+                for i, pair in enumerate(pairs)
+            ]
+
+def rows_to_frame(rows):
+    """Même conversion que SearchConsoleService._rows_to_frame"""
+    columns = {column: [] for column in KeywordFrame.COLUMNS}
+    for row in rows:
+        columns['keyword'].append(row['keys'][0])
+        columns['url'].append(row['keys'][1])
+        columns['clicks'].append(row.get('clicks', 0))
+        columns['impressions'].append(row.get('impressions', 0))
+        columns['ctr'].append(row.get('ctr', 0))
+        columns['position'].append(row.get('position', 0))
+    return KeywordFrame.from_columns(**columns)
+
+def full_export(pages, max_rows):
+    """Ingestion complète: toutes les pages sont conservées avant la fusion"""
+    export = [rows for _, rows in pages]
+    return KeywordFrame.concat([rows_to_frame(rows) for rows in export]).aggregate(max_rows)
+
+def batched(pages, max_rows):
+    """Ingestion par lots: chaque page est agrégée dans l'index puis libérée"""
+    keyword_index = KeywordIndex()
+    for order_start, rows in pages:
+        keyword_index.add(rows_to_frame(rows), order_start)
+    return keyword_index.to_frame(max_rows)
+
+def measure(func, *args):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 ** 2
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--windows', type=int, default=13)
+    parser.add_argument('--pairs', type=int, default=400000)
+    parser.add_argument('--max-rows', type=int, default=1000000)
+    args = parser.parse_args()
+    
+    print(f"{args.rows} lignes en {args.windows} périodes ({args.pairs} couples mot-clé/URL distincts)")
+    full_result, full_time, full_peak = measure(full_export, generate_pages(args.rows, args.windows, args.pairs), args.max_rows)
+    batched_result, batched_time, batched_peak = measure(batched, generate_pages(args.rows, args.windows, args.pairs), args.max_rows)
+    
+    # Les deux ingestions doivent produire les mêmes couples, dans le même ordre, avec les mêmes métriques
+    full_df, batched_df = full_result.df, batched_result.df
+    if (
+        full_df['keyword'].astype(str).tolist() != batched_df['keyword'].astype(str).tolist()
+        or full_df['url'].astype(str).tolist() != batched_df['url'].astype(str).tolist()
+        or not np.array_equal(full_df['clicks'].to_numpy(), batched_df['clicks'].to_numpy())
+        or not np.allclose(full_df['position'].to_numpy(), batched_df['position'].to_numpy())
+    ):
+        print("ERREUR: les données diffèrent entre les deux ingestions")
+        sys.exit(1)
+    
+    print(f"Export complet puis fusion: {full_time:.2f} s, {full_peak:.0f} Mo au maximum")
+    print(f"Ingestion par lots (KeywordIndex): {batched_time:.2f} s, {batched_peak:.0f} Mo au maximum (x{full_peak / batched_peak:.1f} moins de mémoire)")
+    print(f"{len(batched_result)} couples mot-clé/URL identiques")
+
+if __name__ == '__main__':
+    main()
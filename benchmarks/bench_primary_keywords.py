@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark de la sélection du mot-clé principal par URL
+
+Compare l'ancienne implémentation (listes par URL triées une à une) au noyau
+vectorisé KeywordFrame.primary_keywords() suivi du regroupement par mot-clé principal.
+
+Usage:
+    python benchmarks/bench_primary_keywords.py [--rows 1000000] [--urls 50000] [--keywords 200000]
+"""
+import os
+import sys
+import time
+import argparse
+from collections import defaultdict
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.keyword_frame import KeywordFrame
+
+def generate_columns(n_rows, n_urls, n_keywords, seed=0):
+    """Générer des données Search Console synthétiques (une ligne par couple mot-clé / URL)"""
+    rng = np.random.default_rng(seed)
+    return {
+        'keyword': [f"mot-clé {i}" for i in rng.integers(0, n_keywords, n_rows)],
+        'url': [f"https://www.example.com/rubrique-{i % 40}/page-{i}" for i in rng.integers(0, n_urls, n_rows)],
+        'clicks': rng.poisson(2, n_rows),
+        'impressions': rng.poisson(50, n_rows),
+        'ctr': rng.random(n_rows),
+        'position': rng.uniform(1, 100, n_rows)
+    }
+
+def legacy_primary_groups(keywords_data):
+    """Ancienne implémentation: une liste par URL, triée entièrement pour en garder le premier élément"""
+    url_to_keywords = defaultdict(list)
+    for data in keywords_data:
+        url_to_keywords[data['url']].append(data)
+    
+    keyword_to_urls = defaultdict(list)
+    for url, keywords in url_to_keywords.items():
+        primary = sorted(keywords, key=lambda x: (x.get('clicks', 0), x.get('impressions', 0)), reverse=True)[0]
+        keyword_to_urls[primary['keyword']].append(primary)
+    
+    return [
+        (keyword, sorted(urls_data, key=lambda x: x['position']))
+        for keyword, urls_data in keyword_to_urls.items()
+        if len(urls_data) >= 2
+    ]
+
+def vectorized_primary_groups(keyword_frame):
+    """Noyau partagé: sélection vectorisée puis regroupement par mot-clé principal"""
+    return keyword_frame.primary_keywords().keyword_groups()
+
+def timed(func, *args):
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--urls', type=int, default=50000)
+    parser.add_argument('--keywords', type=int, default=200000)
+    args = parser.parse_args()
+    
+    print(f"Génération de {args.rows} lignes ({args.urls} URLs, {args.keywords} mots-clés)...")
+    columns = generate_columns(args.rows, args.urls, args.keywords)
+    keyword_frame, build_time = timed(KeywordFrame.from_columns, *columns.values())
+    keywords_data = keyword_frame.to_records()
+    
+    legacy_groups, legacy_time = timed(legacy_primary_groups, keywords_data)
+    vectorized_groups, vectorized_time = timed(vectorized_primary_groups, keyword_frame)
+    
+    # Les deux implémentations doivent produire exactement les mêmes groupes
+    if [(k, [r['url'] for r in rows]) for k, rows in legacy_groups] != [(k, [r['url'] for r in rows]) for k, rows in vectorized_groups]:
+        print("ERREUR: les groupes diffèrent entre les deux implémentations")
+        sys.exit(1)
+    
+    print(f"Construction du KeywordFrame: {build_time:.2f} s")
+    print(f"Implémentation par listes triées: {legacy_time:.2f} s")
+    print(f"Noyau vectorisé: {vectorized_time:.2f} s (x{legacy_time / vectorized_time:.1f})")
+    print(f"{len(vectorized_groups)} groupes de mots-clés principaux identiques")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Benchmark du pipeline scraping -> embeddings
+
+Démarre un site factice (voir bench_scraper.py) et compare l'enchaînement d'origine (scraping
+de toutes les pages, puis calcul de tous les embeddings de contenu) au pipeline de
+SimilarityAnalyzer.iter_embed_pages_async (embeddings calculés par micro-lots pendant le
+scraping). Le pipeline doit produire les mêmes embeddings, en un temps proche du maximum
+(et non de la somme) des durées du scraping et de l'encodage.
+
+Nécessite le modèle Sentence Transformers (téléchargé au premier lancement).
+
+Usage:
+    python benchmarks/bench_scrape_embed.py [--pages 2000] [--latency 0.2] [--batch-size 64]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_scraper import create_site
+from server.services.scraper import WebScraper
+from server.services.similarity import SimilarityAnalyzer
+
+async def sequential(scraper, analyzer, urls):
+    """Enchaînement d'origine: tout scraper, puis tout encoder"""
+    start_time = time.perf_counter()
+    scraped_data = await scraper.scrape_urls_async(urls)
+    scraped_at = time.perf_counter()
+    content_embeddings = await asyncio.get_running_loop().run_in_executor(None, analyzer._compute_content_embeddings, scraped_data)
+    end_time = time.perf_counter()
+    return content_embeddings, scraped_at - start_time, end_time - scraped_at, end_time - start_time
+
+async def pipelined(scraper, analyzer, urls, batch_size):
+    """Pipeline: embeddings calculés par micro-lots pendant le scraping"""
+    start_time = time.perf_counter()
+    content_embeddings = {}
+    async for _ in analyzer.iter_embed_pages_async(scraper.iter_scrape_urls_async(urls), content_embeddings, batch_size):
+        pass
+    return content_embeddings, time.perf_counter() - start_time
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--model', default='paraphrase-multilingual-MiniLM-L12-v2')
+    args = parser.parse_args()
+    
+    # Sans cache d'embeddings: chaque mesure encode toutes les pages
+    os.environ.pop('EMBEDDING_CACHE_DIR', None)
+    analyzer = SimilarityAnalyzer(args.model, execution_backend='inline')
+    scraper = WebScraper(max_concurrency=args.concurrency, per_host=args.concurrency)
+    scraper.cache = None
+    
+    state = {'open': 0, 'max_open': 0, 'throttled': 0}
+    runner = web.AppRunner(create_site(args.latency, 10 ** 9, state))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    urls = [f"http://127.0.0.1:{port}/page/{i}" for i in range(args.pages)]
+    
+    print(f"{args.pages} pages, latence {args.latency * 1000:.0f} ms, {args.concurrency} requêtes simultanées, micro-lots de {args.batch_size}")
+    try:
+        expected, scrape_time, encode_time, sequential_time = await sequential(scraper, analyzer, urls)
+        content_embeddings, pipelined_time = await pipelined(scraper, analyzer, urls, args.batch_size)
+    finally:
+        await runner.cleanup()
+    
+    if set(expected) != set(content_embeddings) or not all(
+        np.allclose(expected[url], content_embeddings[url], atol=1e-5) for url in expected
+    ):
+        print("ERREUR: les embeddings diffèrent entre les deux enchaînements")
+        sys.exit(1)
+    
+    print(f"Scraping puis encodage: {sequential_time:.2f} s (scraping {scrape_time:.2f} s + encodage {encode_time:.2f} s)")
+    print(f"Pipeline scraping -> embeddings: {pipelined_time:.2f} s (max des deux étapes: {max(scrape_time, encode_time):.2f} s)")
+    print(f"{len(content_embeddings)} embeddings identiques")
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Benchmark du scraping asynchrone
+
+Démarre un site factice limité en débit (429 avec Retry-After au-delà de --max-qps
+requêtes par seconde) et compare l'ancien scraping (une tâche par URL lancée d'un coup,
+pause aléatoire de 0,5 à 2 secondes avant chaque requête) au scraping ordonnancé de
+WebScraper (concurrence limitée au total et par hôte, rythme adapté aux réponses).
+
+Usage:
+    python benchmarks/bench_scraper.py [--pages 1000] [--latency 0.05] [--max-qps 100]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.services.scraper import WebScraper
+
+def create_site(latency, max_qps, state):
+    """Site factice: pages HTML numérotées, 429 au-delà de max_qps requêtes par seconde"""
+    hits = []
+    
+    async def page(request):
+        now = time.monotonic()
+        hits[:] = [hit for hit in hits if now - hit < 1.0] + [now]
+        state['open'] += 1
+        state['max_open'] = max(state['max_open'], state['open'])
+        try:
+            if len(hits) > max_qps:
+                state['throttled'] += 1
+                return web.Response(status=429, headers={'Retry-After': '1'})
+            await asyncio.sleep(latency)
+            n = request.match_info['n']
+            return web.Response(
+                text=f"<html><head><title>Page {n}</title><meta name='description' content='Description {n}'></head>"
+                     f"<body><h1>Titre {n}</h1><h2>Section</h2><p>Contenu de la page {n}</p></body></html>",
+                content_type='text/html'
+            )
+        finally:
+            state['open'] -= 1
+    
+    app = web.Application()
+    app.router.add_get('/page/{n}', page)
+    return app
+
+async def legacy_scrape(scraper, urls):
+    """Ancien scraping: toutes les tâches lancées d'un coup, pause aléatoire avant chaque requête"""
+    async def scrape(session, url):
+        await asyncio.sleep(random.uniform(0.5, 2.0))
+        return await scraper.scrape_url_async(session, url)
+    
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(*(scrape(session, url) for url in urls), return_exceptions=True)
+    return {url: {'error': str(result)} if isinstance(result, Exception) else result for url, result in zip(urls, results)}
+
+async def measure(name, scrape, urls, state):
+    for key in state:
+        state[key] = 0
+    start_time = time.perf_counter()
+    results = await scrape(urls)
+    elapsed = time.perf_counter() - start_time
+    errors = sum(1 for data in results.values() if 'error' in data)
+    print(
+        f"{name}: {elapsed:.2f} s ({len(urls) / elapsed:.0f} pages/s), {errors} erreurs, "
+        f"{state['throttled']} réponses 429, {state['max_open']} requêtes simultanées au maximum"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--max-qps', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--per-host', type=int, default=8)
+    args = parser.parse_args()
+    
+    state = {'open': 0, 'max_open': 0, 'throttled': 0}
+    runner = web.AppRunner(create_site(args.latency, args.max_qps, state))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    urls = [f"http://127.0.0.1:{port}/page/{i}" for i in range(args.pages)]
+    
+    scraper = WebScraper(max_concurrency=args.concurrency, per_host=args.per_host, max_retries=3)
+    print(f"{args.pages} pages, site limité à {args.max_qps} requêtes/s, latence {args.latency * 1000:.0f} ms")
+    try:
+        await measure("Ancien scraping (gather + pauses aléatoires)", lambda urls: legacy_scrape(scraper, urls), urls, state)
+        await measure("Scraping ordonnancé (WebScraper)", scraper.scrape_urls_async, urls, state)
+    finally:
+        await runner.cleanup()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Serveur Search Console factice pour les benchmarks
+
+Répond à searchAnalytics.query avec des lignes déterministes (par jour de la période,
+paginées par startRow), une latence fixe par requête et des erreurs 429 au-delà d'un
+débit maximum, ainsi qu'à sites.list.
+
+Usage:
+    python benchmarks/fake_search_console.py [--port 8765] [--latency 0.2] [--rows-per-day 2000]
+"""
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from aiohttp import web
+
+def generate_rows(start_date, end_date, rows_per_day, start_row, row_limit):
+    """Lignes (query, page) de la période, triées comme l'API par clics décroissants"""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    days = (end - start).days + 1
+    total = days * rows_per_day
+    rows = []
+    for index in range(start_row, min(total, start_row + row_limit)):
+        day = start + timedelta(days=index // rows_per_day)
+        item = index % rows_per_day
+        clicks = max(0, 1000 - item)
+        impressions = clicks * 10 + 50
+        rows.append({
+            'keys': [f"mot-clé {item % (rows_per_day // 2 or 1)}", f"https://www.example.com/{day:%Y%m%d}/page-{item}"],
+            'clicks': clicks,
+            'impressions': impressions,
+            'ctr': clicks / impressions,
+            'position': 1 + item % 50
+        })
+    return rows
+
+def create_app(latency=0.2, rows_per_day=2000, max_qps=50):
+    """Créer l'application aiohttp du serveur factice"""
+    app = web.Application()
+    app['requests'] = []  # instants des requêtes reçues (pour la limitation de débit)
+    
+    async def query(request):
+        now = time.monotonic()
+        recent = [t for t in app['requests'] if now - t < 1.0]
+        app['requests'] = recent + [now]
+        if len(recent) >= max_qps:
+            return web.json_response({'error': {'code': 429, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}}, status=429)
+        
+        body = await request.json()
+        await asyncio.sleep(latency)
+        rows = generate_rows(body['startDate'], body['endDate'], rows_per_day, body.get('startRow', 0), body.get('rowLimit', 1000))
+        return web.json_response({'rows': rows} if rows else {})
+    
+    async def sites(request):
+        await asyncio.sleep(latency)
+        return web.json_response({'siteEntry': [
+            {'siteUrl': 'https://www.example.com/', 'permissionLevel': 'siteOwner'},
+            {'siteUrl': 'sc-domain:example.com', 'permissionLevel': 'siteFullUser'}
+        ]})
+    
+    app.router.add_post('/webmasters/v3/sites/{site}/searchAnalytics/query', query)
+    app.router.add_get('/webmasters/v3/sites', sites)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--rows-per-day', type=int, default=2000)
+    parser.add_argument('--max-qps', type=float, default=50)
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.rows_per_day, args.max_qps), host='127.0.0.1', port=args.port)
+
+if __name__ == '__main__':
+    main()
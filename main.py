@@ -1,18 +1,18 @@
 import os
-from fastapi import FastAPI, Request, Form, File, UploadFile, HTTPException, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+import asyncio
+from fastapi import FastAPI, Request, Form, File, UploadFile, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
 import json
-import pandas as pd
 import uvicorn
-from pathlib import Path
 from server.services.search_console import SearchConsoleService
 from server.services.similarity import SimilarityAnalyzer
 from server.services.scraper import WebScraper
+from server.services.upload_reader import read_keywords_file, read_content_file, format_content_data
 from pydantic import BaseModel
 import logging
 
@@ -43,10 +43,29 @@ templates = Jinja2Templates(directory="client/templates")
 # Ajouter une fonction url_for personnalisée aux templates Jinja2
 templates.env.globals["url_for"] = lambda name, **path_params: f"/{name}" + (f"/{path_params['filename']}" if 'filename' in path_params else "")
 
-# Initialiser les services
-search_console_service = SearchConsoleService()
-similarity_analyzer = SimilarityAnalyzer()
-web_scraper = WebScraper()
+# Services créés au démarrage de l'application et non à l'import du module: les processus
+# de calcul du mode 'process' (lancés en 'spawn') ré-exécutent ce module sans charger le modèle
+search_console_service = None
+similarity_analyzer = None
+web_scraper = None
+
+@app.on_event("startup")
+async def create_services():
+    """Initialiser les services (chargement du modèle Sentence Transformers compris)"""
+    global search_console_service, similarity_analyzer, web_scraper
+    search_console_service = SearchConsoleService()
+    similarity_analyzer = SimilarityAnalyzer()
+    # Texte du corps des pages extrait seulement s'il est encodé (embeddings par passages)
+    web_scraper = WebScraper(
+        extract_content=similarity_analyzer.content_mode == 'passages',
+        max_content_words=similarity_analyzer.max_page_tokens
+    )
+
+@app.on_event("shutdown")
+async def close_services():
+    """Fermer les connexions HTTP partagées et arrêter les processus de calcul à l'arrêt de l'application"""
+    await search_console_service.close()
+    similarity_analyzer.execution_backend.shutdown()
 
 # Modèles de données Pydantic
 class SearchConsoleRequest(BaseModel):
@@ -86,7 +105,7 @@ async def auth_callback(code: str):
 @app.get("/api/sites")
 async def get_sites():
     """Récupérer la liste des sites disponibles dans Search Console"""
-    sites = search_console_service.get_sites()
+    sites = await search_console_service.get_sites_async()
     return {"sites": sites}
 
 @app.post("/api/analyze/search-console")
@@ -107,17 +126,31 @@ async def analyze_search_console(data: dict):
         max_rows = int(data.get('max_rows', 100000))
         use_date_chunks = data.get('use_date_chunks', True)
         chunk_size = int(data.get('chunk_size', 7))
+        # 'site_content' recherche les pages au contenu proche sur tout le site, quel que soit le mot-clé
+        analysis_type = data.get('analysis_type')
+        compact_pairs = data.get('compact_pairs', False)
+        index_type = data.get('index_type', 'ivf')
+        # Conserver les scores bruts (sur demande) pour pouvoir changer de seuil sans relancer l'analyse
+        store_scores = data.get('store_scores', False)
         
         # Récupérer les données de la Search Console
         try:
-            keywords_data = await search_console_service.get_keywords_data_async(
-                site_url, 
-                start_date, 
-                end_date, 
-                ['query', 'page'],
+            # Les pages de l'API sont agrégées au fil de leur arrivée, sans conserver l'export brut
+            # (rapport des périodes tronquées et des couples écartés: search_console_service.last_fetch_report)
+            fetch_report = {}
+            keywords_data = await similarity_analyzer.ingest_keyword_batches_async(
+                search_console_service.iter_keyword_batches(
+                    site_url, 
+                    start_date, 
+                    end_date, 
+                    ['query', 'page'],
+                    max_rows=max_rows,
+                    use_date_chunks=use_date_chunks,
+                    chunk_size=chunk_size,
+                    report=fetch_report
+                ),
                 max_rows=max_rows,
-                use_date_chunks=use_date_chunks,
-                chunk_size=chunk_size
+                report=fetch_report
             )
         except Exception as e:
             logging.error(f"Erreur lors de la récupération des données de la Search Console: {e}")
@@ -144,34 +177,44 @@ async def analyze_search_console(data: dict):
         print(f"Nombre de mots-clés récupérés: {len(keywords_data)}")
         
         # Vérifier si les données contiennent les champs 'clicks' et 'impressions'
-        sample_data = keywords_data[0] if keywords_data else {}
+        sample_data = keywords_data.to_records(range(1))[0] if len(keywords_data) else {}
         print(f"Exemple de données: {sample_data}")
         
         # Récupérer les données de scraping si nécessaire
         scraped_data = None
-        if data.get('scrape_pages', False):
-            # Extraire toutes les URLs uniques
-            urls = set()
-            for item in keywords_data:
-                urls.add(item['url'])
-            
-            # Scraper les URLs
-            scraped_data = await web_scraper.scrape_urls_async(list(urls))
+        content_embeddings = None
+        if data.get('scrape_pages', False) or analysis_type == 'site_content':
+            # Scraper toutes les URLs uniques, les embeddings de contenu étant calculés au fil du scraping
+            scraped_data, content_embeddings = await scrape_pages(keywords_data.unique_urls())
         
         # Analyser la cannibalisation
         try:
-            results = await similarity_analyzer.analyze_keywords_async(
-                keywords_data, 
-                similarity_threshold,
-                primary_keyword_only,
-                scraped_data,
-                min_clicks,
-                min_impressions
-            )
+            if analysis_type == 'site_content':
+                results = await similarity_analyzer.analyze_site_content_async(
+                    scraped_data,
+                    similarity_threshold,
+                    keywords_data,
+                    min_clicks,
+                    min_impressions,
+                    index_type,
+                    content_embeddings=content_embeddings
+                )
+            else:
+                results = await similarity_analyzer.analyze_keywords_async(
+                    keywords_data, 
+                    similarity_threshold,
+                    primary_keyword_only,
+                    scraped_data,
+                    min_clicks,
+                    min_impressions,
+                    compact_pairs,
+                    store_scores,
+                    content_embeddings
+                )
             
             # Ajouter les données de scraping aux résultats si elles ont été récupérées
             if scraped_data:
-                results["scraped_data"] = scraped_data
+                results["scraped_data"] = WebScraper.without_content(scraped_data)
             
             return results
         except Exception as e:
@@ -185,6 +228,41 @@ async def analyze_search_console(data: dict):
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+async def read_csv_upload(file, content_file=None, min_clicks=0, min_impressions=0):
+    """
+    Lire le fichier CSV de mots-clés et, s'il est fourni, le fichier de contenu
+    
+    Les fichiers (CSV, CSV compressé, Parquet ou Arrow) sont lus directement depuis l'envoi (sans
+    fichier temporaire partagé entre les requêtes), en une seule passe, dans un thread:
+    la boucle d'événements reste disponible pendant l'analyse d'un gros fichier. Les lignes de
+    mots-clés sont filtrées par min_clicks et min_impressions puis agrégées par couple mot-clé / URL
+    (voir read_keywords_file).
+    
+    Returns:
+        Tuple (KeywordFrame des mots-clés, dictionnaire URL -> contenu ou None)
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        keywords_data = await loop.run_in_executor(None, read_keywords_file, file.file, min_clicks, min_impressions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"Nombre d'enregistrements dans le CSV: {len(keywords_data)}")
+    if len(keywords_data) == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="Le fichier CSV ne contient aucune donnée valide."
+        )
+    
+    # Traiter le fichier de contenu s'il est fourni
+    content_data = None
+    if content_file and content_file.filename:
+        try:
+            content_data = await loop.run_in_executor(None, read_content_file, content_file.file)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return keywords_data, content_data
+
 @app.post("/api/analyze/csv")
 async def analyze_csv(
     file: UploadFile = File(...),
@@ -193,7 +271,11 @@ async def analyze_csv(
     analyze_content: bool = Form(False),
     primary_keyword_only: bool = Form(False),
     min_clicks: int = Form(0),
-    min_impressions: int = Form(0)
+    min_impressions: int = Form(0),
+    analysis_type: Optional[str] = Form(None),
+    index_type: str = Form('ivf'),
+    compact_pairs: bool = Form(False),
+    store_scores: bool = Form(False)
 ):
     """Analyser les données d'un fichier CSV"""
     if not file:
@@ -204,290 +286,56 @@ async def analyze_csv(
     
     # Lire le fichier CSV
     try:
-        contents = await file.read()
-        # Sauvegarder temporairement le fichier
-        temp_file = Path("temp_upload.csv")
-        with open(temp_file, "wb") as f:
-            f.write(contents)
-        
-        # Lire avec pandas
-        encodings_to_try = ['latin1', 'utf-8', 'cp1252', 'iso-8859-1', 'utf-16']
-        success = False
-        
-        # Essayer différents séparateurs et encodages, en commençant par ";" qui est le séparateur mentionné par l'utilisateur
-        separators = [';', ',', '\t']
-        
-        for sep in separators:
-            if success:
-                break
-                
-            for encoding in encodings_to_try:
-                try:
-                    # Ajouter on_bad_lines='skip' pour ignorer les lignes problématiques
-                    df = pd.read_csv(temp_file, encoding=encoding, sep=sep, on_bad_lines='skip')
-                    print(f"Fichier CSV lu avec succès en utilisant l'encodage {encoding} et le séparateur '{sep}'")
-                    success = True
-                    break
-                except Exception as e:
-                    print(f"Échec de lecture avec l'encodage {encoding} et le séparateur '{sep}': {str(e)}")
-        
-        if not success:
-            # Dernière tentative avec des options plus permissives
-            try:
-                df = pd.read_csv(temp_file, encoding='latin1', sep=None, engine='python', on_bad_lines='skip')
-                print("Fichier CSV lu avec l'encodage latin1 et détection automatique du séparateur")
-                success = True
-            except Exception as final_e:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Impossible de lire le fichier CSV avec aucun encodage ou séparateur connu. Erreur: {str(final_e)}"
-                )
-        
-        # Vérifier que le fichier a les colonnes requises
-        print(f"Colonnes trouvées dans le CSV: {list(df.columns)}")
-        
-        # Définir les mappings de colonnes possibles (pour différents formats d'export)
-        column_mappings = {
-            # Format attendu par défaut
-            'standard': {
-                'Mot-clé': 'keyword',
-                'URL': 'url',
-                'Position': 'position',
-                'Clics': 'clicks'
-            },
-            # Format Google Search Console
-            'gsc': {
-                'Query': 'keyword',
-                'Page': 'url',
-                'Position': 'position',
-                'Clicks': 'clicks'
-            }
-        }
-        
-        # Détecter quel mapping utiliser
-        selected_mapping = None
-        for mapping_name, mapping in column_mappings.items():
-            if all(col in df.columns for col in mapping.keys()):
-                selected_mapping = mapping
-                print(f"Utilisation du mapping de colonnes '{mapping_name}'")
-                break
-        
-        if not selected_mapping:
-            # Aucun mapping ne correspond, afficher un message d'erreur détaillé
-            all_possible_columns = set()
-            for mapping in column_mappings.values():
-                all_possible_columns.update(mapping.keys())
-            
-            missing_columns = [col for col in all_possible_columns if col not in df.columns]
-            print(f"Colonnes manquantes: {missing_columns}")
-            
-            # Construire un message d'erreur clair
-            error_message = "Format de fichier CSV non reconnu. Le fichier doit contenir l'un des ensembles de colonnes suivants :\n"
-            for mapping_name, mapping in column_mappings.items():
-                error_message += f"- Format {mapping_name}: {', '.join(mapping.keys())}\n"
-            
-            raise HTTPException(
-                status_code=400, 
-                detail=error_message
-            )
-        
-        # Créer un nouveau DataFrame avec uniquement les colonnes requises et renommées
-        df_processed = pd.DataFrame()
-        for old_col, new_col in selected_mapping.items():
-            df_processed[new_col] = df[old_col]
-        
-        # Supprimer le fichier temporaire
-        os.remove(temp_file)
-        
-        # Convertir le DataFrame en format attendu par le service d'analyse
-        try:
-            keywords_data = df_processed.to_dict("records")
-            print(f"Nombre d'enregistrements dans le CSV: {len(keywords_data)}")
-            if len(keywords_data) == 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Le fichier CSV ne contient aucune donnée valide."
-                )
-        except Exception as e:
-            print(f"Erreur lors de la conversion du DataFrame: {str(e)}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Erreur lors du traitement des données CSV: {str(e)}"
-            )
-        
-        # Traiter le fichier de contenu s'il est fourni
-        content_data = None
+        keywords_data, content_data = await read_csv_upload(file, content_file, min_clicks, min_impressions)
         if content_file and content_file.filename:
             # Si un fichier de contenu est fourni, activer l'analyse de contenu
             analyze_content = True
-            
-            content_contents = await content_file.read()
-            temp_content_file = Path("temp_content_upload.csv")
-            with open(temp_content_file, "wb") as f:
-                f.write(content_contents)
-            
-            # Lire avec pandas
-            encodings_to_try = ['latin1', 'utf-8', 'cp1252', 'iso-8859-1', 'utf-16']
-            success = False
-            
-            # Essayer différents séparateurs et encodages, en commençant par ";" qui est le séparateur mentionné par l'utilisateur
-            separators = [';', ',', '\t']
-            
-            for sep in separators:
-                if success:
-                    break
-                    
-                for encoding in encodings_to_try:
-                    try:
-                        # Ajouter on_bad_lines='skip' pour ignorer les lignes problématiques
-                        content_df = pd.read_csv(temp_content_file, encoding=encoding, sep=sep, on_bad_lines='skip')
-                        print(f"Fichier de contenu CSV lu avec succès en utilisant l'encodage {encoding} et le séparateur '{sep}'")
-                        success = True
-                        break
-                    except Exception as e:
-                        print(f"Échec de lecture avec l'encodage {encoding} et le séparateur '{sep}': {str(e)}")
-            
-            if not success:
-                # Dernière tentative avec des options plus permissives
-                try:
-                    content_df = pd.read_csv(temp_content_file, encoding='latin1', sep=None, engine='python', on_bad_lines='skip')
-                    print("Fichier de contenu CSV lu avec l'encodage latin1 et détection automatique du séparateur")
-                    success = True
-                except Exception as final_e:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Impossible de lire le fichier de contenu CSV avec aucun encodage ou séparateur connu. Erreur: {str(final_e)}"
-                    )
-            
-            # Supprimer le fichier temporaire
-            os.remove(temp_content_file)
-            
-            # Vérifier que le fichier a au moins les colonnes url et content
-            print(f"Colonnes trouvées dans le fichier de contenu: {list(content_df.columns)}")
-            
-            # Définir les mappings de colonnes possibles pour le fichier de contenu
-            content_column_mappings = {
-                # Format attendu par défaut
-                'standard': {
-                    'URL': 'url',
-                    'Contenu': 'content'
-                },
-                # Format alternatif (en minuscules)
-                'alt': {
-                    'url': 'url',
-                    'content': 'content'
-                },
-                # Format spécifique avec Adresse et Extracteurs
-                'extracteur': {
-                    'Adresse': 'url',
-                    'Extracteur 1 1': 'content'
-                }
-            }
-            
-            # Détecter quel mapping utiliser
-            selected_content_mapping = None
-            for mapping_name, mapping in content_column_mappings.items():
-                if all(col in content_df.columns for col in mapping.keys()):
-                    selected_content_mapping = mapping
-                    print(f"Utilisation du mapping de colonnes de contenu '{mapping_name}'")
-                    break
-            
-            if not selected_content_mapping:
-                # Aucun mapping ne correspond, afficher un message d'erreur détaillé
-                all_possible_columns = set()
-                for mapping in content_column_mappings.values():
-                    all_possible_columns.update(mapping.keys())
-                
-                missing_columns = [col for col in all_possible_columns if col not in content_df.columns]
-                print(f"Colonnes manquantes dans le fichier de contenu: {missing_columns}")
-                
-                # Construire un message d'erreur clair
-                error_message = "Format de fichier de contenu CSV non reconnu. Le fichier doit contenir l'un des ensembles de colonnes suivants :\n"
-                for mapping_name, mapping in content_column_mappings.items():
-                    error_message += f"- Format {mapping_name}: {', '.join(mapping.keys())}\n"
-                
-                raise HTTPException(
-                    status_code=400, 
-                    detail=error_message
-                )
-            
-            # Déterminer les noms de colonnes réels à utiliser
-            url_column = next(old_col for old_col, new_col in selected_content_mapping.items() if new_col == 'url')
-            content_column = next(old_col for old_col, new_col in selected_content_mapping.items() if new_col == 'content')
-            
-            # Préparer les données de contenu
-            content_data = {}
-            
-            # Pour chaque ligne du fichier de contenu
-            for _, row in content_df.iterrows():
-                url = row[url_column]
-                
-                # Initialiser le contenu avec la colonne obligatoire
-                if pd.isna(row[content_column]):
-                    content = ""
-                else:
-                    content = str(row[content_column])
-                
-                # Ajouter le contenu des colonnes supplémentaires s'il y en a
-                additional_content = []
-                for col in content_df.columns:
-                    if col not in [url_column, content_column] and pd.notna(row[col]):
-                        additional_content.append(str(row[col]))
-                
-                # Fusionner tout le contenu
-                if additional_content:
-                    content = content + " " + " ".join(additional_content)
-                
-                # Stocker dans le dictionnaire
-                content_data[url] = content
-            
-            print(f"Nombre d'URLs avec contenu: {len(content_data)}")
         
         # Récupérer les données de scraping si nécessaire et si aucun fichier de contenu n'est fourni
+        if analysis_type == 'site_content':
+            # La recherche sur tout le site repose uniquement sur le contenu des pages
+            analyze_content = True
+        
         scraped_data = None
+        content_embeddings = None
         if analyze_content and not content_data:
-            # Scraper les URLs si nécessaire
+            # Scraper les URLs avec le moteur asynchrone (comme pour la Search Console): le serveur reste disponible
             print("Scraping des URLs...")
-            scraped_data = {}
-            for item in keywords_data:
-                url = item["url"]
-                if url not in scraped_data:
-                    try:
-                        scraped_content = web_scraper.scrape_url(url)
-                        if scraped_content:
-                            scraped_data[url] = scraped_content
-                    except Exception as e:
-                        print(f"Erreur lors du scraping de {url}: {str(e)}")
+            scraped_data, content_embeddings = await scrape_pages(keywords_data.unique_urls())
         
         # Utiliser les données de contenu fournies si disponibles
         if content_data:
             print("Utilisation des données de contenu fournies...")
-            # Convertir les données de contenu au format attendu par le service d'analyse
-            formatted_content_data = {}
-            for url, content in content_data.items():
-                formatted_content_data[url] = {
-                    'title': "",  # Par défaut, titre vide
-                    'meta_description': "",  # Par défaut, meta description vide
-                    'h1': [],  # Par défaut, h1 vide
-                    'h2': [],  # Par défaut, h2 vide
-                    'content': content  # Le contenu fusionné
-                }
-            scraped_data = formatted_content_data
+            scraped_data = format_content_data(content_data)
         
         # Analyser la cannibalisation
         try:
-            results = await similarity_analyzer.analyze_keywords_async(
-                keywords_data, 
-                similarity_threshold,
-                primary_keyword_only,
-                scraped_data,
-                min_clicks,
-                min_impressions
-            )
+            if analysis_type == 'site_content':
+                results = await similarity_analyzer.analyze_site_content_async(
+                    scraped_data,
+                    similarity_threshold,
+                    keywords_data,
+                    min_clicks,
+                    min_impressions,
+                    index_type,
+                    content_embeddings=content_embeddings
+                )
+            else:
+                results = await similarity_analyzer.analyze_keywords_async(
+                    keywords_data, 
+                    similarity_threshold,
+                    primary_keyword_only,
+                    scraped_data,
+                    min_clicks,
+                    min_impressions,
+                    compact_pairs,
+                    store_scores,
+                    content_embeddings
+                )
             
             # Ajouter les données de scraping aux résultats si elles ont été récupérées
             if scraped_data:
-                results["scraped_data"] = scraped_data
+                results["scraped_data"] = WebScraper.without_content(scraped_data)
             
             return results
         except Exception as e:
@@ -495,12 +343,259 @@ async def analyze_csv(
             import traceback
             print(traceback.format_exc())
             raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erreur générale: {str(e)}")
         import traceback
         print(traceback.format_exc())
         raise HTTPException(status_code=400, detail=str(e))
 
+def ndjson_event(event):
+    """Sérialiser un événement d'analyse en une ligne NDJSON"""
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+async def scrape_with_progress(urls, scraped_data, content_embeddings=None, progress_every=10):
+    """
+    Scraper les URLs en produisant des événements de progression
+    
+    Les résultats sont ajoutés à scraped_data, dans l'ordre des URLs fournies. Si content_embeddings
+    est fourni, les embeddings de contenu y sont ajoutés, calculés par micro-lots pendant le
+    scraping (voir SimilarityAnalyzer.iter_embed_pages_async).
+    """
+    results = {}
+    pages = web_scraper.iter_scrape_urls_async(urls)
+    if content_embeddings is not None:
+        pages = similarity_analyzer.iter_embed_pages_async(pages, content_embeddings)
+    
+    yield {'type': 'progress', 'stage': 'scraping', 'pages': 0, 'total': len(urls)}
+    async for url, data in pages:
+        results[url] = data
+        if len(results) % progress_every == 0 and len(results) < len(urls):
+            yield {'type': 'progress', 'stage': 'scraping', 'pages': len(results), 'total': len(urls)}
+    
+    scraped_data.update((url, results[url]) for url in urls)
+    if content_embeddings is not None:
+        # Embeddings dans l'ordre des URLs, comme s'ils étaient calculés à partir de scraped_data
+        embeddings = {url: content_embeddings[url] for url in scraped_data if url in content_embeddings}
+        content_embeddings.clear()
+        content_embeddings.update(embeddings)
+    yield {'type': 'progress', 'stage': 'scraped', 'pages': len(results), 'total': len(urls)}
+
+async def scrape_pages(urls):
+    """
+    Scraper les URLs sans événements de progression (voir scrape_with_progress)
+    
+    Returns:
+        Tuple (données scrapées par URL, embeddings de contenu par URL)
+    """
+    scraped_data = {}
+    content_embeddings = {}
+    async for _ in scrape_with_progress(urls, scraped_data, content_embeddings):
+        pass
+    return scraped_data, content_embeddings
+
+async def analysis_events(keywords_data, scraped_data, analysis_type, similarity_threshold, primary_keyword_only, min_clicks, min_impressions, index_type, store_scores=False, content_embeddings=None):
+    """Produire les événements de l'analyse: les groupes au fil de l'eau, puis le résumé"""
+    if analysis_type == 'site_content':
+        # Les groupes de contenu (composantes connexes) ne sont connus qu'une fois toutes les paires trouvées
+        results = await similarity_analyzer.analyze_site_content_async(
+            scraped_data,
+            similarity_threshold,
+            keywords_data,
+            min_clicks,
+            min_impressions,
+            index_type,
+            content_embeddings=content_embeddings
+        )
+        for group in results.pop('groups'):
+            yield {'type': 'group', 'group': group}
+        yield {'type': 'summary', **results}
+        return
+    
+    async for event in similarity_analyzer.iter_analyze_keywords_async(
+        keywords_data,
+        similarity_threshold,
+        primary_keyword_only,
+        scraped_data,
+        min_clicks,
+        min_impressions,
+        store_scores,
+        content_embeddings
+    ):
+        yield event
+
+@app.post("/api/analyze/search-console/stream")
+async def analyze_search_console_stream(data: dict):
+    """
+    Analyser les données de la Search Console en flux NDJSON (un événement JSON par ligne)
+    
+    Les événements 'progress' signalent l'avancement (lignes récupérées, pages scrapées,
+    embeddings calculés), chaque groupe cannibalisé est envoyé dans un événement 'group'
+    dès qu'il est évalué, puis un événement 'summary' termine le flux ('error' en cas d'échec).
+    """
+    site_url = data.get('site_url')
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    similarity_threshold = float(data.get('similarity_threshold', 0.8))
+    primary_keyword_only = data.get('primary_keyword_only', False)
+    min_clicks = int(data.get('min_clicks', 0))
+    min_impressions = int(data.get('min_impressions', 0))
+    max_rows = int(data.get('max_rows', 100000))
+    use_date_chunks = data.get('use_date_chunks', True)
+    chunk_size = int(data.get('chunk_size', 7))
+    analysis_type = data.get('analysis_type')
+    index_type = data.get('index_type', 'ivf')
+    store_scores = data.get('store_scores', False)
+    
+    async def events():
+        try:
+            yield ndjson_event({'type': 'progress', 'stage': 'fetching'})
+            fetch_report = {}
+            keywords_data = await similarity_analyzer.ingest_keyword_batches_async(
+                search_console_service.iter_keyword_batches(
+                    site_url,
+                    start_date,
+                    end_date,
+                    ['query', 'page'],
+                    max_rows=max_rows,
+                    use_date_chunks=use_date_chunks,
+                    chunk_size=chunk_size,
+                    report=fetch_report
+                ),
+                max_rows=max_rows,
+                report=fetch_report
+            )
+            yield ndjson_event({
+                'type': 'progress',
+                'stage': 'fetched',
+                'rows': len(keywords_data),
+                'truncated_windows': fetch_report.get('truncated_windows', 0),
+                'dropped_rows': fetch_report.get('dropped_rows', 0)
+            })
+            
+            scraped_data = None
+            content_embeddings = None
+            if data.get('scrape_pages', False) or analysis_type == 'site_content':
+                scraped_data = {}
+                content_embeddings = {}
+                async for event in scrape_with_progress(keywords_data.unique_urls(), scraped_data, content_embeddings):
+                    yield ndjson_event(event)
+            
+            async for event in analysis_events(
+                keywords_data,
+                scraped_data,
+                analysis_type,
+                similarity_threshold,
+                primary_keyword_only,
+                min_clicks,
+                min_impressions,
+                index_type,
+                store_scores,
+                content_embeddings
+            ):
+                yield ndjson_event(event)
+        except Exception as e:
+            print(f"Erreur lors de l'analyse en flux: {str(e)}")
+            import traceback
+            print(traceback.format_exc())
+            yield ndjson_event({'type': 'error', 'message': str(e)})
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/api/analyze/csv/stream")
+async def analyze_csv_stream(
+    file: UploadFile = File(...),
+    content_file: Optional[UploadFile] = File(None),
+    similarity_threshold: float = Form(0.8),
+    analyze_content: bool = Form(False),
+    primary_keyword_only: bool = Form(False),
+    min_clicks: int = Form(0),
+    min_impressions: int = Form(0),
+    analysis_type: Optional[str] = Form(None),
+    index_type: str = Form('ivf'),
+    store_scores: bool = Form(False)
+):
+    """Analyser les données d'un fichier CSV en flux NDJSON (mêmes événements que /api/analyze/search-console/stream)"""
+    if file.filename == "":
+        raise HTTPException(status_code=400, detail="No selected file")
+    
+    # Les fichiers sont lus avant le début du flux: une erreur de format reste une réponse HTTP 400
+    try:
+        keywords_data, content_data = await read_csv_upload(file, content_file, min_clicks, min_impressions)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erreur générale: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if content_file and content_file.filename or analysis_type == 'site_content':
+        analyze_content = True
+    
+    async def events():
+        try:
+            yield ndjson_event({'type': 'progress', 'stage': 'fetched', 'rows': len(keywords_data)})
+            
+            scraped_data = None
+            content_embeddings = None
+            if content_data:
+                scraped_data = format_content_data(content_data)
+            elif analyze_content:
+                scraped_data = {}
+                content_embeddings = {}
+                async for event in scrape_with_progress(keywords_data.unique_urls(), scraped_data, content_embeddings):
+                    yield ndjson_event(event)
+            
+            async for event in analysis_events(
+                keywords_data,
+                scraped_data,
+                analysis_type,
+                similarity_threshold,
+                primary_keyword_only,
+                min_clicks,
+                min_impressions,
+                index_type,
+                store_scores,
+                content_embeddings
+            ):
+                yield ndjson_event(event)
+        except Exception as e:
+            print(f"Erreur lors de l'analyse en flux: {str(e)}")
+            import traceback
+            print(traceback.format_exc())
+            yield ndjson_event({'type': 'error', 'message': str(e)})
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/api/analyze/rethreshold")
+async def rethreshold_analysis(data: dict):
+    """
+    Ré-appliquer un seuil, des niveaux de risque ou des filtres plus stricts à une analyse déjà calculée
+    
+    L'analyse est désignée par l'analysis_id renvoyé par les endpoints d'analyse; la réponse a le
+    même format, avec en plus l'histogramme du nombre de mots-clés cannibalisés par seuil.
+    """
+    analysis_id = data.get('analysis_id')
+    if not analysis_id:
+        raise HTTPException(status_code=400, detail="analysis_id manquant")
+    
+    min_clicks = data.get('min_clicks')
+    min_impressions = data.get('min_impressions')
+    try:
+        return await similarity_analyzer.rethreshold_analysis_async(
+            analysis_id,
+            float(data.get('similarity_threshold', 0.8)),
+            int(min_clicks) if min_clicks is not None else None,
+            int(min_impressions) if min_impressions is not None else None,
+            float(data.get('risk_margin', 0.1)),
+            data.get('compact_pairs', False),
+            int(data.get('histogram_bins', 20))
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"{e.args[0]}. Relancez l'analyse.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/api/report")
 async def generate_report(data: Dict[str, Any]):
     """Générer un rapport de cannibalisation"""
@@ -0,0 +1,281 @@
+import numpy as np
+import time
+
+class ExactIndex:
+    """Index de recherche exacte (force brute par blocs) sur des embeddings normalisés"""
+    
+    index_type = 'exact'
+    
+    def __init__(self, block_size=1024):
+        self.block_size = block_size
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def build(self, embeddings, ids=None):
+        """Construire l'index à partir d'une matrice d'embeddings"""
+        self.vectors = np.zeros((0, np.asarray(embeddings).shape[1]), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.add(embeddings, ids)
+        return self
+    
+    def add(self, embeddings, ids=None):
+        """Ajouter des embeddings à l'index (identifiants consécutifs par défaut)"""
+        vectors = _normalize(embeddings)
+        if ids is None:
+            start = int(self.ids.max()) + 1 if len(self.ids) else 0
+            ids = np.arange(start, start + len(vectors))
+        self.vectors = np.concatenate([self.vectors, vectors]) if len(self.vectors) else vectors
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        return self
+    
+    def query_radius(self, queries, min_similarity):
+        """
+        Trouver, pour chaque requête, les éléments dont la similarité cosinus est >= min_similarity
+        
+        Returns:
+            Liste (une entrée par requête) de tuples (ids, similarités) triés par similarité décroissante
+        """
+        queries = _normalize(queries)
+        results = []
+        for start in range(0, len(queries), self.block_size):
+            block = queries[start:start + self.block_size] @ self.vectors.T
+            for similarities in block:
+                positions = np.nonzero(similarities >= min_similarity)[0]
+                results.append(_sorted_result(self.ids[positions], similarities[positions]))
+        return results
+    
+    def save(self, path):
+        """Sauvegarder l'index dans un fichier .npz"""
+        np.savez(path, index_type=self.index_type, vectors=self.vectors, ids=self.ids)
+    
+    @classmethod
+    def load(cls, path):
+        """Charger un index sauvegardé avec save()"""
+        data = np.load(path)
+        index = cls()
+        index.vectors = data['vectors']
+        index.ids = data['ids']
+        return index
+
+class IVFIndex:
+    """
+    Index approximatif de type IVF (inverted file) en NumPy pur
+    
+    Les embeddings normalisés sont répartis en n_lists listes par un k-means sphérique.
+    Une requête n'est comparée qu'aux éléments des n_probe listes dont le centroïde
+    est le plus proche, ce qui évite la comparaison à tous les éléments.
+    """
+    
+    index_type = 'ivf'
+    
+    def __init__(self, n_lists=None, n_probe=8, n_iterations=10, max_training_points=50000, seed=0, block_size=1024):
+        """
+        Args:
+            n_lists: Nombre de listes (par défaut: environ 4 x racine carrée du nombre d'éléments)
+            n_probe: Nombre de listes explorées par requête
+            n_iterations: Nombre d'itérations du k-means
+            max_training_points: Nombre maximum d'éléments utilisés pour entraîner le k-means
+            seed: Graine du générateur aléatoire
+            block_size: Taille des blocs de calcul lors des affectations
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iterations = n_iterations
+        self.max_training_points = max_training_points
+        self.seed = seed
+        self.block_size = block_size
+        
+        self.centroids = None
+        self.vectors = None
+        self.ids = None
+        self.assignments = None
+        self._lists = None
+    
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+    
+    def build(self, embeddings, ids=None):
+        """Entraîner les centroïdes puis indexer les embeddings"""
+        vectors = _normalize(embeddings)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        
+        self.centroids = self._train_centroids(vectors, n_lists)
+        self.vectors = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.assignments = np.zeros(0, dtype=np.int64)
+        return self.add(vectors, ids)
+    
+    def add(self, embeddings, ids=None):
+        """Ajouter des embeddings à un index déjà construit (sans ré-entraîner les centroïdes)"""
+        if self.centroids is None:
+            return self.build(embeddings, ids)
+        
+        vectors = _normalize(embeddings)
+        if ids is None:
+            start = int(self.ids.max()) + 1 if len(self.ids) else 0
+            ids = np.arange(start, start + len(vectors))
+        
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self._lists = None
+        return self
+    
+    def query_radius(self, queries, min_similarity, n_probe=None):
+        """
+        Trouver, pour chaque requête, les éléments dont la similarité cosinus est >= min_similarity
+        
+        Returns:
+            Liste (une entrée par requête) de tuples (ids, similarités) triés par similarité décroissante
+        """
+        queries = _normalize(queries)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        order, offsets = self._inverted_lists()
+        
+        results = []
+        for start in range(0, len(queries), self.block_size):
+            block = queries[start:start + self.block_size]
+            centroid_similarities = block @ self.centroids.T
+            probes = np.argpartition(-centroid_similarities, n_probe - 1, axis=1)[:, :n_probe]
+            
+            for query, lists in zip(block, probes):
+                candidates = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists])
+                similarities = self.vectors[candidates] @ query
+                keep = similarities >= min_similarity
+                results.append(_sorted_result(self.ids[candidates[keep]], similarities[keep]))
+        return results
+    
+    def save(self, path):
+        """Sauvegarder l'index dans un fichier .npz"""
+        np.savez(
+            path,
+            index_type=self.index_type,
+            centroids=self.centroids,
+            vectors=self.vectors,
+            ids=self.ids,
+            assignments=self.assignments,
+            n_probe=self.n_probe
+        )
+    
+    @classmethod
+    def load(cls, path):
+        """Charger un index sauvegardé avec save()"""
+        data = np.load(path)
+        index = cls(n_lists=len(data['centroids']), n_probe=int(data['n_probe']))
+        index.centroids = data['centroids']
+        index.vectors = data['vectors']
+        index.ids = data['ids']
+        index.assignments = data['assignments']
+        return index
+    
+    def _train_centroids(self, vectors, n_lists):
+        """k-means sphérique (similarité cosinus) sur un échantillon des embeddings"""
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.max_training_points:
+            vectors = vectors[rng.choice(len(vectors), self.max_training_points, replace=False)]
+        
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(self.n_iterations):
+            assignments = self._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=n_lists)
+            
+            # Les listes vides reçoivent un élément tiré au hasard
+            empty = np.nonzero(counts == 0)[0]
+            if len(empty):
+                sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+            centroids = _normalize(sums)
+        
+        return centroids
+    
+    def _assign(self, vectors, centroids=None):
+        """Affecter chaque embedding à la liste du centroïde le plus proche"""
+        centroids = self.centroids if centroids is None else centroids
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), self.block_size):
+            block = vectors[start:start + self.block_size] @ centroids.T
+            assignments[start:start + self.block_size] = np.argmax(block, axis=1)
+        return assignments
+    
+    def _inverted_lists(self):
+        """Positions des éléments triées par liste, avec les bornes de chaque liste"""
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind='stable')
+            counts = np.bincount(self.assignments, minlength=len(self.centroids))
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            self._lists = (order, offsets)
+        return self._lists
+
+# Implémentations disponibles, sélectionnables par leur nom
+INDEX_TYPES = {
+    ExactIndex.index_type: ExactIndex,
+    IVFIndex.index_type: IVFIndex
+}
+
+def create_index(index_type='ivf', **kwargs):
+    """Créer un index vide du type demandé ('exact' ou 'ivf')"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Type d'index inconnu: {index_type}. Types disponibles: {', '.join(INDEX_TYPES)}")
+    return INDEX_TYPES[index_type](**kwargs)
+
+def load_index(path):
+    """Charger un index sauvegardé, quel que soit son type"""
+    index_type = str(np.load(path)['index_type'])
+    return INDEX_TYPES[index_type].load(path)
+
+def measure_recall(index, embeddings, min_similarity, sample_size=200, seed=0):
+    """
+    Mesurer le rappel d'un index par rapport à la recherche exacte
+    
+    Un échantillon de requêtes est tiré parmi les embeddings indexés; le rappel est la
+    part des voisins exacts (similarité >= min_similarity) retrouvés par l'index. La
+    requête elle-même, toujours retrouvée, n'est pas comptée parmi ses voisins.
+    
+    Returns:
+        Dictionnaire avec le rappel, le nombre de requêtes et les temps de recherche
+    """
+    vectors = _normalize(embeddings)
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)
+    
+    start_time = time.time()
+    approximate = index.query_radius(vectors[sample], min_similarity)
+    approximate_time = time.time() - start_time
+    
+    ids = index.ids if len(index) == len(vectors) else None
+    start_time = time.time()
+    exact = ExactIndex().build(vectors, ids).query_radius(vectors[sample], min_similarity)
+    exact_time = time.time() - start_time
+    
+    query_ids = ids[sample] if ids is not None else sample
+    found = 0
+    expected = 0
+    for query_id, (approximate_ids, _), (exact_ids, _) in zip(query_ids, approximate, exact):
+        exact_ids = exact_ids[exact_ids != query_id]
+        expected += len(exact_ids)
+        found += len(np.intersect1d(approximate_ids, exact_ids))
+    
+    return {
+        'recall': found / expected if expected else 1.0,
+        'queries': len(sample),
+        'exact_neighbors': expected,
+        'approximate_search_seconds': approximate_time,
+        'exact_search_seconds': exact_time
+    }
+
+def _normalize(embeddings):
+    """Normaliser des embeddings (norme L2) en float32"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _sorted_result(ids, similarities):
+    """Trier un résultat de recherche par similarité décroissante"""
+    order = np.argsort(-similarities, kind='stable')
+    return ids[order], similarities[order]
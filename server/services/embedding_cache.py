@@ -0,0 +1,229 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # fcntl n'existe pas sous Windows: un seul processus doit alors utiliser le cache
+    fcntl = None
+
+class EmbeddingCache:
+    """Cache persistant des embeddings, indexé par (nom du modèle, hash du texte)
+    
+    Les vecteurs sont stockés dans un fichier mappé en mémoire (np.memmap) de taille
+    fixe, un index JSON associe chaque clé à un emplacement du fichier. Lorsque le
+    cache est plein, l'entrée la moins récemment utilisée (LRU) est remplacée; si l'index
+    sur le disque référence encore son emplacement, il est réécrit avant le remplacement,
+    pour qu'un arrêt avant flush() ne laisse pas une clé pointer vers le vecteur d'une autre.
+    
+    L'index est tenu en mémoire par le processus qui utilise le cache: chaque processus
+    (plusieurs workers uvicorn, par exemple) verrouille son propre répertoire de cache
+    (voir _lock_directory).
+    """
+    
+    def __init__(self, cache_dir, model_name, max_entries=100000, dtype='float32'):
+        """
+        Args:
+            cache_dir (str): Répertoire racine du cache
+            model_name (str): Nom du modèle Sentence Transformers
+            max_entries (int): Nombre maximum d'embeddings conservés
+            dtype (str): Type de stockage des vecteurs ('float32' ou 'float16')
+        """
+        if dtype not in ('float32', 'float16'):
+            raise ValueError(f"Type de stockage non supporté pour le cache d'embeddings: {dtype}")
+        
+        self.model_name = model_name
+        self.max_entries = int(max_entries)
+        self.dtype = np.dtype(dtype)
+        self.directory = self._lock_directory(os.path.join(cache_dir, model_name.replace('/', '__')))
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.vectors_path = os.path.join(self.directory, f'vectors.{dtype}.bin')
+        
+        self.dimension = None
+        self.vectors = None
+        self.entries = OrderedDict()  # clé -> emplacement, du moins au plus récemment utilisé
+        self.free_slots = []
+        self.next_slot = 0
+        # Emplacements référencés par l'index sur le disque (index.json)
+        self.disk_slots = set()
+        self._lock = threading.Lock()
+        
+        self._load()
+    
+    def key(self, text):
+        """Calculer la clé de cache d'un texte pour le modèle courant"""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+    
+    def get_many(self, texts):
+        """
+        Rechercher les embeddings d'une liste de textes
+        
+        Returns:
+            Tuple (dictionnaire position -> embedding trouvé, liste des positions manquantes)
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = self.key(text)
+                slot = self.entries.get(key)
+                if slot is None:
+                    missing.append(i)
+                    continue
+                self.entries.move_to_end(key)
+                # Copie: l'emplacement peut être remplacé par un put_many d'un autre thread
+                found[i] = np.array(self.vectors[slot], dtype=np.float32)
+        return found, missing
+    
+    def put_many(self, texts, embeddings):
+        """Enregistrer les embeddings d'une liste de textes"""
+        embeddings = np.asarray(embeddings)
+        if len(texts) == 0:
+            return
+        
+        with self._lock:
+            if self.vectors is None:
+                self._open_vectors(embeddings.shape[1])
+            elif embeddings.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Dimension d'embedding incohérente avec le cache: {embeddings.shape[1]} au lieu de {self.dimension}"
+                )
+            
+            placed = []
+            new_keys = set()
+            for text, embedding in zip(texts, embeddings):
+                key = self.key(text)
+                slot = self.entries.get(key)
+                if slot is None:
+                    slot = self._allocate_slot()
+                    new_keys.add(key)
+                self.entries[key] = slot
+                self.entries.move_to_end(key)
+                placed.append((slot, embedding))
+            
+            # Un emplacement évincé peut encore être référencé par l'index sur le disque: l'éviction
+            # y est enregistrée avant que le vecteur ne soit remplacé, sans les nouvelles clés
+            if any(self.entries.get(key) in self.disk_slots for key in new_keys):
+                self._write_index(exclude=new_keys)
+            for slot, embedding in placed:
+                self.vectors[slot] = embedding.astype(self.dtype)
+    
+    def flush(self):
+        """Écrire les vecteurs et l'index sur le disque"""
+        with self._lock:
+            if self.vectors is None:
+                return
+            self._write_index()
+    
+    def _write_index(self, exclude=()):
+        """Écrire les vecteurs puis l'index (sans les clés de exclude) sur le disque"""
+        self.vectors.flush()
+        
+        entries = [(key, slot) for key, slot in self.entries.items() if key not in exclude]
+        index = {
+            'model_name': self.model_name,
+            'dimension': self.dimension,
+            'dtype': self.dtype.name,
+            'max_entries': self.max_entries,
+            'entries': entries
+        }
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+        self.disk_slots = {slot for _, slot in entries}
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def _lock_directory(self, directory):
+        """
+        Verrouiller (jusqu'à la fin du processus) un répertoire de cache non utilisé par un autre processus
+        
+        Le premier processus utilise directory, les suivants directory/process-1, directory/process-2...
+        Ces répertoires sont réutilisés d'un lancement à l'autre.
+        """
+        candidate = directory
+        number = 0
+        while True:
+            os.makedirs(candidate, exist_ok=True)
+            if fcntl is None:
+                return candidate
+            lock_file = open(os.path.join(candidate, 'lock'), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                number += 1
+                candidate = os.path.join(directory, f'process-{number}')
+                continue
+            self._lock_file = lock_file
+            if number:
+                print(f"Cache d'embeddings déjà utilisé par un autre processus, utilisation de {candidate}")
+            return candidate
+    
+    def _allocate_slot(self):
+        """Trouver un emplacement libre, en évinçant l'entrée la moins récemment utilisée si nécessaire"""
+        if self.free_slots:
+            return self.free_slots.pop()
+        if self.next_slot < self.max_entries:
+            self.next_slot += 1
+            return self.next_slot - 1
+        _, slot = self.entries.popitem(last=False)
+        return slot
+    
+    def _open_vectors(self, dimension):
+        """Ouvrir (ou créer) le fichier de vecteurs mappé en mémoire"""
+        self.dimension = int(dimension)
+        mode = 'r+' if os.path.exists(self.vectors_path) else 'w+'
+        self.vectors = np.memmap(
+            self.vectors_path,
+            dtype=self.dtype,
+            mode=mode,
+            shape=(self.max_entries, self.dimension)
+        )
+    
+    def _load(self):
+        """Charger l'index existant s'il est compatible avec la configuration courante"""
+        if not os.path.exists(self.index_path):
+            # Un fichier de vecteurs sans index n'est pas exploitable
+            self._reset_files()
+            return
+        
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Index du cache d'embeddings illisible, il sera reconstruit: {str(e)}")
+            self._reset_files()
+            return
+        
+        if index.get('dtype') != self.dtype.name or index.get('max_entries') != self.max_entries:
+            print("Configuration du cache d'embeddings modifiée, le cache existant est ignoré")
+            self._reset_files()
+            return
+        
+        expected_size = self.max_entries * index['dimension'] * self.dtype.itemsize
+        if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) != expected_size:
+            print("Fichier de vecteurs du cache d'embeddings manquant ou tronqué, le cache existant est ignoré")
+            self._reset_files()
+            return
+        
+        self._open_vectors(index['dimension'])
+        self.entries = OrderedDict((key, slot) for key, slot in index['entries'])
+        
+        # Les emplacements non référencés (après éviction partielle) sont réutilisables
+        used_slots = set(self.entries.values())
+        self.disk_slots = used_slots
+        self.next_slot = max(used_slots) + 1 if used_slots else 0
+        self.free_slots = [slot for slot in range(self.next_slot) if slot not in used_slots]
+        print(f"Cache d'embeddings chargé: {len(self.entries)} entrées ({self.directory})")
+    
+    def _reset_files(self):
+        """Supprimer les fichiers d'un cache incompatible"""
+        for path in (self.index_path, self.vectors_path):
+            if os.path.exists(path):
+                os.remove(path)
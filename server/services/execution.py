@@ -0,0 +1,166 @@
+import os
+import asyncio
+import tempfile
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from server.services.pair_scoring import score_group_shard, write_shared_files
+
+class ExecutionBackend:
+    """Backend d'exécution des analyses: 'inline', 'thread' ou 'process'
+    
+    - inline: le calcul s'exécute directement dans la coroutine appelante
+    - thread: le calcul s'exécute dans le pool de threads par défaut de la boucle asyncio
+    - process: comme 'thread', mais le calcul des paires est réparti par lots de groupes
+      entre plusieurs processus (pas de GIL, utilisation de tous les cœurs)
+    """
+    
+    MODES = ('inline', 'thread', 'process')
+    
+    def __init__(self, mode='thread', max_workers=None, min_pairs=50000, shards_per_worker=4, queue_size=64):
+        """
+        Args:
+            mode: Mode d'exécution ('inline', 'thread' ou 'process')
+            max_workers: Nombre de processus de calcul (par défaut: nombre de cœurs)
+            min_pairs: Nombre minimum de paires pour répartir le calcul entre les processus
+            shards_per_worker: Nombre de lots par processus (équilibrage de la charge)
+            queue_size: Nombre maximum de résultats en attente entre un générateur de calcul
+                et la coroutine qui le consomme (voir iterate)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Mode d'exécution inconnu: {mode}. Modes disponibles: {', '.join(self.MODES)}")
+        
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_pairs = min_pairs
+        self.shards_per_worker = shards_per_worker
+        self.queue_size = queue_size
+        self._pool = None
+    
+    async def run(self, func, *args):
+        """Exécuter une fonction de calcul depuis une coroutine selon le mode configuré"""
+        if self.mode == 'inline':
+            return func(*args)
+        
+        # En mode 'process', l'orchestration reste dans un thread: seul le calcul des paires
+        # est envoyé aux processus, les résultats n'ont donc pas à être sérialisés en entier
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+    
+    async def iterate(self, func, *args):
+        """
+        Consommer un générateur de calcul depuis une coroutine selon le mode configuré
+        
+        Hors mode 'inline', le générateur s'exécute dans un thread et ses éléments sont
+        transmis par une file bornée: si le consommateur est lent (client réseau), le calcul
+        est suspendu au lieu d'accumuler les résultats en mémoire. Si le consommateur
+        s'arrête, le générateur est interrompu à l'élément suivant.
+        """
+        if self.mode == 'inline':
+            for item in func(*args):
+                yield item
+            return
+        
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        stopped = threading.Event()
+        end = object()
+        
+        def put(item, error=None):
+            asyncio.run_coroutine_threadsafe(queue.put((item, error)), loop).result()
+        
+        def produce():
+            try:
+                for item in func(*args):
+                    if stopped.is_set():
+                        return
+                    put(item)
+            except Exception as e:
+                put(end, e)
+                return
+            put(end)
+        
+        loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is end:
+                    if error is not None:
+                        raise error
+                    break
+                yield item
+        finally:
+            stopped.set()
+            # Libérer le générateur s'il attend une place dans la file
+            while not queue.empty():
+                queue.get_nowait()
+    
+    def distributes(self, total_pairs):
+        """Indiquer si le calcul de total_pairs paires doit être réparti entre les processus"""
+        return self.mode == 'process' and self.max_workers > 1 and total_pairs >= self.min_pairs
+    
+    def score_groups(self, groups_pairs, urls, positions, content_matrix):
+        """
+        Calculer les scores des paires demandées de chaque groupe dans les processus de calcul
+        
+        Les groupes sont découpés en lots contigus de taille équivalente (en nombre de paires)
+        et les résultats sont restitués dans l'ordre des groupes, quel que soit l'ordre de
+        fin des processus: la fusion est déterministe.
+        
+        Args:
+            groups_pairs: Liste de tuples (identifiants des URLs, indices i, indices j des paires à
+                calculer), un par groupe
+            urls: URLs internées (identifiant -> URL)
+            positions: Ligne de chaque URL dans content_matrix (-1 si pas d'embedding)
+            content_matrix: Embeddings de contenu normalisés (ou None)
+        
+        Yields:
+            Les scores des paires demandées de chaque groupe, dans l'ordre des groupes
+        """
+        shards = self._make_shards(groups_pairs)
+        directory = tempfile.mkdtemp(prefix='cannibalisation-')
+        try:
+            shared_files = write_shared_files(directory, urls, positions, content_matrix)
+            pool = self._get_pool()
+            print(f"Calcul des paires réparti en {len(shards)} lots sur {self.max_workers} processus")
+            for shard_results in pool.map(score_group_shard, [shared_files] * len(shards), shards):
+                for scores in shard_results:
+                    yield scores
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    
+    def shutdown(self):
+        """Arrêter les processus de calcul"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+    
+    def _make_shards(self, groups_pairs):
+        """Découper les groupes en lots contigus d'un nombre de paires comparable"""
+        costs = [len(rows) for _, rows, _ in groups_pairs]
+        target = max(1, sum(costs) // (self.max_workers * self.shards_per_worker))
+        
+        shards = []
+        current = []
+        current_cost = 0
+        for group_pairs, cost in zip(groups_pairs, costs):
+            current.append(group_pairs)
+            current_cost += cost
+            if current_cost >= target:
+                shards.append(current)
+                current = []
+                current_cost = 0
+        if current:
+            shards.append(current)
+        return shards
+    
+    def _get_pool(self):
+        """Créer le pool de processus à la première utilisation"""
+        if self._pool is None:
+            # 'spawn' évite de dupliquer l'état du processus principal (modèle, threads)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
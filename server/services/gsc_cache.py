@@ -0,0 +1,133 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from server.services.keyword_frame import KeywordFrame
+
+class SearchAnalyticsCache:
+    """Cache local (SQLite) des données Search Analytics, jour par jour
+    
+    Chaque entrée correspond aux lignes d'une journée pour un site et une liste de
+    dimensions. Les jours anciens sont immuables; les jours récents (fresh_days derniers
+    jours, dont les données peuvent encore être mises à jour par Google) expirent après
+    ttl secondes. Une journée tronquée par la limite de lignes n'est réutilisée que pour
+    une limite inférieure ou égale.
+    """
+    
+    def __init__(self, path, ttl=21600, fresh_days=3):
+        """
+        Args:
+            path (str): Chemin du fichier SQLite
+            ttl (int): Durée de validité (en secondes) des jours récents
+            fresh_days (int): Nombre de jours (avant aujourd'hui) considérés comme récents
+        """
+        self.path = path
+        self.ttl = ttl
+        self.fresh_days = fresh_days
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS days (
+                    site TEXT, dimensions TEXT, day TEXT,
+                    fetched_at REAL, row_limit INTEGER, row_count INTEGER,
+                    PRIMARY KEY (site, dimensions, day)
+                );
+                CREATE TABLE IF NOT EXISTS rows (
+                    site TEXT, dimensions TEXT, day TEXT,
+                    keyword TEXT, url TEXT, clicks INTEGER, impressions INTEGER, ctr REAL, position REAL
+                );
+                CREATE INDEX IF NOT EXISTS rows_by_day ON rows (site, dimensions, day);
+            """)
+    
+    def missing_days(self, site_url, dimensions, days, row_limit):
+        """
+        Jours à récupérer auprès de l'API: absents du cache, récents et expirés, ou tronqués
+        par une limite de lignes inférieure à row_limit
+        
+        Args:
+            site_url (str): URL du site dans Search Console
+            dimensions (list): Dimensions des requêtes
+            days (list): Jours au format YYYY-MM-DD
+            row_limit (int): Nombre maximum de lignes par jour de la requête en cours
+        """
+        if not days:
+            return []
+        
+        with self._connect() as connection:
+            entries = {
+                day: (fetched_at, stored_limit, row_count)
+                for day, fetched_at, stored_limit, row_count in connection.execute(
+                    "SELECT day, fetched_at, row_limit, row_count FROM days "
+                    "WHERE site = ? AND dimensions = ? AND day BETWEEN ? AND ?",
+                    (site_url, self._key(dimensions), min(days), max(days))
+                )
+            }
+        
+        fresh_from = time.strftime('%Y-%m-%d', time.localtime(time.time() - self.fresh_days * 86400))
+        now = time.time()
+        missing = []
+        for day in days:
+            entry = entries.get(day)
+            if entry is None:
+                missing.append(day)
+                continue
+            fetched_at, stored_limit, row_count = entry
+            truncated = row_count >= stored_limit
+            if day >= fresh_from and now - fetched_at > self.ttl:
+                missing.append(day)
+            elif truncated and stored_limit < row_limit:
+                missing.append(day)
+        return missing
+    
+    def put_days(self, site_url, dimensions, days, frames, row_limit):
+        """Enregistrer (en remplaçant les données existantes) les lignes de plusieurs jours"""
+        key = self._key(dimensions)
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            for day, frame in zip(days, frames):
+                connection.execute("DELETE FROM rows WHERE site = ? AND dimensions = ? AND day = ?", (site_url, key, day))
+                df = frame.df
+                connection.executemany(
+                    "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    zip(
+                        [site_url] * len(df), [key] * len(df), [day] * len(df),
+                        df['keyword'].astype(str).tolist(), df['url'].astype(str).tolist(),
+                        df['clicks'].tolist(), df['impressions'].tolist(),
+                        df['ctr'].tolist(), df['position'].tolist()
+                    )
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO days VALUES (?, ?, ?, ?, ?, ?)",
+                    (site_url, key, day, now, row_limit, len(df))
+                )
+    
+    def load(self, site_url, dimensions, start_date, end_date):
+        """Lignes (non agrégées) des jours en cache entre start_date et end_date inclus"""
+        with self._connect() as connection:
+            df = pd.read_sql_query(
+                "SELECT keyword, url, clicks, impressions, ctr, position FROM rows "
+                "WHERE site = ? AND dimensions = ? AND day BETWEEN ? AND ?",
+                connection,
+                params=(site_url, self._key(dimensions), start_date, end_date)
+            )
+        return KeywordFrame.from_dataframe(df)
+    
+    def _key(self, dimensions):
+        return ','.join(dimensions)
+    
+    @contextmanager
+    def _connect(self):
+        """Connexion SQLite: transaction validée (ou annulée en cas d'erreur) puis connexion fermée"""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
@@ -0,0 +1,137 @@
+import json
+import asyncio
+from datetime import datetime, timedelta
+from urllib.parse import quote
+import aiohttp
+
+# Point d'accès par défaut de l'API Search Console
+DEFAULT_API_ENDPOINT = 'https://searchconsole.googleapis.com'
+
+class SearchConsoleApiError(Exception):
+    """Erreur renvoyée par l'API Search Console (ou par le serveur d'authentification)"""
+    
+    def __init__(self, status, message, reasons=None):
+        self.status = status
+        self.reasons = reasons or []
+        details = f" ({', '.join(self.reasons)})" if self.reasons else ''
+        super().__init__(f"HTTP {status}: {message}{details}")
+
+class SearchConsoleClient:
+    """
+    Client asynchrone de l'API REST Search Console (searchAnalytics.query et sites.list)
+    
+    Toutes les requêtes partagent une même session aiohttp (connexions keep-alive, nombre
+    de connexions limité) et ne bloquent jamais la boucle asyncio. Le jeton OAuth est
+    rafraîchi de manière asynchrone lorsqu'il expire ou qu'il est refusé (401).
+    """
+    
+    def __init__(self, credentials=None, api_endpoint=None, limit=16, limit_per_host=8, timeout=120):
+        """
+        Args:
+            credentials: Identifiants OAuth (google.oauth2.credentials.Credentials), None pour
+                un serveur sans authentification (serveur factice des benchmarks)
+            api_endpoint (str): Point d'accès de l'API (par défaut celui de Google)
+            limit (int): Nombre maximum de connexions ouvertes
+            limit_per_host (int): Nombre maximum de connexions ouvertes vers un même hôte
+            timeout (float): Durée maximum (en secondes) d'une requête
+        """
+        self.credentials = credentials
+        self.api_endpoint = (api_endpoint or DEFAULT_API_ENDPOINT).rstrip('/')
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self._session = None
+        self._session_loop = None
+        self._refresh_lock = None
+    
+    async def query(self, site_url, body):
+        """Exécuter une requête searchAnalytics.query et retourner la réponse JSON"""
+        path = f"/webmasters/v3/sites/{quote(site_url, safe='')}/searchAnalytics/query"
+        return await self._request('POST', path, body)
+    
+    async def list_sites(self):
+        """Récupérer la liste des sites (sites.list)"""
+        response = await self._request('GET', '/webmasters/v3/sites')
+        return response.get('siteEntry', [])
+    
+    async def close(self):
+        """Fermer la session (et ses connexions)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+    
+    async def _request(self, method, path, body=None):
+        """Exécuter une requête authentifiée; en cas de 401, rafraîchir le jeton et réessayer une fois"""
+        session = self._get_session()
+        for attempt in range(2):
+            headers = await self._authorization_headers(force_refresh=attempt > 0)
+            async with session.request(method, self.api_endpoint + path, json=body, headers=headers) as response:
+                if response.status == 401 and attempt == 0 and self._can_refresh():
+                    continue
+                if response.status >= 400:
+                    raise self._api_error(response.status, await response.text(), response.reason)
+                return await response.json(content_type=None) or {}
+    
+    def _get_session(self):
+        """Session partagée, recréée si elle a été fermée ou appartient à une autre boucle asyncio"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._session_loop = loop
+            self._refresh_lock = asyncio.Lock()
+        return self._session
+    
+    async def _authorization_headers(self, force_refresh=False):
+        """En-têtes d'authentification, en rafraîchissant le jeton si nécessaire"""
+        if self.credentials is None:
+            return {}
+        
+        async with self._refresh_lock:
+            # Un seul rafraîchissement pour toutes les requêtes en attente
+            if (force_refresh or not self.credentials.valid) and self._can_refresh():
+                await self._refresh_token()
+        return {'Authorization': f"Bearer {self.credentials.token}"}
+    
+    def _can_refresh(self):
+        return self.credentials is not None and getattr(self.credentials, 'refresh_token', None) is not None
+    
+    async def _refresh_token(self):
+        """Obtenir un nouveau jeton d'accès à partir du jeton de rafraîchissement"""
+        credentials = self.credentials
+        data = {
+            'grant_type': 'refresh_token',
+            'client_id': credentials.client_id,
+            'client_secret': credentials.client_secret,
+            'refresh_token': credentials.refresh_token
+        }
+        async with self._get_session().post(credentials.token_uri, data=data) as response:
+            payload = await response.json(content_type=None)
+            if response.status >= 400:
+                raise SearchConsoleApiError(response.status, payload.get('error_description') or payload.get('error', response.reason))
+        
+        credentials.token = payload['access_token']
+        # Même convention que google-auth: date d'expiration naïve en UTC
+        credentials.expiry = datetime.utcnow() + timedelta(seconds=int(payload.get('expires_in', 3600)))
+        print("Jeton d'accès Search Console rafraîchi")
+    
+    def _api_error(self, status, text, reason):
+        """Construire l'erreur correspondant à une réponse d'erreur de l'API"""
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return SearchConsoleApiError(status, reason)
+        error = payload.get('error', {}) if isinstance(payload, dict) else {}
+        if not isinstance(error, dict):
+            return SearchConsoleApiError(status, str(error))
+        reasons = [item.get('reason') for item in error.get('errors', []) if item.get('reason')]
+        return SearchConsoleApiError(status, error.get('message', reason), reasons)
@@ -0,0 +1,254 @@
+import asyncio
+import random
+import time
+
+# Codes HTTP pour lesquels une requête Search Analytics est relancée après un délai
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+class TokenBucket:
+    """Limiteur de débit à seau de jetons: au plus capacity requêtes d'affilée, puis rate par seconde"""
+    
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Nombre de jetons ajoutés par seconde
+            capacity (float): Nombre maximum de jetons disponibles d'un coup (par défaut: rate)
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Attendre qu'un jeton soit disponible puis le consommer"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class SearchAnalyticsFetcher:
+    """
+    Récupération concurrente des lignes Search Analytics de plusieurs périodes
+    
+    Chaque période est paginée par startRow; toutes les pages de toutes les périodes
+    passent par une même file traitée par `concurrency` requêtes simultanées. Le débit
+    est limité par deux seaux de jetons calés sur les quotas de l'API (requêtes par
+    seconde et par minute), et les erreurs de quota (429, 403 rateLimitExceeded) ou
+    serveur (5xx) sont relancées avec un délai exponentiel. Les lignes sont restituées
+    dans l'ordre des périodes puis des pages, quel que soit l'ordre d'arrivée des réponses.
+    """
+    
+    def __init__(self, query, concurrency=8, qps=20, qpm=1200, page_size=25000, lookahead=2, max_retries=5, backoff_base=1.0, backoff_max=64.0):
+        """
+        Args:
+            query: Coroutine query(site_url, body) -> réponse JSON de searchAnalytics.query
+            concurrency (int): Nombre maximum de requêtes en cours
+            qps (float): Nombre maximum de requêtes par seconde
+            qpm (float): Nombre maximum de requêtes par minute
+            page_size (int): Nombre de lignes demandées par requête (limite de l'API: 25000)
+            lookahead (int): Nombre de pages suivantes d'une période demandées par anticipation
+                lorsqu'une page est complète
+            max_retries (int): Nombre maximum de nouvelles tentatives par requête
+            backoff_base (float): Délai (en secondes) avant la première nouvelle tentative
+            backoff_max (float): Délai maximum entre deux tentatives
+        """
+        self.query = query
+        self.concurrency = concurrency
+        self.qps = qps
+        self.qpm = qpm
+        self.page_size = page_size
+        self.lookahead = max(1, lookahead)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {}  # statistiques de la dernière récupération
+    
+    async def fetch_windows(self, site_url, windows, dimensions, max_rows):
+        """
+        Récupérer les lignes de plusieurs périodes
+        
+        Args:
+            site_url (str): URL du site dans Search Console
+            windows (list): Liste de tuples (date de début, date de fin) au format YYYY-MM-DD
+            dimensions (list): Dimensions à récupérer
+            max_rows (int | list): Nombre maximum de lignes par période (une valeur pour toutes
+                les périodes, ou une valeur par période)
+        
+        Returns:
+            Liste (une entrée par période, dans l'ordre de windows) de listes de lignes de l'API
+        """
+        pages = [{} for _ in windows]  # période -> {numéro de page: lignes}
+        async for window, page, rows in self.iter_pages(site_url, windows, dimensions, max_rows):
+            pages[window][page] = rows
+        
+        results = []
+        for window in range(len(windows)):
+            rows = []
+            # Pages contiguës uniquement: une page manquante (erreur) interrompt la période
+            page = 0
+            while page in pages[window]:
+                rows.extend(pages[window][page])
+                page += 1
+            results.append(rows)
+            self.stats['windows'][window]['rows'] = len(rows)
+        return results
+    
+    async def iter_pages(self, site_url, windows, dimensions, max_rows):
+        """
+        Récupérer les pages de plusieurs périodes et les produire dès leur arrivée
+        
+        Les pages sont produites dans leur ordre d'arrivée. La file des pages reçues est bornée:
+        si le consommateur est plus lent que l'API, les requêtes suivantes attendent, ce qui
+        limite la mémoire aux pages en cours de traitement.
+        
+        Args:
+            Mêmes arguments que fetch_windows
+        
+        Yields:
+            Tuples (indice de la période, numéro de page, lignes de l'API)
+        """
+        if isinstance(max_rows, int):
+            max_rows = [max_rows] * len(windows)
+        
+        per_second = TokenBucket(self.qps)
+        per_minute = TokenBucket(self.qpm / 60.0, capacity=self.qps)
+        last_page = [None] * len(windows)   # dernière page (incomplète ou en erreur) de chaque période
+        window_rows = [0] * len(windows)
+        scheduled = [set() for _ in windows]
+        queue = asyncio.Queue()
+        received = asyncio.Queue(maxsize=self.concurrency * 2)
+        stats = {'requests': 0, 'retries': 0, 'failed_requests': 0, 'failed_windows': set(), 'windows': []}
+        started_at = time.time()
+        
+        def schedule(window, page):
+            start_row = page * self.page_size
+            if start_row >= max_rows[window] or page in scheduled[window]:
+                return
+            if last_page[window] is not None and page > last_page[window]:
+                return
+            scheduled[window].add(page)
+            queue.put_nowait((window, page))
+        
+        async def worker():
+            while True:
+                window, page = await queue.get()
+                try:
+                    if last_page[window] is not None and page > last_page[window]:
+                        continue
+                    start_row = page * self.page_size
+                    row_limit = min(self.page_size, max_rows[window] - start_row)
+                    start_date, end_date = windows[window]
+                    body = {
+                        'startDate': start_date,
+                        'endDate': end_date,
+                        'dimensions': dimensions,
+                        'rowLimit': row_limit,
+                        'startRow': start_row
+                    }
+                    
+                    try:
+                        response = await self._query_with_retry(site_url, body, per_second, per_minute, stats)
+                    except Exception as e:
+                        print(f"Erreur lors de la récupération des données ({start_date} à {end_date}, ligne {start_row}): {str(e)}")
+                        stats['failed_requests'] += 1
+                        stats['failed_windows'].add(window)
+                        last_page[window] = page - 1 if last_page[window] is None else min(last_page[window], page - 1)
+                        continue
+                    
+                    rows = response.get('rows', [])
+                    if len(rows) < row_limit:
+                        # Fin des données de la période: les pages suivantes sont inutiles
+                        last_page[window] = page if last_page[window] is None else min(last_page[window], page)
+                    else:
+                        for next_page in range(page + 1, page + 1 + self.lookahead):
+                            schedule(window, next_page)
+                    window_rows[window] += len(rows)
+                    await received.put((window, page, rows))
+                finally:
+                    queue.task_done()
+        
+        async def run():
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                await queue.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            # Fin des pages (uniquement si la récupération n'a pas été interrompue)
+            await received.put(None)
+        
+        for window in range(len(windows)):
+            schedule(window, 0)
+        
+        runner = asyncio.create_task(run())
+        try:
+            while True:
+                item = await received.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            if not runner.done():
+                runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+        
+        for window in range(len(windows)):
+            # Une période qui atteint sa limite de lignes est tronquée: l'API peut avoir d'autres lignes
+            stats['windows'].append({
+                'start_date': windows[window][0],
+                'end_date': windows[window][1],
+                'rows': window_rows[window],
+                'row_limit': max_rows[window],
+                'truncated': window_rows[window] >= max_rows[window]
+            })
+        stats['failed_windows'] = sorted(stats['failed_windows'])
+        stats['seconds'] = time.time() - started_at
+        self.stats = stats
+        print(
+            f"{stats['requests']} requêtes Search Analytics ({stats['retries']} relancées) "
+            f"pour {len(windows)} périodes en {stats['seconds']:.2f} secondes"
+        )
+    
+    async def _query_with_retry(self, site_url, body, per_second, per_minute, stats):
+        """Exécuter une requête en respectant les quotas, avec relance exponentielle sur les erreurs temporaires"""
+        attempt = 0
+        while True:
+            await per_minute.acquire()
+            await per_second.acquire()
+            stats['requests'] += 1
+            try:
+                return await self.query(site_url, body)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                # Délai exponentiel avec variation aléatoire pour ne pas relancer toutes les requêtes ensemble
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                stats['retries'] += 1
+                await asyncio.sleep(delay)
+
+def error_status(error):
+    """Code HTTP d'une erreur de l'API (SearchConsoleApiError, aiohttp ClientResponseError ou googleapiclient HttpError)"""
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable_error(error):
+    """Indiquer si une erreur est temporaire (quota, surcharge) et justifie une nouvelle tentative"""
+    status = error_status(error)
+    if status in RETRYABLE_STATUSES:
+        return True
+    # Les dépassements de quota de l'API Google sont parfois signalés en 403
+    message = str(error)
+    return status == 403 and ('rateLimitExceeded' in message or 'quotaExceeded' in message)
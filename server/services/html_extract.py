@@ -0,0 +1,146 @@
+import re
+import codecs
+from bs4 import BeautifulSoup, Comment
+
+try:
+    from lxml import etree
+except ImportError:  # lxml est optionnel: l'extraction se fait alors avec BeautifulSoup
+    etree = None
+
+HEADING_TAGS = ('h1', 'h2', 'h3')
+
+# Déclaration d'encodage d'une page (<meta charset>, <meta http-equiv="Content-Type">, <?xml encoding?>),
+# cherchée dans ses premiers octets
+DECLARED_CHARSET = re.compile(rb"""<(?:meta[^>]*?charset|\?xml[^>]*?encoding)\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+DECLARATION_BYTES = 4096
+BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+# Encodages déclarés remplacés comme par les navigateurs (windows-1252 étend latin-1 et ASCII)
+LEGACY_CODECS = {'iso8859-1': 'cp1252', 'ascii': 'cp1252'}
+
+def decode_html(body, charset=None):
+    """
+    Décoder le corps (octets) d'une page HTML
+    
+    L'encodage est choisi comme par les navigateurs: marque d'ordre des octets (BOM), sinon
+    charset de l'en-tête Content-Type, sinon encodage déclaré par la page, sinon UTF-8 si le
+    corps est valide (un caractère coupé à la fin par la limite de taille est toléré), sinon
+    windows-1252.
+    
+    Args:
+        body (bytes): Corps de la réponse
+        charset (str): Charset de l'en-tête Content-Type (None s'il est absent)
+    """
+    for bom, encoding in BOMS:
+        if body.startswith(bom):
+            return body.decode(encoding, errors='replace')
+    
+    declared = DECLARED_CHARSET.search(body, 0, DECLARATION_BYTES)
+    for label in (charset, declared.group(1).decode('ascii') if declared else None):
+        encoding = _codec(label)
+        if encoding:
+            return body.decode(encoding, errors='replace')
+    
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start >= len(body) - 3:
+            return body.decode('utf-8', errors='replace')
+        return body.decode('cp1252', errors='replace')
+
+def _codec(label):
+    """Nom Python d'un encodage déclaré, None s'il est absent ou inconnu"""
+    if not label:
+        return None
+    try:
+        name = codecs.lookup(label).name
+    except LookupError:
+        return None
+    return LEGACY_CODECS.get(name, name)
+
+def extract_with_beautifulsoup(html, content=False):
+    """
+    Extraire le titre, la meta description et les balises h1 à h3 d'une page HTML
+    avec BeautifulSoup (parseur html.parser, en Python pur)
+    
+    Si content est vrai, le texte visible du corps de la page (sans scripts ni styles,
+    espaces normalisés) est ajouté sous la clé 'content'.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('title')
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    data = {
+        'title': title_tag.text.strip() if title_tag else '',
+        'meta_description': meta_desc.get('content', '').strip() if meta_desc else ''
+    }
+    for tag in HEADING_TAGS:
+        data[tag] = [h.text.strip() for h in soup.find_all(tag)]
+    if content:
+        body = soup.body or soup
+        data['content'] = _normalize_space(
+            text for text in body.find_all(string=True)
+            if not isinstance(text, Comment) and text.parent.name not in ('script', 'style')
+        )
+    return data
+
+def extract_with_lxml(html, content=False):
+    """
+    Extraire les mêmes éléments qu'extract_with_beautifulsoup avec lxml (libxml2)
+    
+    L'analyse est faite en C, sans le verrou global de Python: plusieurs pages peuvent
+    être analysées en parallèle dans des threads.
+    """
+    if not html.strip():
+        return extract_with_beautifulsoup('', content)
+    try:
+        root = etree.fromstring(html, etree.HTMLParser())
+    except ValueError:
+        # Déclaration d'encodage XML dans une chaîne déjà décodée: lxml exige des octets
+        root = etree.fromstring(html.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+    if root is None:
+        return extract_with_beautifulsoup('', content)
+    
+    title_tag = root.find('.//title')
+    meta_desc = root.xpath("//meta[@name='description']")
+    data = {
+        'title': _text(title_tag).strip() if title_tag is not None else '',
+        'meta_description': meta_desc[0].get('content', '').strip() if meta_desc else ''
+    }
+    for tag in HEADING_TAGS:
+        data[tag] = [_text(h).strip() for h in root.iter(tag)]
+    if content:
+        body = root.find('body')
+        data['content'] = _normalize_space(_texts(body if body is not None else root))
+    return data
+
+def _text(element):
+    """Texte d'un élément et de ses descendants, sans commentaires ni scripts (comme .text de BeautifulSoup)"""
+    return ''.join(_texts(element))
+
+def _texts(element):
+    """Nœuds texte d'un élément et de ses descendants, sans commentaires ni scripts"""
+    return element.xpath('.//text()[not(parent::script or parent::style)]')
+
+def _normalize_space(texts):
+    """Joindre des nœuds texte en un seul texte, les suites d'espaces réduites à une espace"""
+    return ' '.join(' '.join(texts).split())
+
+EXTRACTORS = {
+    'beautifulsoup': extract_with_beautifulsoup,
+    'lxml': extract_with_lxml
+}
+
+def get_extractor(name=None):
+    """
+    Fonction d'extraction à utiliser
+    
+    Args:
+        name (str): 'lxml' ou 'beautifulsoup' (par défaut: lxml s'il est installé)
+    """
+    if not name:
+        name = 'lxml' if etree is not None else 'beautifulsoup'
+    if name not in EXTRACTORS:
+        raise ValueError(f"Extracteur HTML inconnu: {name} (disponibles: {', '.join(EXTRACTORS)})")
+    if name == 'lxml' and etree is None:
+        print("⚠️ lxml n'est pas installé, extraction avec BeautifulSoup")
+        name = 'beautifulsoup'
+    return EXTRACTORS[name]
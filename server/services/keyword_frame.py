@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+
+class KeywordFrame:
+    """Données de mots-clés en colonnes (une ligne par couple mot-clé / URL)
+    
+    Les mots-clés et les URLs sont stockés en colonnes catégorielles (codes entiers),
+    les métriques en colonnes numériques typées. Le filtrage et le regroupement sont
+    faits en une passe vectorisée, sans dictionnaire par ligne.
+    """
+    
+    COLUMNS = ('keyword', 'url', 'clicks', 'impressions', 'ctr', 'position')
+    
+    def __init__(self, df):
+        self.df = df
+    
+    @classmethod
+    def from_columns(cls, keyword, url, clicks=None, impressions=None, ctr=None, position=None):
+        """Construire un KeywordFrame à partir de colonnes (listes ou tableaux de même longueur)"""
+        return cls.from_dataframe(pd.DataFrame({
+            'keyword': keyword,
+            'url': url,
+            'clicks': clicks if clicks is not None else 0,
+            'impressions': impressions if impressions is not None else 0,
+            'ctr': ctr if ctr is not None else 0.0,
+            'position': position if position is not None else 0.0
+        }))
+    
+    @classmethod
+    def from_records(cls, records):
+        """Construire un KeywordFrame à partir d'une liste de dictionnaires"""
+        if isinstance(records, KeywordFrame):
+            return records
+        return cls.from_dataframe(pd.DataFrame.from_records(list(records)))
+    
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Construire un KeywordFrame à partir d'un DataFrame ayant (au moins) les colonnes keyword et url
+        
+        Les colonnes manquantes valent 0. Les clics et impressions sont convertis en entiers
+        (espaces supprimés, valeurs invalides remplacées par 0), comme le faisait la conversion ligne à ligne.
+        """
+        columns = {}
+        for column in ('keyword', 'url'):
+            values = df[column] if column in df.columns else pd.Series([''] * len(df), index=df.index)
+            if isinstance(values.dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(values.cat.categories):
+                # Colonne déjà catégorielle (fichier Parquet ou Arrow): seules les valeurs manquantes sont remplacées
+                values = values.array
+                if values.isna().any():
+                    if '' not in values.categories:
+                        values = values.add_categories([''])
+                    values = values.fillna('')
+                columns[column] = values
+            else:
+                columns[column] = pd.Categorical(values.fillna('').astype(str))
+        for column in ('clicks', 'impressions'):
+            columns[column] = _to_integers(df[column]) if column in df.columns else np.zeros(len(df), dtype=np.int64)
+        for column in ('ctr', 'position'):
+            columns[column] = _to_floats(df[column]) if column in df.columns else np.zeros(len(df), dtype=np.float64)
+        return cls(pd.DataFrame(columns).reset_index(drop=True))
+    
+    @classmethod
+    def empty(cls):
+        """KeywordFrame sans aucune ligne"""
+        return cls.from_columns([], [])
+    
+    @classmethod
+    def concat(cls, frames):
+        """Concaténer plusieurs KeywordFrame (les catégories sont fusionnées)"""
+        frames = [frame.df for frame in frames if len(frame)]
+        if not frames:
+            return cls.empty()
+        df = pd.concat([frame.astype({'keyword': str, 'url': str}) for frame in frames], ignore_index=True)
+        df['keyword'] = pd.Categorical(df['keyword'])
+        df['url'] = pd.Categorical(df['url'])
+        return cls(df)
+    
+    def __len__(self):
+        return len(self.df)
+    
+    def filter(self, min_clicks=0, min_impressions=0):
+        """Exclure les URLs contenant un # et appliquer les filtres de clics et impressions en une passe"""
+        urls = self.df['url']
+        # Le test du # est fait une seule fois par URL distincte, puis propagé par les codes
+        excluded_urls = np.asarray(urls.cat.categories.str.contains('#', regex=False), dtype=bool)
+        codes = urls.cat.codes.to_numpy()
+        mask = (
+            ~excluded_urls[codes]
+            & (self.df['clicks'].to_numpy() >= min_clicks)
+            & (self.df['impressions'].to_numpy() >= min_impressions)
+        )
+        df = self.df[mask].reset_index(drop=True)
+        df['keyword'] = df['keyword'].cat.remove_unused_categories()
+        df['url'] = df['url'].cat.remove_unused_categories()
+        return KeywordFrame(df)
+    
+    def unique_urls(self):
+        """URLs distinctes présentes dans les données"""
+        return list(self.df['url'].unique())
+    
+    def keyword_count(self):
+        """Nombre de mots-clés distincts"""
+        return int(self.df['keyword'].nunique())
+    
+    def keyword_groups(self, min_urls=2):
+        """
+        Regrouper les lignes par mot-clé
+        
+        Les groupes sont restitués dans l'ordre de première apparition du mot-clé, les lignes
+        de chaque groupe triées par position (meilleur classement en premier, ordre d'origine
+        en cas d'égalité). Les dictionnaires ne sont construits que pour les groupes retenus.
+        
+        Returns:
+            Liste de tuples (mot-clé, liste des lignes du groupe)
+        """
+        return self.split_groups(*self.keyword_group_rows(min_urls))
+    
+    def keyword_group_rows(self, min_urls=2):
+        """
+        Lignes des groupes de keyword_groups, sans construire de dictionnaire
+        
+        Returns:
+            Tuple (indices des lignes triées par groupe puis par position, limites des groupes
+            dans ces indices: le groupe g occupe rows[boundaries[g]:boundaries[g + 1]])
+        """
+        rows = np.zeros(0, dtype=np.int64)
+        if not len(self.df):
+            return rows, np.zeros(1, dtype=np.int64)
+        
+        group_order, keywords = pd.factorize(self.df['keyword'].cat.codes.to_numpy())
+        counts = np.bincount(group_order)
+        rows = np.nonzero(counts[group_order] >= min_urls)[0]
+        if not len(rows):
+            return rows, np.zeros(1, dtype=np.int64)
+        
+        positions = self.df['position'].to_numpy()
+        rows = rows[np.lexsort((positions[rows], group_order[rows]))]
+        group_keys = group_order[rows]
+        return rows, np.concatenate([[0], np.flatnonzero(np.diff(group_keys)) + 1, [len(rows)]])
+    
+    def primary_keywords(self):
+        """
+        Sélectionner le mot-clé principal de chaque URL
+        
+        Le mot-clé principal est celui qui génère le plus de clics, puis le plus d'impressions;
+        en cas d'égalité parfaite, la première ligne rencontrée est retenue. La sélection est
+        faite par un seul tri lexicographique, sans liste ni tri par URL.
+        
+        Returns:
+            KeywordFrame avec une ligne par URL, dans l'ordre de première apparition des URLs
+        """
+        if not len(self.df):
+            return self
+        
+        url_order, _ = pd.factorize(self.df['url'].cat.codes.to_numpy())
+        rows = np.arange(len(self.df))
+        # Clé principale en dernier: URL, puis clics et impressions décroissants, puis ordre d'origine
+        order = np.lexsort((
+            rows,
+            -self.df['impressions'].to_numpy(),
+            -self.df['clicks'].to_numpy(),
+            url_order
+        ))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = url_order[order[1:]] != url_order[order[:-1]]
+        
+        df = self.df.iloc[order[first]].reset_index(drop=True)
+        df['keyword'] = df['keyword'].cat.remove_unused_categories()
+        df['url'] = df['url'].cat.remove_unused_categories()
+        return KeywordFrame(df)
+    
+    def aggregate(self, max_rows=None):
+        """
+        Agréger les lignes d'un même couple mot-clé / URL (par exemple plusieurs jours ou périodes)
+        
+        Les clics et impressions sont additionnés, la position est la moyenne pondérée par les
+        impressions (moyenne simple si aucune impression) et le CTR est recalculé. Le regroupement
+        est fait en une passe sur les codes des colonnes catégorielles.
+        
+        Args:
+            max_rows (int): Nombre maximum de lignes conservées (les plus cliquées, puis les plus vues)
+        
+        Returns:
+            KeywordFrame trié par clics puis impressions décroissants, comme les réponses de l'API
+        """
+        if not len(self.df):
+            return self
+        
+        keywords = self.df['keyword']
+        urls = self.df['url']
+        impressions = self.df['impressions'].to_numpy()
+        positions = self.df['position'].to_numpy()
+        grouped = pd.DataFrame({
+            'keyword': keywords.cat.codes.to_numpy(),
+            'url': urls.cat.codes.to_numpy(),
+            'clicks': self.df['clicks'].to_numpy(),
+            'impressions': impressions,
+            'weighted_position': positions * impressions,
+            'position': positions
+        }).groupby(['keyword', 'url'], sort=False).agg(
+            clicks=('clicks', 'sum'),
+            impressions=('impressions', 'sum'),
+            weighted_position=('weighted_position', 'sum'),
+            position=('position', 'mean')
+        ).reset_index()
+        
+        # Tri stable: à égalité, l'ordre de première apparition est conservé
+        grouped = grouped.sort_values(['clicks', 'impressions'], ascending=False, kind='stable')
+        if max_rows is not None:
+            grouped = grouped.head(max_rows)
+        
+        clicks = grouped['clicks'].to_numpy()
+        total_impressions = grouped['impressions'].to_numpy()
+        has_impressions = total_impressions > 0
+        safe_impressions = np.where(has_impressions, total_impressions, 1)
+        df = pd.DataFrame({
+            'keyword': pd.Categorical.from_codes(grouped['keyword'].to_numpy(), keywords.cat.categories),
+            'url': pd.Categorical.from_codes(grouped['url'].to_numpy(), urls.cat.categories),
+            'clicks': clicks,
+            'impressions': total_impressions,
+            'ctr': np.where(has_impressions, clicks / safe_impressions, 0.0),
+            'position': np.where(has_impressions, grouped['weighted_position'].to_numpy() / safe_impressions, grouped['position'].to_numpy())
+        })
+        df['keyword'] = df['keyword'].cat.remove_unused_categories()
+        df['url'] = df['url'].cat.remove_unused_categories()
+        return KeywordFrame(df.reset_index(drop=True))
+    
+    def to_records(self, rows=None):
+        """Convertir (tout ou partie des lignes) en liste de dictionnaires"""
+        df = self.df if rows is None else self.df.iloc[rows]
+        columns = {column: df[column].to_numpy().tolist() for column in self.COLUMNS}
+        return [
+            dict(zip(self.COLUMNS, values))
+            for values in zip(*(columns[column] for column in self.COLUMNS))
+        ]
+    
+    def split_groups(self, rows, boundaries):
+        """Découper des lignes déjà triées par groupe (voir keyword_group_rows) en (mot-clé, lignes du groupe)"""
+        records = self.to_records(rows)
+        boundaries = np.asarray(boundaries).tolist()
+        return [
+            (records[start]['keyword'], records[start:end])
+            for start, end in zip(boundaries[:-1], boundaries[1:])
+        ]
+
+def _to_integers(series):
+    """Convertir une colonne de clics/impressions en entiers (espaces supprimés, 0 si invalide)"""
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series.astype(str).str.replace(' ', '', regex=False), errors='coerce')
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    values[~np.isfinite(values)] = 0
+    return values.astype(np.int64)
+
+def _to_floats(series):
+    """Convertir une colonne de CTR/position en flottants (virgule décimale acceptée, 0 si invalide)"""
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series.astype(str).str.replace(',', '.', regex=False).str.replace(' ', '', regex=False), errors='coerce')
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    values[~np.isfinite(values)] = 0
+    return values
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from server.services.keyword_frame import KeywordFrame
+
+class KeywordIndex:
+    """Index incrémental des couples mot-clé / URL, alimenté par lots de lignes
+    
+    Chaque lot (une page de l'API, par exemple) est agrégé dès son arrivée: les clics et
+    impressions sont additionnés, la position pondérée par les impressions, comme dans
+    KeywordFrame.aggregate. La mémoire est donc bornée par le nombre de couples distincts
+    et non par le volume brut de l'export. Mots-clés et URLs sont stockés une seule fois,
+    les métriques dans des tableaux numpy.
+    """
+    
+    def __init__(self, capacity=65536):
+        self.keyword_codes = {}
+        self.keywords = []
+        self.url_codes = {}
+        self.urls = []
+        self.slots = {}  # clé du couple (code mot-clé, code URL) -> indice dans les tableaux
+        self.rows = 0
+        self._columns = {
+            'keyword': np.zeros(capacity, dtype=np.int64),
+            'url': np.zeros(capacity, dtype=np.int64),
+            'clicks': np.zeros(capacity, dtype=np.int64),
+            'impressions': np.zeros(capacity, dtype=np.int64),
+            'weighted_position': np.zeros(capacity, dtype=np.float64),
+            'position': np.zeros(capacity, dtype=np.float64),
+            'count': np.zeros(capacity, dtype=np.int64),
+            'order': np.full(capacity, np.iinfo(np.int64).max, dtype=np.int64)
+        }
+    
+    def __len__(self):
+        return len(self.slots)
+    
+    def add(self, keyword_frame, order_start=None):
+        """
+        Ajouter un lot de lignes
+        
+        Args:
+            keyword_frame: Lignes du lot (KeywordFrame)
+            order_start (int): Rang de la première ligne du lot dans l'export complet (par défaut:
+                à la suite des lots précédents). À égalité de clics et d'impressions, les couples
+                sont restitués par rang de première apparition, quel que soit l'ordre d'arrivée des lots.
+        """
+        df = keyword_frame.df
+        if not len(df):
+            return
+        if order_start is None:
+            order_start = self.rows
+        self.rows += len(df)
+        
+        # Les chaînes sont traduites une fois par catégorie du lot, puis propagées par les codes
+        keyword_codes = self._intern(df['keyword'].cat.categories, self.keyword_codes, self.keywords)[df['keyword'].cat.codes.to_numpy()]
+        url_codes = self._intern(df['url'].cat.categories, self.url_codes, self.urls)[df['url'].cat.codes.to_numpy()]
+        # Une seule recherche par couple distinct du lot (un export contient souvent plusieurs lignes par couple)
+        key_rows, batch_keys = pd.factorize((keyword_codes << 32) | url_codes)
+        slots = _lookup_or_add(batch_keys.tolist(), self.slots)[key_rows]
+        self._reserve(len(self.slots))
+        
+        columns = self._columns
+        impressions = df['impressions'].to_numpy()
+        positions = df['position'].to_numpy()
+        columns['keyword'][slots] = keyword_codes
+        columns['url'][slots] = url_codes
+        np.add.at(columns['clicks'], slots, df['clicks'].to_numpy())
+        np.add.at(columns['impressions'], slots, impressions)
+        np.add.at(columns['weighted_position'], slots, positions * impressions)
+        np.add.at(columns['position'], slots, positions)
+        np.add.at(columns['count'], slots, 1)
+        np.minimum.at(columns['order'], slots, order_start + np.arange(len(df), dtype=np.int64))
+    
+    def to_frame(self, max_rows=None, sort=True):
+        """
+        Couples agrégés, triés par clics puis impressions décroissants (rang de première
+        apparition en cas d'égalité), au format de KeywordFrame.aggregate
+        
+        Args:
+            max_rows (int): Nombre maximum de couples restitués
+            sort (bool): Si False, les couples sont restitués par rang de première apparition
+                (l'ordre des lignes d'un fichier dont les couples sont distincts)
+        """
+        size = len(self.slots)
+        if not size:
+            return KeywordFrame.empty()
+        
+        columns = {name: values[:size] for name, values in self._columns.items()}
+        if sort:
+            order = np.lexsort((columns['order'], -columns['impressions'], -columns['clicks']))
+        else:
+            order = np.argsort(columns['order'], kind='stable')
+        if max_rows is not None:
+            order = order[:max_rows]
+        
+        clicks = columns['clicks'][order]
+        impressions = columns['impressions'][order]
+        has_impressions = impressions > 0
+        safe_impressions = np.where(has_impressions, impressions, 1)
+        df = pd.DataFrame({
+            'keyword': pd.Categorical.from_codes(columns['keyword'][order], self.keywords),
+            'url': pd.Categorical.from_codes(columns['url'][order], self.urls),
+            'clicks': clicks,
+            'impressions': impressions,
+            'ctr': np.where(has_impressions, clicks / safe_impressions, 0.0),
+            'position': np.where(
+                has_impressions,
+                columns['weighted_position'][order] / safe_impressions,
+                columns['position'][order] / columns['count'][order]
+            )
+        })
+        df['keyword'] = df['keyword'].cat.remove_unused_categories()
+        df['url'] = df['url'].cat.remove_unused_categories()
+        return KeywordFrame(df)
+    
+    def _intern(self, values, codes, table):
+        """Codes globaux des chaînes d'un lot (les nouvelles chaînes sont ajoutées à la table)"""
+        # Conversion en liste Python d'un bloc (itérer sur des chaînes Arrow valeur par valeur est lent)
+        values = values.tolist()
+        start = len(table)
+        result = _lookup_or_add(values, codes)
+        table.extend(values[i] for i in np.flatnonzero(result >= start).tolist())
+        return result
+    
+    def _reserve(self, size):
+        """Agrandir les tableaux (par doublement) pour contenir size couples"""
+        capacity = len(self._columns['clicks'])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, values in self._columns.items():
+            fill = np.iinfo(np.int64).max if name == 'order' else 0
+            grown = np.full(capacity, fill, dtype=values.dtype)
+            grown[:len(values)] = values
+            self._columns[name] = grown
+
+def _lookup_or_add(keys, codes):
+    """
+    Codes d'une liste de clés distinctes dans le dictionnaire codes
+    
+    Les clés absentes reçoivent les codes suivants, dans l'ordre de la liste; les recherches
+    et les ajouts sont faits en bloc, sans affectation valeur par valeur.
+    """
+    if not codes:
+        # Premier lot (ou fichier lu d'un bloc): toutes les clés sont nouvelles
+        codes.update(zip(keys, range(len(keys))))
+        return np.arange(len(keys), dtype=np.int64)
+    result = np.fromiter((codes.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+    new = np.flatnonzero(result < 0)
+    if len(new):
+        result[new] = np.arange(len(codes), len(codes) + len(new))
+        codes.update(zip([keys[i] for i in new.tolist()], result[new].tolist()))
+    return result
@@ -0,0 +1,101 @@
+import numpy as np
+
+def url_similarity_matrix(urls):
+    """
+    Calculer la similarité de Jaccard des segments pour toutes les paires d'URLs
+    
+    Chaque URL est représentée par une ligne d'une matrice d'incidence
+    (URL x segment), l'intersection s'obtient par un produit matriciel.
+    """
+    segment_ids = {}
+    rows = []
+    cols = []
+    for i, url in enumerate(urls):
+        for segment in set(url.split('/')):
+            rows.append(i)
+            cols.append(segment_ids.setdefault(segment, len(segment_ids)))
+    
+    incidence = np.zeros((len(urls), len(segment_ids)), dtype=np.float64)
+    incidence[rows, cols] = 1.0
+    
+    intersection = incidence @ incidence.T
+    sizes = incidence.sum(axis=1)
+    union = sizes[:, None] + sizes[None, :] - intersection
+    
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def score_group(urls, positions, content_matrix, rows, cols):
+    """
+    Calculer les scores des paires (rows[k], cols[k]) d'un groupe d'URLs
+    
+    Args:
+        urls: URLs du groupe
+        positions: Ligne de chaque URL dans content_matrix (-1 si pas d'embedding)
+        content_matrix: Embeddings de contenu normalisés, en float64 (ou None)
+        rows, cols: Indices des paires à évaluer dans le groupe
+    
+    Returns:
+        Tuple (similarités, similarités d'URL, similarités de contenu, présence du contenu)
+    """
+    url_similarities = url_similarity_matrix(urls)[rows, cols]
+    
+    # Similarité de contenu: 100% contenu lorsque les deux URLs ont un embedding
+    has_content = np.zeros(len(rows), dtype=bool)
+    content_similarities = np.zeros(len(rows), dtype=np.float64)
+    if content_matrix is not None:
+        positions = np.asarray(positions)
+        available = positions >= 0
+        has_content = available[rows] & available[cols]
+        if has_content.any():
+            block = np.asarray(content_matrix[np.where(available, positions, 0)])
+            content_similarities = (block @ block.T)[rows, cols]
+    
+    similarities = np.where(has_content, content_similarities, url_similarities)
+    return similarities, url_similarities, content_similarities, has_content
+
+def score_group_shard(shared_files, shard):
+    """
+    Point d'entrée des processus de calcul: évaluer les paires demandées d'un lot de groupes
+    
+    Les données volumineuses (URLs internées, embeddings) sont lues depuis des fichiers
+    mappés en mémoire partagés par tous les processus; seul le lot est transmis.
+    
+    Args:
+        shared_files: Chemins des fichiers créés par write_shared_files
+        shard: Liste de tuples (identifiants des URLs, indices i, indices j des paires), un par groupe
+    
+    Returns:
+        Liste (un élément par groupe) des scores des paires demandées, dans leur ordre
+    """
+    url_bytes = np.load(shared_files['url_bytes'], mmap_mode='r')
+    url_offsets = np.load(shared_files['url_offsets'], mmap_mode='r')
+    positions = np.load(shared_files['positions'], mmap_mode='r')
+    content_matrix = None
+    if shared_files.get('content_matrix'):
+        content_matrix = np.load(shared_files['content_matrix'], mmap_mode='r')
+    
+    results = []
+    for ids, rows, cols in shard:
+        urls = [bytes(url_bytes[url_offsets[i]:url_offsets[i + 1]]).decode('utf-8') for i in ids]
+        results.append(score_group(urls, positions[ids], content_matrix, rows, cols))
+    return results
+
+def write_shared_files(directory, urls, positions, content_matrix):
+    """Écrire les URLs internées, leurs positions et les embeddings dans des fichiers .npy"""
+    encoded = [url.encode('utf-8') for url in urls]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(url) for url in encoded])
+    
+    shared_files = {
+        'url_bytes': f"{directory}/url_bytes.npy",
+        'url_offsets': f"{directory}/url_offsets.npy",
+        'positions': f"{directory}/positions.npy",
+        'content_matrix': None
+    }
+    np.save(shared_files['url_bytes'], np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(shared_files['url_offsets'], offsets)
+    np.save(shared_files['positions'], np.asarray(positions, dtype=np.int64))
+    if content_matrix is not None:
+        shared_files['content_matrix'] = f"{directory}/content_matrix.npy"
+        np.save(shared_files['content_matrix'], np.asarray(content_matrix, dtype=np.float64))
+    return shared_files
@@ -0,0 +1,58 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+class ScoreStore:
+    """Stockage en mémoire des scores bruts d'analyses, indexés par identifiant d'analyse
+    
+    Les scores des paires d'URLs ne dépendent pas du seuil de similarité: une analyse
+    enregistrée peut être ré-évaluée avec un autre seuil, d'autres niveaux de risque ou
+    des filtres plus stricts sans récupérer, scraper ni encoder à nouveau les pages.
+    Au-delà de max_analyses, l'analyse la moins récemment utilisée est supprimée;
+    une analyse non consultée pendant ttl secondes expire.
+    """
+    
+    def __init__(self, max_analyses=8, ttl=3600):
+        """
+        Args:
+            max_analyses (int): Nombre maximum d'analyses conservées
+            ttl (int): Durée de conservation (en secondes) d'une analyse non consultée
+        """
+        self.max_analyses = max_analyses
+        self.ttl = ttl
+        self.entries = OrderedDict()  # identifiant -> (dernier accès, données), du moins au plus récent
+        self._lock = threading.Lock()
+    
+    def put(self, entry):
+        """Enregistrer les données d'une analyse et retourner son identifiant"""
+        analysis_id = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self.entries[analysis_id] = (time.time(), entry)
+            while len(self.entries) > self.max_analyses:
+                self.entries.popitem(last=False)
+        return analysis_id
+    
+    def get(self, analysis_id):
+        """Récupérer les données d'une analyse (None si inconnue ou expirée)"""
+        with self._lock:
+            self._expire()
+            item = self.entries.get(analysis_id)
+            if item is None:
+                return None
+            self.entries[analysis_id] = (time.time(), item[1])
+            self.entries.move_to_end(analysis_id)
+            return item[1]
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def _expire(self):
+        """Supprimer les analyses non consultées depuis plus de ttl secondes"""
+        limit = time.time() - self.ttl
+        while self.entries:
+            analysis_id, (accessed_at, _) = next(iter(self.entries.items()))
+            if accessed_at >= limit:
+                break
+            del self.entries[analysis_id]
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+class ScrapeCache:
+    """Cache local (SQLite) des pages scrapées
+    
+    Chaque entrée conserve les éléments extraits d'une page (titre, meta description,
+    balises h1 à h3, taille du contenu) et ses validateurs HTTP (ETag, Last-Modified).
+    Une entrée de moins de ttl secondes est réutilisée sans requête; au-delà, la page est
+    redemandée avec If-None-Match / If-Modified-Since et l'extraction est réutilisée si
+    le serveur répond 304 Not Modified.
+    """
+    
+    def __init__(self, path, ttl=86400):
+        """
+        Args:
+            path (str): Chemin du fichier SQLite
+            ttl (int): Durée (en secondes) pendant laquelle une page est réutilisée sans requête
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY, data TEXT, etag TEXT, last_modified TEXT, fetched_at REAL
+                )
+            """)
+    
+    def get_many(self, urls):
+        """
+        Entrées en cache des URLs demandées
+        
+        Returns:
+            Dictionnaire url -> {'data', 'etag', 'last_modified', 'fetched_at'} (URLs absentes omises)
+        """
+        entries = {}
+        urls = list(urls)
+        with self._connect() as connection:
+            # Par paquets, pour rester sous la limite de paramètres de SQLite
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                for url, data, etag, last_modified, fetched_at in connection.execute(
+                    f"SELECT url, data, etag, last_modified, fetched_at FROM pages WHERE url IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ):
+                    entries[url] = {
+                        'data': json.loads(data),
+                        'etag': etag,
+                        'last_modified': last_modified,
+                        'fetched_at': fetched_at
+                    }
+        return entries
+    
+    def get(self, url):
+        """Entrée en cache d'une URL (None si absente)"""
+        return self.get_many([url]).get(url)
+    
+    def is_fresh(self, entry):
+        """Vrai si l'entrée peut être réutilisée sans requête"""
+        return entry is not None and time.time() - entry['fetched_at'] < self.ttl
+    
+    def put_many(self, pages):
+        """
+        Enregistrer (en remplaçant les entrées existantes) des pages scrapées ou revalidées
+        
+        Args:
+            pages: Liste de tuples (url, données extraites, etag, last_modified)
+        """
+        if not pages:
+            return
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                [
+                    (url, json.dumps(data, ensure_ascii=False), etag, last_modified, now)
+                    for url, data, etag, last_modified in pages
+                ]
+            )
+    
+    def put(self, url, data, etag=None, last_modified=None):
+        """Enregistrer une page scrapée ou revalidée"""
+        self.put_many([(url, data, etag, last_modified)])
+    
+    @contextmanager
+    def _connect(self):
+        """Connexion SQLite: transaction validée (ou annulée en cas d'erreur) puis connexion fermée"""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
@@ -0,0 +1,168 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+# Codes HTTP indiquant que le serveur demande de ralentir
+THROTTLE_STATUSES = (429, 503)
+
+class HostPacer:
+    """
+    Rythme adaptatif des requêtes vers un hôte
+    
+    Un délai minimum sépare le début de deux requêtes vers l'hôte. Il est doublé
+    lorsque le serveur demande de ralentir (429, 503, en respectant Retry-After) ou
+    répond lentement (le débit est divisé par deux), puis réduit tant que les réponses
+    sont rapides: rapidement (une requête par seconde de plus à chaque réponse) loin sous
+    le débit du dernier ralentissement, prudemment (speed_up) à son approche.
+    Les réponses aux requêtes parties avant le dernier ralentissement ne le modifient
+    pas: une rafale de 429 ne compte que pour un seul ralentissement.
+    """
+    
+    def __init__(self, min_delay=0.0, max_delay=60.0, fast_response=1.0, slow_response=5.0, speed_up=0.2):
+        """
+        Args:
+            min_delay (float): Délai minimum (en secondes) entre deux requêtes
+            max_delay (float): Délai maximum entre deux requêtes
+            fast_response (float): Durée de réponse en dessous de laquelle le rythme accélère
+            slow_response (float): Durée de réponse au-delà de laquelle le rythme ralentit
+            speed_up (float): Hausse du débit (en requêtes par seconde) à chaque réponse rapide
+                à l'approche du débit du dernier ralentissement
+        """
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.fast_response = fast_response
+        self.slow_response = slow_response
+        self.speed_up = speed_up
+        self.delay = min_delay
+        self.threshold = None  # débit (requêtes par seconde) après le dernier ralentissement, inconnu tant que le rythme n'était pas limité
+        self.next_request_at = 0.0
+        self.generation = 0  # incrémenté à chaque ralentissement
+        self.responses = deque()  # instants des réponses de la dernière seconde (débit observé)
+    
+    async def wait(self):
+        """
+        Attendre le moment de la prochaine requête vers l'hôte
+        
+        Le créneau n'est pris qu'à son échéance: un ralentissement (ou un Retry-After)
+        survenu pendant l'attente s'applique aussi aux requêtes déjà en attente.
+        
+        Returns:
+            Génération du rythme au départ de la requête, à transmettre à record
+        """
+        while True:
+            now = time.monotonic()
+            if now >= self.next_request_at:
+                self.next_request_at = now + self.delay
+                return self.generation
+            await asyncio.sleep(self.next_request_at - now)
+    
+    def record(self, status, elapsed, retry_after=None, generation=None):
+        """
+        Adapter le rythme à une réponse
+        
+        Args:
+            status: Code HTTP (None si la requête a échoué sans réponse)
+            elapsed: Durée de la requête en secondes
+            retry_after: Pause demandée par le serveur (en secondes)
+            generation: Valeur retournée par wait au départ de la requête
+        """
+        now = time.monotonic()
+        current = generation is None or generation == self.generation
+        self.responses.append(now)
+        while self.responses[0] < now - 1.0:
+            self.responses.popleft()
+        
+        if status in THROTTLE_STATUSES:
+            if current:
+                self._slow_down()
+            pause = retry_after if retry_after is not None else self.delay
+            self.next_request_at = max(self.next_request_at, now + min(pause, self.max_delay))
+        elif elapsed > self.slow_response:
+            if current:
+                self._slow_down()
+        elif elapsed < self.fast_response and current and self.delay > self.min_delay:
+            rate = 1.0 / self.delay
+            rate += 1.0 if self.threshold is None or rate < self.threshold * 0.9 else self.speed_up
+            self.delay = 1.0 / rate
+            # Au-delà de 200 requêtes par seconde, seule la limite de concurrence s'applique
+            if self.delay < max(self.min_delay, 0.005):
+                self.delay = self.min_delay
+    
+    def _slow_down(self):
+        """Diviser le débit par deux (le débit observé si le rythme n'était pas encore limité)"""
+        if self.delay > 0:
+            self.delay = min(self.max_delay, self.delay * 2)
+            self.threshold = 1.0 / self.delay
+        else:
+            # Le débit observé peut être faussé (pause Retry-After, autre client): seuil laissé inconnu
+            self.delay = min(self.max_delay, 2.0 / max(1, len(self.responses)))
+        self.generation += 1
+
+class ScrapeScheduler:
+    """
+    Ordonnanceur des requêtes de scraping
+    
+    Limite le nombre de requêtes simultanées au total et par hôte, et rythme les requêtes
+    de chaque hôte avec un HostPacer.
+    """
+    
+    def __init__(self, max_concurrency=32, per_host=4, min_delay=0.0, max_delay=60.0):
+        """
+        Args:
+            max_concurrency (int): Nombre maximum de requêtes simultanées
+            per_host (int): Nombre maximum de requêtes simultanées vers un même hôte
+            min_delay (float): Délai minimum entre deux requêtes vers un même hôte
+            max_delay (float): Délai maximum entre deux requêtes vers un même hôte
+        """
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.stats = {'requests': 0, 'throttled': 0}
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._hosts = {}  # hôte -> (sémaphore, HostPacer)
+    
+    @asynccontextmanager
+    async def slot(self, host):
+        """Réserver un emplacement de requête vers l'hôte (concurrence et rythme)"""
+        semaphore, pacer = self._host(host)
+        # Le sémaphore de l'hôte est pris d'abord: une requête en attente de son hôte n'occupe pas d'emplacement global
+        async with semaphore:
+            generation = await pacer.wait()
+            async with self._global:
+                self.stats['requests'] += 1
+                yield generation
+    
+    def record(self, host, status, elapsed, retry_after=None, generation=None):
+        """Transmettre une réponse au rythme de l'hôte (generation: valeur produite par slot)"""
+        if status in THROTTLE_STATUSES:
+            self.stats['throttled'] += 1
+        self._host(host)[1].record(status, elapsed, retry_after, generation)
+    
+    def _host(self, host):
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = (
+                asyncio.Semaphore(self.per_host),
+                HostPacer(self.min_delay, self.max_delay)
+            )
+        return entry
+
+def parse_retry_after(value):
+    """Durée (en secondes) d'un en-tête Retry-After (nombre de secondes ou date HTTP), None si absent ou invalide"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -1,20 +1,65 @@
+import os
 import requests
 import aiohttp
-from bs4 import BeautifulSoup
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import time
 import random
+import itertools
 from urllib.parse import urlparse
+from server.services.scrape_scheduler import ScrapeScheduler, THROTTLE_STATUSES, parse_retry_after
+from server.services.scrape_cache import ScrapeCache
+from server.services.html_extract import get_extractor, decode_html
 
 class WebScraper:
     """Service pour scraper les éléments importants des pages web"""
     
-    def __init__(self, max_workers=5, timeout=10, user_agent=None):
-        """Initialiser le scraper avec des paramètres configurables"""
+    def __init__(self, max_workers=5, timeout=10, user_agent=None, max_concurrency=None, per_host=None, max_retries=None, cache_path=None, html_parser=None, extract_content=False, max_content_words=None):
+        """
+        Initialiser le scraper avec des paramètres configurables
+        
+        Args:
+            max_workers: Nombre de threads du scraping synchrone
+            timeout: Durée maximum (en secondes) d'une requête
+            user_agent: User-Agent des requêtes
+            max_concurrency: Nombre maximum de requêtes asynchrones simultanées (par défaut: SCRAPER_CONCURRENCY, sinon 32)
+            per_host: Nombre maximum de requêtes asynchrones simultanées vers un même hôte (par défaut: SCRAPER_PER_HOST, sinon 4)
+            max_retries: Nombre de nouvelles tentatives après un 429 ou un 503 (par défaut: SCRAPER_MAX_RETRIES, sinon 3)
+            cache_path: Fichier SQLite du cache des pages scrapées (par défaut: SCRAPER_CACHE_PATH, désactivé si absent)
+            html_parser: Extracteur HTML, 'lxml' ou 'beautifulsoup' (par défaut: SCRAPER_HTML_PARSER, sinon lxml s'il est installé)
+            extract_content: Extraire aussi le texte du corps des pages (clé 'content'), pour les embeddings
+                par passages (voir SimilarityAnalyzer)
+            max_content_words: Nombre maximum de mots conservés du texte du corps (par défaut: tout le texte)
+        """
         self.max_workers = max_workers
         self.timeout = timeout
         self.user_agent = user_agent or 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        self.max_concurrency = max_concurrency or int(os.getenv('SCRAPER_CONCURRENCY', 32))
+        self.per_host = per_host or int(os.getenv('SCRAPER_PER_HOST', 4))
+        self.max_retries = int(os.getenv('SCRAPER_MAX_RETRIES', 3)) if max_retries is None else max_retries
+        # Délai minimum entre deux requêtes vers un même hôte (le rythme s'adapte ensuite aux réponses)
+        self.min_delay = float(os.getenv('SCRAPER_MIN_DELAY', 0))
+        self.in_flight = {}  # URL -> future du scraping en cours, partagé entre les scrapings simultanés
+        # Ordonnanceur partagé par les scrapings simultanés (voir _get_scheduler)
+        self._scheduler = None
+        self._scheduler_loop = None
+        
+        self.extract_html = get_extractor(html_parser or os.getenv('SCRAPER_HTML_PARSER'))
+        self.extract_content = extract_content
+        # Le texte du corps est conservé en cache: inutile d'y garder plus que ce qui sera encodé
+        self.max_content_words = max_content_words
+        # Taille maximum lue par page: au-delà, la suite de la page n'est ni téléchargée ni analysée
+        self.max_bytes = int(os.getenv('SCRAPER_MAX_BYTES', 2 * 1024 * 1024))
+        # Analyse HTML hors de la boucle asyncio, dans un pool de threads
+        self.parse_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SCRAPER_PARSE_WORKERS', os.cpu_count() or 1)),
+            thread_name_prefix='html-parse'
+        )
+        
+        cache_path = cache_path or os.getenv('SCRAPER_CACHE_PATH')
+        self.cache = None
+        if cache_path:
+            self.cache = ScrapeCache(cache_path, ttl=int(os.getenv('SCRAPER_CACHE_TTL', 86400)))
     
     def scrape_urls(self, urls):
         """Scraper plusieurs URLs en parallèle"""
@@ -43,29 +88,175 @@ class WebScraper:
     async def scrape_urls_async(self, urls):
         """Scraper plusieurs URLs en parallèle de manière asynchrone"""
         results = {}
-        tasks = []
+        async for url, data in self.iter_scrape_urls_async(urls):
+            results[url] = data
+        
+        # Résultats dans l'ordre des URLs demandées
+        return {url: results[url] for url in urls}
+    
+    async def iter_scrape_urls_async(self, urls, stats=None):
+        """
+        Scraper plusieurs URLs en parallèle et produire chaque résultat (url, données) dès qu'il est disponible
+        
+        Les requêtes passent par le ScrapeScheduler du scraper, partagé par tous les scrapings
+        simultanés: nombre de requêtes simultanées limité au total et par hôte, rythme de chaque
+        hôte adapté à ses réponses (un ralentissement sur 429/503 s'applique à tous les scrapings).
+        Avec le cache, les pages récentes sont produites sans requête et les autres sont
+        revalidées par des requêtes conditionnelles. Une URL déjà en cours de scraping (par une
+        autre analyse, par exemple) n'est pas redemandée: son résultat est partagé.
+        
+        Au plus max_concurrency * 2 pages sont en cours: tant que le consommateur ne lit pas les
+        résultats, aucune nouvelle page n'est demandée (le scraping ne prend pas d'avance sur un
+        traitement plus lent).
         
-        # Créer une session aiohttp pour réutiliser les connexions
-        async with aiohttp.ClientSession() as session:
-            # Créer une tâche pour chaque URL
+        Args:
+            urls: URLs à scraper
+            stats: Dictionnaire (optionnel) complété à la fin avec les statistiques de ce scraping
+        """
+        urls = list(dict.fromkeys(urls))
+        scheduler = self._get_scheduler()
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        # Les accès au cache SQLite sont synchrones: ils s'exécutent hors de la boucle asyncio
+        entries = await loop.run_in_executor(None, self.cache.get_many, urls) if self.cache else {}
+        entries = {url: entry for url, entry in entries.items() if self._usable_entry(entry)}
+        counts = {'requests': 0, 'throttled': 0, 'cached': 0, 'not_modified': 0, 'shared': 0}
+        pending = []  # pages à enregistrer dans le cache, par paquets
+        
+        try:
+            to_fetch = []
             for url in urls:
-                tasks.append(self.scrape_url_async(session, url))
-            
-            # Exécuter toutes les tâches en parallèle
-            completed_tasks = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Traiter les résultats
-            for i, url in enumerate(urls):
-                if isinstance(completed_tasks[i], Exception):
-                    results[url] = {'error': str(completed_tasks[i])}
+                if self.cache and self.cache.is_fresh(entries.get(url)):
+                    counts['cached'] += 1
+                    yield url, entries[url]['data']
                 else:
-                    results[url] = completed_tasks[i]
+                    to_fetch.append(url)
+            
+            # Une seule session (connexions réutilisées) pour toutes les URLs
+            async with self._create_session() as session:
+                async def fetch(url):
+                    try:
+                        page = await self._scrape_scheduled(session, scheduler, url, entries.get(url), counts)
+                    except Exception as e:
+                        return {'error': str(e)}
+                    if page['status'] == 304:
+                        counts['not_modified'] += 1
+                    if self.cache:
+                        pending.append((url, page['data'], page['etag'], page['last_modified']))
+                    return page['data']
+                
+                async def scrape(url):
+                    shared = self.in_flight.get(url)
+                    if shared is not None:
+                        counts['shared'] += 1
+                        try:
+                            return url, await asyncio.shield(shared)
+                        except asyncio.CancelledError:
+                            if not shared.cancelled():
+                                raise
+                            # Le scraping qui l'avait demandée a été interrompu: l'URL est scrapée ici
+                    future = loop.create_future()
+                    self.in_flight[url] = future
+                    try:
+                        data = await fetch(url)
+                        future.set_result(data)
+                        return url, data
+                    finally:
+                        if not future.done():
+                            future.cancel()
+                        if self.in_flight.get(url) is future:
+                            del self.in_flight[url]
+                
+                remaining = iter(to_fetch)
+                running = set()
+                try:
+                    while True:
+                        for url in itertools.islice(remaining, self.max_concurrency * 2 - len(running)):
+                            running.add(asyncio.ensure_future(scrape(url)))
+                        if not running:
+                            break
+                        done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            yield task.result()
+                        if len(pending) >= 200:
+                            # Les pages scrapées pendant l'écriture vont dans un nouveau paquet
+                            batch, pending = pending, []
+                            await loop.run_in_executor(None, self.cache.put_many, batch)
+                finally:
+                    # Consommateur interrompu: les pages en cours sont abandonnées
+                    for task in running:
+                        task.cancel()
+                    await asyncio.gather(*running, return_exceptions=True)
+        finally:
+            if pending:
+                batch, pending = pending, []
+                await loop.run_in_executor(None, self.cache.put_many, batch)
         
-        return results
+        elapsed = time.time() - start_time
+        if stats is not None:
+            stats.update(counts, pages=len(urls), seconds=elapsed)
+        print(
+            f"Scraping terminé pour {len(urls)} URLs en {elapsed:.2f} secondes "
+            f"({counts['requests']} requêtes, {counts['throttled']} ralentissements demandés, "
+            f"{counts['cached']} pages en cache, {counts['not_modified']} pages inchangées, "
+            f"{counts['shared']} pages partagées avec un autre scraping)"
+        )
     
-    def scrape_url(self, url):
-        """Scraper une URL et extraire les éléments importants"""
-        headers = {
+    def _get_scheduler(self):
+        """Ordonnanceur partagé, recréé si la boucle asyncio a changé (ses sémaphores lui sont liés)"""
+        loop = asyncio.get_running_loop()
+        if self._scheduler is None or self._scheduler_loop is not loop:
+            self._scheduler = ScrapeScheduler(self.max_concurrency, self.per_host, self.min_delay)
+            self._scheduler_loop = loop
+        return self._scheduler
+    
+    def _create_session(self):
+        """Session aiohttp partagée: cache DNS, connexions keep-alive, connexions limitées par hôte"""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self._headers()
+        )
+    
+    async def _scrape_scheduled(self, session, scheduler, url, entry=None, counts=None):
+        """
+        Scraper une URL en respectant l'ordonnanceur, avec nouvelles tentatives sur 429/503 (voir _fetch_page_async)
+        
+        Args:
+            counts: Compteurs (optionnels) du scraping, 'requests' et 'throttled' incrémentés à chaque tentative
+        """
+        host = self._get_domain(url)
+        for attempt in range(self.max_retries + 1):
+            async with scheduler.slot(host) as generation:
+                if counts is not None:
+                    counts['requests'] += 1
+                start_time = time.monotonic()
+                try:
+                    page = await self._fetch_page_async(session, url, entry)
+                except aiohttp.ClientResponseError as e:
+                    retry_after = parse_retry_after(e.headers.get('Retry-After')) if e.headers else None
+                    scheduler.record(host, e.status, time.monotonic() - start_time, retry_after, generation)
+                    if counts is not None and e.status in THROTTLE_STATUSES:
+                        counts['throttled'] += 1
+                    if e.status not in THROTTLE_STATUSES or attempt >= self.max_retries:
+                        raise
+                    continue
+                except asyncio.TimeoutError:
+                    # Un hôte qui ne répond plus est ralenti comme un hôte lent
+                    scheduler.record(host, None, time.monotonic() - start_time, generation=generation)
+                    raise
+                scheduler.record(host, page['status'], time.monotonic() - start_time, generation=generation)
+                return page
+    
+    def _headers(self):
+        """En-têtes HTTP des requêtes de scraping"""
+        return {
             'User-Agent': self.user_agent,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
@@ -74,76 +265,136 @@ class WebScraper:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         }
+    
+    def scrape_url(self, url):
+        """Scraper une URL et extraire les éléments importants (en passant par le cache s'il est activé)"""
+        entry = self._usable_entry(self.cache.get(url)) if self.cache else None
+        if self.cache and self.cache.is_fresh(entry):
+            return entry['data']
+        
+        headers = self._headers()
+        headers.update(self._conditional_headers(entry))
         
         # Ajouter un délai aléatoire pour éviter d'être bloqué
         time.sleep(random.uniform(0.5, 2.0))
         
         response = requests.get(url, headers=headers, timeout=self.timeout)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extraire les éléments importants
-        data = {
-            'title': self._get_title(soup),
-            'meta_description': self._get_meta_description(soup),
-            'h1': self._get_headings(soup, 'h1'),
-            'h2': self._get_headings(soup, 'h2'),
-            'h3': self._get_headings(soup, 'h3'),
-            'content_length': len(response.text),
-            'domain': self._get_domain(url)
-        }
+        if response.status_code == 304 and entry is not None:
+            # Page inchangée: l'extraction en cache est réutilisée
+            data = entry['data']
+        else:
+            response.raise_for_status()
+            # Charset de l'en-tête seulement: requests suppose ISO-8859-1 pour du HTML sans charset
+            charset = response.encoding if 'charset' in response.headers.get('Content-Type', '').lower() else None
+            data = self._extract_body(response.content, charset, url)
         
+        if self.cache:
+            etag, last_modified = self._validators(response.status_code, response.headers, entry)
+            self.cache.put(url, data, etag, last_modified)
         return data
     
     async def scrape_url_async(self, session, url):
-        """Scraper une URL de manière asynchrone et extraire les éléments importants"""
-        headers = {
-            'User-Agent': self.user_agent,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Referer': 'https://www.google.com/',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+        """Scraper une URL de manière asynchrone et extraire les éléments importants
         
-        # Ajouter un délai aléatoire pour éviter d'être bloqué
-        await asyncio.sleep(random.uniform(0.5, 2.0))
+        Le rythme des requêtes et le cache sont gérés par l'appelant (voir iter_scrape_urls_async).
+        """
+        page = await self._fetch_page_async(session, url)
+        return page['data']
+    
+    async def _fetch_page_async(self, session, url, entry=None):
+        """
+        Télécharger une page (requête conditionnelle si une entrée du cache est fournie) et extraire ses éléments
         
-        async with session.get(url, headers=headers, timeout=self.timeout) as response:
-            response.raise_for_status()
-            html = await response.text()
-            
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Extraire les éléments importants
-            data = {
-                'title': self._get_title(soup),
-                'meta_description': self._get_meta_description(soup),
-                'h1': self._get_headings(soup, 'h1'),
-                'h2': self._get_headings(soup, 'h2'),
-                'h3': self._get_headings(soup, 'h3'),
-                'content_length': len(html),
-                'domain': self._get_domain(url)
-            }
-            
-            return data
-    
-    def _get_title(self, soup):
-        """Extraire le titre de la page"""
-        title_tag = soup.find('title')
-        return title_tag.text.strip() if title_tag else ''
-    
-    def _get_meta_description(self, soup):
-        """Extraire la meta description"""
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        return meta_desc.get('content', '').strip() if meta_desc else ''
-    
-    def _get_headings(self, soup, tag):
-        """Extraire les balises de titre (h1, h2, etc.)"""
-        headings = soup.find_all(tag)
-        return [h.text.strip() for h in headings]
+        Returns:
+            Dictionnaire avec les éléments extraits (data), le code HTTP (status) et les validateurs
+            de la réponse (etag, last_modified)
+        """
+        headers = self._headers()
+        headers.update(self._conditional_headers(entry))
+        body = None
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+            if response.status == 304 and entry is not None:
+                # Page inchangée: l'extraction en cache est réutilisée, sans téléchargement ni analyse
+                data = entry['data']
+            else:
+                response.raise_for_status()
+                body = await self._read_body(response)
+            status = response.status
+            charset = response.charset
+            etag, last_modified = self._validators(response.status, response.headers, entry)
+        
+        # La connexion est libérée avant l'analyse, faite dans le pool de threads
+        if body is not None:
+            data = await asyncio.get_running_loop().run_in_executor(
+                self.parse_pool, self._extract_body, body, charset, url
+            )
+        return {'data': data, 'status': status, 'etag': etag, 'last_modified': last_modified}
+    
+    async def _read_body(self, response):
+        """Lire le corps de la réponse par morceaux, au plus max_bytes octets"""
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(65536):
+            body += chunk
+            if len(body) >= self.max_bytes:
+                del body[self.max_bytes:]
+                break
+        return bytes(body)
+    
+    def _extract_body(self, body, charset, url):
+        """Décoder le corps d'une réponse (voir decode_html) et en extraire les éléments importants"""
+        return self._extract(decode_html(body, charset), url)
+    
+    def _extract(self, html, url):
+        """
+        Extraire les éléments importants d'une page HTML
+        
+        'content_length' est le nombre de caractères analysés: la page entière, ou ses max_bytes
+        premiers octets en scraping asynchrone.
+        """
+        data = self.extract_html(html, self.extract_content)
+        if self.max_content_words and data.get('content'):
+            data['content'] = ' '.join(data['content'].split()[:self.max_content_words])
+        data['content_length'] = len(html)
+        data['domain'] = self._get_domain(url)
+        return data
+    
+    @staticmethod
+    def without_content(scraped_data):
+        """Données scrapées sans le texte du corps des pages, pour les réponses aux clients"""
+        return {
+            url: {key: value for key, value in data.items() if key != 'content'} if isinstance(data, dict) else data
+            for url, data in scraped_data.items()
+        }
+    
+    def _usable_entry(self, entry):
+        """Entrée du cache, ou None si elle a été extraite sans le texte du corps alors qu'il est demandé"""
+        if entry is not None and self.extract_content and 'content' not in entry['data']:
+            return None
+        return entry
+    
+    def _conditional_headers(self, entry):
+        """En-têtes de requête conditionnelle (If-None-Match, If-Modified-Since) pour une entrée du cache"""
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+    
+    def _validators(self, status, response_headers, entry=None):
+        """
+        ETag et Last-Modified d'une réponse
+        
+        Seule une réponse 304 (page inchangée) reprend ceux de l'entrée du cache qu'elle ne répète
+        pas: une nouvelle version de la page sans validateur n'hérite pas de ceux de l'ancienne.
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if status == 304 and entry is not None:
+            etag = etag or entry['etag']
+            last_modified = last_modified or entry['last_modified']
+        return etag, last_modified
     
     def _get_domain(self, url):
         """Extraire le domaine de l'URL"""
@@ -1,24 +1,57 @@
 import os
-import json
+import asyncio
+import threading
 from datetime import datetime, timedelta
-import aiohttp
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
 from dotenv import load_dotenv
+from server.services.keyword_frame import KeywordFrame
+from server.services.gsc_client import SearchConsoleClient
+from server.services.gsc_fetcher import SearchAnalyticsFetcher
+from server.services.gsc_cache import SearchAnalyticsCache
 
 load_dotenv()
 
 class SearchConsoleService:
     """Service pour interagir avec l'API Google Search Console"""
     
-    def __init__(self):
+    def __init__(self, cache_path=None):
+        """
+        Args:
+            cache_path: Fichier SQLite du cache des données Search Analytics par jour
+                (par défaut: GSC_CACHE_PATH, désactivé si absent)
+        """
         self.client_id = os.getenv('GOOGLE_CLIENT_ID')
         self.client_secret = os.getenv('GOOGLE_CLIENT_SECRET')
         self.redirect_uri = os.getenv('GOOGLE_REDIRECT_URI')
         self.scopes = ['https://www.googleapis.com/auth/webmasters.readonly']
         self.credentials = None
-        self.service = None
+        self.client = None
+        # Boucle asyncio des appels synchrones (voir _run_sync)
+        self._loop = None
+        self._sync_lock = threading.Lock()
+        # Point d'accès de l'API (par défaut celui de Google; un serveur local pour les tests et benchmarks)
+        self.api_endpoint = os.getenv('GSC_API_ENDPOINT')
+        self.concurrency = int(os.getenv('GSC_CONCURRENCY', 8))
+        
+        # Les requêtes Search Analytics sont exécutées en parallèle, dans la limite des quotas de l'API
+        self.fetcher = SearchAnalyticsFetcher(
+            self._query_async,
+            concurrency=self.concurrency,
+            qps=float(os.getenv('GSC_MAX_QPS', 20)),
+            qpm=float(os.getenv('GSC_MAX_QPM', 1200))
+        )
+        
+        cache_path = cache_path or os.getenv('GSC_CACHE_PATH')
+        # Rapport de la dernière fusion de périodes (lignes par période, troncatures)
+        self.last_fetch_report = {}
+        
+        self.cache = None
+        if cache_path:
+            self.cache = SearchAnalyticsCache(
+                cache_path,
+                ttl=int(os.getenv('GSC_CACHE_TTL', 21600)),
+                fresh_days=int(os.getenv('GSC_CACHE_FRESH_DAYS', 3))
+            )
     
     def get_auth_url(self):
         """Générer l'URL d'authentification Google"""
@@ -62,19 +95,33 @@ class SearchConsoleService:
         
         flow.fetch_token(code=code)
         self.credentials = flow.credentials
-        self.service = build('searchconsole', 'v1', credentials=self.credentials)
+        self.client = self._build_client(self.credentials)
         
         return True
     
+    def _build_client(self, credentials):
+        """Construire le client asynchrone de l'API Search Console"""
+        return SearchConsoleClient(
+            credentials,
+            api_endpoint=self.api_endpoint,
+            limit=self.concurrency * 2,
+            # Quelques connexions restent disponibles pour les autres requêtes (liste des sites) pendant un export
+            limit_per_host=self.concurrency + 2,
+            timeout=float(os.getenv('GSC_TIMEOUT', 120))
+        )
+    
     def get_sites(self):
         """Récupérer la liste des sites disponibles dans Search Console"""
-        if not self.service:
+        return self._run_sync(self.get_sites_async())
+    
+    async def get_sites_async(self):
+        """Version asynchrone pour récupérer la liste des sites disponibles dans Search Console"""
+        if not self.client:
             return []
         
-        sites = self.service.sites().list().execute()
-        return sites.get('siteEntry', [])
+        return await self.client.list_sites()
     
-    def get_keywords_data(self, site_url, start_date, end_date, dimensions=None, max_rows=100000):
+    def get_keywords_data(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, as_frame=False):
         """Récupérer les données de mots-clés depuis Search Console avec pagination
         
         Args:
@@ -83,79 +130,18 @@ class SearchConsoleService:
             end_date (str): Date de fin au format YYYY-MM-DD
             dimensions (list): Dimensions à récupérer (par défaut: query et page)
             max_rows (int): Nombre maximum de lignes à récupérer (par défaut: 100000)
+            as_frame (bool): Si True, retourne un KeywordFrame (colonnes) au lieu d'une liste de dictionnaires
         
         Returns:
-            list: Liste des données de mots-clés
+            list | KeywordFrame: Données de mots-clés
         """
-        if not self.service:
-            return []
-        
-        if dimensions is None:
-            dimensions = ['query', 'page']
-        
-        # Limite de l'API par requête
-        api_limit = 25000
-        
-        # Nombre de requêtes nécessaires
-        num_requests = (max_rows + api_limit - 1) // api_limit
-        
-        all_keywords_data = []
-        
-        for i in range(num_requests):
-            start_row = i * api_limit
-            
-            # Si on a déjà atteint le maximum, on arrête
-            if start_row >= max_rows:
-                break
-            
-            # Calculer la limite pour cette requête
-            current_limit = min(api_limit, max_rows - start_row)
-            
-            request = {
-                'startDate': start_date,
-                'endDate': end_date,
-                'dimensions': dimensions,
-                'rowLimit': current_limit,
-                'startRow': start_row
-            }
-            
-            try:
-                response = self.service.searchanalytics().query(siteUrl=site_url, body=request).execute()
-                
-                # Transformer les données pour notre analyse
-                for row in response.get('rows', []):
-                    keyword = None
-                    url = None
-                    
-                    for i, dimension in enumerate(dimensions):
-                        if dimension == 'query':
-                            keyword = row['keys'][i]
-                        elif dimension == 'page':
-                            url = row['keys'][i]
-                    
-                    if keyword and url:
-                        all_keywords_data.append({
-                            'keyword': keyword,
-                            'url': url,
-                            'clicks': row.get('clicks', 0),
-                            'impressions': row.get('impressions', 0),
-                            'ctr': row.get('ctr', 0),
-                            'position': row.get('position', 0)
-                        })
-                
-                # Si la réponse contient moins de lignes que demandé, on a atteint la fin des données
-                if len(response.get('rows', [])) < current_limit:
-                    break
-                    
-            except Exception as e:
-                print(f"Erreur lors de la récupération des données: {str(e)}")
-                break
-        
-        return all_keywords_data
+        return self._run_sync(self._fetch_keywords_data(site_url, start_date, end_date, dimensions, max_rows, as_frame))
     
-    def get_keywords_data_by_date_chunks(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, chunk_size=7):
+    def get_keywords_data_by_date_chunks(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, chunk_size=7, as_frame=False):
         """Récupérer les données de mots-clés en segmentant par périodes pour contourner la limite de l'API
         
+        Les périodes (et leurs pages) sont récupérées en parallèle, voir SearchAnalyticsFetcher.
+        
         Args:
             site_url (str): URL du site dans Search Console
             start_date (str): Date de début au format YYYY-MM-DD
@@ -163,120 +149,244 @@ class SearchConsoleService:
             dimensions (list): Dimensions à récupérer (par défaut: query et page)
             max_rows (int): Nombre maximum de lignes à récupérer au total
             chunk_size (int): Taille des segments de dates en jours
+            as_frame (bool): Si True, retourne un KeywordFrame (colonnes) au lieu d'une liste de dictionnaires
             
         Returns:
-            list: Liste des données de mots-clés
+            list | KeywordFrame: Données de mots-clés
         """
-        if not self.service:
-            return []
-            
-        # Convertir les dates en objets datetime
-        from datetime import datetime, timedelta
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
+        return self._run_sync(self._fetch_keywords_data_by_date_chunks(site_url, start_date, end_date, dimensions, max_rows, chunk_size, as_frame))
+    
+    async def _fetch_keywords_data(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, as_frame=False):
+        """Implémentation asynchrone de get_keywords_data"""
+        if not self.client:
+            return KeywordFrame.empty() if as_frame else []
+        
+        if dimensions is None:
+            dimensions = ['query', 'page']
+        
+        if self._use_cache(dimensions):
+            keywords_frame = await self._fetch_cached_days(site_url, start_date, end_date, dimensions, max_rows)
+            return keywords_frame if as_frame else keywords_frame.to_records()
+        
+        rows_per_window = await self.fetcher.fetch_windows(site_url, [(start_date, end_date)], dimensions, max_rows)
+        keywords_frame = self._merge_windows([self._rows_to_frame(rows_per_window[0], dimensions)], max_rows)
+        return keywords_frame if as_frame else keywords_frame.to_records()
+    
+    async def _fetch_keywords_data_by_date_chunks(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, chunk_size=7, as_frame=False):
+        """Implémentation asynchrone de get_keywords_data_by_date_chunks"""
+        if not self.client:
+            return KeywordFrame.empty() if as_frame else []
+        
+        if dimensions is None:
+            dimensions = ['query', 'page']
         
-        # Calculer le nombre de jours entre les deux dates
-        delta = (end - start).days + 1
+        if self._use_cache(dimensions):
+            keywords_frame = await self._fetch_cached_days(site_url, start_date, end_date, dimensions, max_rows)
+            return keywords_frame if as_frame else keywords_frame.to_records()
         
         # Si la période est plus courte que chunk_size, faire une seule requête
-        if delta <= chunk_size:
-            return self.get_keywords_data(site_url, start_date, end_date, dimensions, max_rows)
+        windows = self._date_windows(start_date, end_date, chunk_size)
+        if len(windows) == 1:
+            return await self._fetch_keywords_data(site_url, start_date, end_date, dimensions, max_rows, as_frame)
         
-        # Diviser la période en segments
-        all_keywords_data = []
-        unique_keyword_url_pairs = set()  # Pour éviter les doublons
+        # Chaque segment peut contenir jusqu'à max_rows lignes: la limite est appliquée après la fusion
+        print(f"Récupération des données pour {len(windows)} périodes de {start_date} à {end_date}")
+        rows_per_window = await self.fetcher.fetch_windows(site_url, windows, dimensions, max_rows)
+        segment_frames = [self._rows_to_frame(rows, dimensions) for rows in rows_per_window]
         
-        # Calculer combien de lignes par segment
-        segment_max_rows = max(1000, max_rows // ((delta + chunk_size - 1) // chunk_size))
+        # Agréger les métriques de chaque paire mot-clé/URL sur l'ensemble des segments
+        keywords_frame = self._merge_windows(segment_frames, max_rows)
+        return keywords_frame if as_frame else keywords_frame.to_records()
+    
+    async def iter_keyword_batches(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, use_date_chunks=True, chunk_size=7, report=None):
+        """
+        Récupérer les données de mots-clés par lots, produits dès l'arrivée de chaque page de l'API
+        
+        Les lots ne sont pas agrégés entre eux: ils sont destinés à un KeywordIndex (voir
+        SimilarityAnalyzer.ingest_keyword_batches_async), qui produit le même résultat que
+        get_keywords_data_async sans conserver l'export complet en mémoire. Chaque période est
+        demandée jusqu'à max_rows lignes: la limite de max_rows couples est appliquée à l'ingestion.
+        
+        Args:
+            report: Rapport de récupération (voir _merge_windows), conservé dans last_fetch_report:
+                les lignes par période et les périodes tronquées y sont ajoutées à la fin de la
+                récupération, les couples écartés par max_rows lors de l'ingestion
+        
+        Yields:
+            Tuples (rang de la première ligne du lot dans l'export séquentiel, KeywordFrame)
+        """
+        if not self.client:
+            return
         
+        if dimensions is None:
+            dimensions = ['query', 'page']
+        
+        report = {} if report is None else report
+        if self._use_cache(dimensions):
+            # Le cache travaille par jours complets: les données arrivent en un seul lot agrégé
+            keywords_frame = await self._fetch_cached_days(site_url, start_date, end_date, dimensions, max_rows, limit_rows=False)
+            report.update(windows=self.last_fetch_report['windows'], truncated_windows=self.last_fetch_report['truncated_windows'])
+            self.last_fetch_report = report
+            yield 0, keywords_frame
+            return
+        
+        self.last_fetch_report = report
+        windows = self._date_windows(start_date, end_date, chunk_size) if use_date_chunks else [(start_date, end_date)]
+        print(f"Récupération des données par lots pour {len(windows)} périodes de {start_date} à {end_date}")
+        async for window, page, rows in self.fetcher.iter_pages(site_url, windows, dimensions, max_rows):
+            yield window * max_rows + page * self.fetcher.page_size, self._rows_to_frame(rows, dimensions)
+        report.update(self._window_report(self.fetcher.stats.get('windows', [])))
+    
+    def _date_windows(self, start_date, end_date, chunk_size):
+        """Diviser une période en segments de chunk_size jours (une seule période si elle est plus courte)"""
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        
+        windows = []
         current_date = start
         while current_date <= end:
-            # Calculer la date de fin du segment
             segment_end = min(current_date + timedelta(days=chunk_size-1), end)
+            windows.append((current_date.strftime('%Y-%m-%d'), segment_end.strftime('%Y-%m-%d')))
+            current_date = segment_end + timedelta(days=1)
+        return windows or [(start_date, end_date)]
+    
+    def _use_cache(self, dimensions):
+        """Le cache par jour ne concerne que les données mot-clé / URL"""
+        return self.cache is not None and 'query' in dimensions and 'page' in dimensions
+    
+    async def _fetch_cached_days(self, site_url, start_date, end_date, dimensions, max_rows, limit_rows=True):
+        """
+        Récupérer les données d'une période en s'appuyant sur le cache par jour
+        
+        Seuls les jours absents du cache (ou expirés) sont demandés à l'API, une requête par jour
+        (jusqu'à max_rows lignes chacune). Les lignes de tous les jours de la période sont ensuite
+        agrégées localement par couple mot-clé / URL (au plus max_rows couples si limit_rows).
+        """
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        days = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+        
+        loop = asyncio.get_running_loop()
+        missing = await loop.run_in_executor(None, self.cache.missing_days, site_url, dimensions, days, max_rows)
+        print(f"Cache Search Console: {len(days) - len(missing)} jours en cache, {len(missing)} jours à récupérer")
+        
+        uncached_frames = []
+        windows = []
+        if missing:
+            rows_per_day = await self.fetcher.fetch_windows(site_url, [(day, day) for day in missing], dimensions, max_rows)
+            frames = [self._rows_to_frame(rows, dimensions) for rows in rows_per_day]
             
-            # Formater les dates pour l'API
-            segment_start_str = current_date.strftime('%Y-%m-%d')
-            segment_end_str = segment_end.strftime('%Y-%m-%d')
-            
-            print(f"Récupération des données pour la période {segment_start_str} à {segment_end_str}")
-            
-            # Récupérer les données pour ce segment
-            segment_data = self.get_keywords_data(
-                site_url, 
-                segment_start_str, 
-                segment_end_str, 
-                dimensions, 
-                segment_max_rows
+            # Un jour incomplet suite à une erreur n'est pas mis en cache
+            failed = set(self.fetcher.stats.get('failed_windows', []))
+            cached = [i for i in range(len(missing)) if i not in failed]
+            uncached_frames = [frames[i] for i in sorted(failed)]
+            windows = self.fetcher.stats.get('windows', [])
+            await loop.run_in_executor(
+                None, self.cache.put_days, site_url, dimensions,
+                [missing[i] for i in cached], [frames[i] for i in cached], max_rows
             )
-            
-            # Ajouter les données uniques au résultat
-            for item in segment_data:
-                # Créer une clé unique pour chaque paire mot-clé/URL
-                key = (item['keyword'], item['url'])
-                
-                # Si cette paire n'a pas encore été ajoutée, l'ajouter
-                if key not in unique_keyword_url_pairs:
-                    unique_keyword_url_pairs.add(key)
-                    all_keywords_data.append(item)
-                    
-                    # Si on a atteint le maximum, arrêter
-                    if len(all_keywords_data) >= max_rows:
-                        return all_keywords_data
-            
-            # Passer au segment suivant
-            current_date = segment_end + timedelta(days=1)
         
-        return all_keywords_data
+        keywords_frame = await loop.run_in_executor(None, self.cache.load, site_url, dimensions, start_date, end_date)
+        return self._merge_windows([keywords_frame] + uncached_frames, max_rows if limit_rows else None, windows)
+    
+    def _rows_to_frame(self, rows, dimensions):
+        """Transformer les lignes de l'API en KeywordFrame (les lignes sont accumulées directement en colonnes)"""
+        keyword_index = dimensions.index('query') if 'query' in dimensions else None
+        url_index = dimensions.index('page') if 'page' in dimensions else None
+        
+        columns = {column: [] for column in KeywordFrame.COLUMNS}
+        if keyword_index is None or url_index is None:
+            return KeywordFrame.from_columns(**columns)
+        
+        for row in rows:
+            keyword = row['keys'][keyword_index]
+            url = row['keys'][url_index]
+            if keyword and url:
+                columns['keyword'].append(keyword)
+                columns['url'].append(url)
+                columns['clicks'].append(row.get('clicks', 0))
+                columns['impressions'].append(row.get('impressions', 0))
+                columns['ctr'].append(row.get('ctr', 0))
+                columns['position'].append(row.get('position', 0))
+        
+        return KeywordFrame.from_columns(**columns)
+    
+    async def _query_async(self, site_url, body):
+        """Exécuter une requête searchAnalytics.query avec le client asynchrone"""
+        return await self.client.query(site_url, body)
+    
+    def _run_sync(self, coroutine):
+        """
+        Exécuter une coroutine du service depuis du code synchrone (application Flask)
+        
+        Toutes les coroutines sont exécutées dans une même boucle asyncio, dans un thread dédié:
+        la session du client, liée à sa boucle, est partagée par les threads de requêtes
+        (connexions réutilisées d'un appel à l'autre) et aucun appel ne ferme celle d'un autre.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._sync_loop()).result()
+    
+    def _sync_loop(self):
+        """Boucle asyncio des appels synchrones, démarrée dans son thread au premier appel"""
+        with self._sync_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='search-console-loop', daemon=True).start()
+            return self._loop
+    
+    async def close(self):
+        """Fermer les connexions du client asynchrone"""
+        if self.client:
+            await self.client.close()
+    
+    def _merge_windows(self, frames, max_rows, windows=None):
+        """
+        Fusionner les lignes de plusieurs périodes en une ligne par paire mot-clé/URL
+        
+        Les clics et impressions sont additionnés, la position est pondérée par les impressions
+        et le CTR recalculé (KeywordFrame.aggregate). Le rapport de fusion (lignes par période,
+        périodes tronquées par la limite de lignes, lignes écartées par max_rows) est conservé
+        dans last_fetch_report.
+        """
+        merged = KeywordFrame.concat(frames).aggregate()
+        keywords_frame = KeywordFrame(merged.df.head(max_rows).reset_index(drop=True)) if max_rows is not None else merged
+        
+        if windows is None:
+            windows = self.fetcher.stats.get('windows', [])
+        self.last_fetch_report = self._window_report(windows)
+        self.last_fetch_report.update(
+            merged_rows=len(merged),
+            rows=len(keywords_frame),
+            dropped_rows=len(merged) - len(keywords_frame)
+        )
+        if len(merged) > len(keywords_frame):
+            print(f"⚠️ {len(merged) - len(keywords_frame)} paires mot-clé/URL écartées par la limite de {max_rows} lignes")
+        
+        return keywords_frame
+    
+    def _window_report(self, windows):
+        """Partie du rapport de récupération propre aux périodes (un avertissement par période tronquée)"""
+        truncated = [window for window in windows if window['truncated']]
+        for window in truncated:
+            print(f"⚠️ Période {window['start_date']} à {window['end_date']} tronquée à {window['row_limit']} lignes")
+        return {'windows': windows, 'truncated_windows': len(truncated)}
     
-    async def get_keywords_data_async(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, use_date_chunks=True, chunk_size=7):
+    async def get_keywords_data_async(self, site_url, start_date, end_date, dimensions=None, max_rows=100000, use_date_chunks=True, chunk_size=7, as_frame=False):
         """Version asynchrone pour récupérer les données de mots-clés depuis Search Console avec pagination"""
-        # Pour l'instant, nous utilisons la méthode synchrone car Google API Client ne supporte pas nativement async
-        # Dans une implémentation plus avancée, on pourrait utiliser aiohttp pour faire des requêtes HTTP asynchrones
         if use_date_chunks:
-            return self.get_keywords_data_by_date_chunks(site_url, start_date, end_date, dimensions, max_rows, chunk_size)
+            return await self._fetch_keywords_data_by_date_chunks(site_url, start_date, end_date, dimensions, max_rows, chunk_size, as_frame)
         else:
-            return self.get_keywords_data(site_url, start_date, end_date, dimensions, max_rows)
+            return await self._fetch_keywords_data(site_url, start_date, end_date, dimensions, max_rows, as_frame)
     
     def get_top_keywords_by_url(self, site_url, start_date, end_date, max_rows=100000):
         """Récupérer le mot-clé principal pour chaque URL"""
-        keywords_data = self.get_keywords_data(site_url, start_date, end_date, max_rows=max_rows)
-        
-        # Regrouper par URL et trouver le mot-clé principal (celui avec le plus de clics)
-        url_to_keywords = {}
-        for data in keywords_data:
-            url = data['url']
-            if url not in url_to_keywords:
-                url_to_keywords[url] = []
-            url_to_keywords[url].append(data)
-        
-        # Pour chaque URL, trouver le mot-clé principal
-        top_keywords = []
-        for url, keywords in url_to_keywords.items():
-            # Trier par clics (ou impressions si pas de clics)
-            sorted_keywords = sorted(keywords, key=lambda x: (x['clicks'], x['impressions']), reverse=True)
-            if sorted_keywords:
-                top_keywords.append(sorted_keywords[0])
-        
-        return top_keywords
+        keywords_data = self.get_keywords_data(site_url, start_date, end_date, max_rows=max_rows, as_frame=True)
+        
+        # Mot-clé principal de chaque URL (celui avec le plus de clics, puis d'impressions)
+        return keywords_data.primary_keywords().to_records()
     
     async def get_top_keywords_by_url_async(self, site_url, start_date, end_date, max_rows=100000):
         """Version asynchrone pour récupérer le mot-clé principal pour chaque URL"""
-        keywords_data = await self.get_keywords_data_async(site_url, start_date, end_date, max_rows=max_rows)
-        
-        # Regrouper par URL et trouver le mot-clé principal (celui avec le plus de clics)
-        url_to_keywords = {}
-        for data in keywords_data:
-            url = data['url']
-            if url not in url_to_keywords:
-                url_to_keywords[url] = []
-            url_to_keywords[url].append(data)
-        
-        # Pour chaque URL, trouver le mot-clé principal
-        top_keywords = []
-        for url, keywords in url_to_keywords.items():
-            # Trier par clics (ou impressions si pas de clics)
-            sorted_keywords = sorted(keywords, key=lambda x: (x['clicks'], x['impressions']), reverse=True)
-            if sorted_keywords:
-                top_keywords.append(sorted_keywords[0])
-        
-        return top_keywords
+        keywords_data = await self.get_keywords_data_async(site_url, start_date, end_date, max_rows=max_rows, as_frame=True)
+        
+        # Mot-clé principal de chaque URL (celui avec le plus de clics, puis d'impressions)
+        return keywords_data.primary_keywords().to_records()
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from sentence_transformers import SentenceTransformer
 from collections import defaultdict
@@ -5,23 +6,299 @@ import pandas as pd
 from datetime import datetime
 import asyncio
 import time
+import threading
+import itertools
+from server.services.embedding_cache import EmbeddingCache
+from server.services.ann_index import create_index, measure_recall
+from server.services.pair_scoring import score_group
+from server.services.execution import ExecutionBackend
+from server.services.keyword_frame import KeywordFrame
+from server.services.keyword_index import KeywordIndex
+from server.services.score_store import ScoreStore
+
+CONTENT_MODES = ('summary', 'passages')
+
+class PairScoreTable:
+    """Table des scores de paires d'URLs, partagée par tous les groupes d'une analyse
+    
+    Les URLs sont internées (URL -> identifiant entier) et chaque paire non ordonnée
+    n'a qu'un seul enregistrement, référencé par tous les groupes qui la contiennent.
+    """
+    
+    def __init__(self):
+        self.url_ids = {}
+        self.urls = []
+        self.records = []
+        self.pair_index = {}
+        self.references = 0
+    
+    def intern(self, url):
+        """Obtenir l'identifiant entier d'une URL"""
+        url_id = self.url_ids.get(url)
+        if url_id is None:
+            url_id = self.url_ids[url] = len(self.urls)
+            self.urls.append(url)
+        return url_id
+    
+    def lookup(self, id1, id2):
+        """Indice de l'enregistrement d'une paire, ou None si elle n'a pas encore été évaluée"""
+        return self.pair_index.get((id1, id2) if id1 < id2 else (id2, id1))
+    
+    def add(self, id1, id2, record):
+        """Enregistrer le score d'une paire et retourner son indice"""
+        self.pair_index[(id1, id2) if id1 < id2 else (id2, id1)] = len(self.records)
+        self.records.append(record)
+        return len(self.records) - 1
+    
+    def to_arrays(self):
+        """
+        Scores des paires en tableaux (une ligne par enregistrement), sans dictionnaire par paire
+        
+        Forme compacte conservée par le ScoreStore; les enregistrements sont reconstitués par
+        pair_record (une paire) ou from_arrays (toute la table).
+        """
+        url_ids = self.url_ids
+        records = self.records
+        return {
+            'urls': self.urls,
+            'url1': np.array([url_ids[record['url1']] for record in records], dtype=np.int32),
+            'url2': np.array([url_ids[record['url2']] for record in records], dtype=np.int32),
+            'similarity': np.array([record['similarity'] for record in records], dtype=np.float64),
+            'url_similarity': np.array([record['similarity_details']['url_similarity'] for record in records], dtype=np.float64),
+            'content_similarity': np.array([record['similarity_details']['content_similarity'] or 0.0 for record in records], dtype=np.float64),
+            'has_content': np.array([record['similarity_details']['content_similarity'] is not None for record in records], dtype=bool)
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays, assess_risk):
+        """Reconstituer une table à partir de to_arrays (assess_risk: similarité -> niveau de risque)"""
+        table = cls()
+        for url in arrays['urls']:
+            table.intern(url)
+        for pair_id, (id1, id2) in enumerate(zip(arrays['url1'].tolist(), arrays['url2'].tolist())):
+            table.add(id1, id2, cls.pair_record(arrays, pair_id, assess_risk))
+        return table
+    
+    @staticmethod
+    def pair_record(arrays, pair_id, assess_risk):
+        """Enregistrement d'une paire à partir de to_arrays"""
+        similarity = float(arrays['similarity'][pair_id])
+        return {
+            'url1': arrays['urls'][arrays['url1'][pair_id]],
+            'url2': arrays['urls'][arrays['url2'][pair_id]],
+            'similarity': similarity,
+            'similarity_details': {
+                'url_similarity': float(arrays['url_similarity'][pair_id]),
+                'content_similarity': float(arrays['content_similarity'][pair_id]) if arrays['has_content'][pair_id] else None,
+                'combined_similarity': similarity
+            },
+            'risk': assess_risk(similarity)
+        }
 
 class SimilarityAnalyzer:
     """Service pour analyser la similarité entre les URLs basée sur les mots-clés"""
     
-    def __init__(self, model_name='paraphrase-multilingual-MiniLM-L12-v2'):
-        """Initialiser l'analyseur de similarité avec un modèle Sentence Transformers"""
+    def __init__(self, model_name='paraphrase-multilingual-MiniLM-L12-v2', cache_dir=None, execution_backend=None, max_workers=None, content_mode=None, max_page_tokens=None):
+        """
+        Initialiser l'analyseur de similarité avec un modèle Sentence Transformers
+        
+        Args:
+            model_name: Nom du modèle Sentence Transformers
+            cache_dir: Répertoire du cache persistant d'embeddings (par défaut: EMBEDDING_CACHE_DIR, désactivé si absent)
+            execution_backend: Mode d'exécution des analyses asynchrones, 'inline', 'thread' ou 'process'
+                (par défaut: ANALYSIS_BACKEND, sinon 'thread')
+            max_workers: Nombre de processus en mode 'process' (par défaut: ANALYSIS_WORKERS, sinon nombre de cœurs)
+            content_mode: Texte encodé pour le contenu des pages, 'summary' (titre, meta description et titres)
+                ou 'passages' (corps de la page découpé en passages) (par défaut: CONTENT_EMBEDDING_MODE, sinon 'summary')
+            max_page_tokens: Nombre maximum de jetons encodés par page en mode 'passages'
+                (par défaut: CONTENT_EMBEDDING_MAX_TOKENS, sinon 2048)
+        """
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
+        
+        self.content_mode = content_mode or os.getenv('CONTENT_EMBEDDING_MODE', 'summary')
+        if self.content_mode not in CONTENT_MODES:
+            raise ValueError(f"Mode d'embedding du contenu inconnu: {self.content_mode} (disponibles: {', '.join(CONTENT_MODES)})")
+        self.max_page_tokens = max_page_tokens or int(os.getenv('CONTENT_EMBEDDING_MAX_TOKENS', 2048))
+        # Jetons par passage: longueur maximum du modèle, moins les jetons de début et de fin de séquence
+        self.passage_tokens = max((getattr(self.model, 'max_seq_length', None) or 128) - 2, 1)
+        
+        if not isinstance(execution_backend, ExecutionBackend):
+            max_workers = max_workers or os.getenv('ANALYSIS_WORKERS')
+            execution_backend = ExecutionBackend(
+                execution_backend or os.getenv('ANALYSIS_BACKEND', 'thread'),
+                max_workers=int(max_workers) if max_workers else None
+            )
+        self.execution_backend = execution_backend
+        
+        cache_dir = cache_dir or os.getenv('EMBEDDING_CACHE_DIR')
+        self.embedding_cache = None
+        if cache_dir:
+            self.embedding_cache = EmbeddingCache(
+                cache_dir,
+                model_name,
+                max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 100000)),
+                dtype=os.getenv('EMBEDDING_CACHE_DTYPE', 'float32')
+            )
+        
+        # Scores bruts des analyses récentes, pour ré-appliquer un seuil sans tout recalculer
+        self.score_store = ScoreStore(
+            max_analyses=int(os.getenv('SCORE_STORE_MAX_ANALYSES', 8)),
+            ttl=int(os.getenv('SCORE_STORE_TTL', 3600))
+        )
     
     def compute_embeddings(self, texts):
-        """Calculer les embeddings pour une liste de textes"""
+        """Calculer les embeddings pour une liste de textes
+        
+        Si le cache d'embeddings est activé, seuls les textes absents du cache
+        (pages nouvelles ou modifiées) sont encodés par le modèle.
+        """
         print(f"Calcul des embeddings pour {len(texts)} textes...")
         start_time = time.time()
-        embeddings = self.model.encode(texts)
+        
+        embeddings, computed = self._encode(texts)
+        if self.embedding_cache is not None:
+            print(f"Embeddings trouvés dans le cache: {len(texts) - computed}, à calculer: {computed}")
+            if computed:
+                self.embedding_cache.flush()
+        
+        end_time = time.time()
+        print(f"Embeddings calculés en {end_time - start_time:.2f} secondes")
+        return embeddings
+    
+    def _encode(self, texts):
+        """
+        Encoder des textes (seuls les textes absents du cache d'embeddings passent par le modèle)
+        
+        Le cache n'est pas écrit sur le disque (voir EmbeddingCache.flush).
+        
+        Returns:
+            Tuple (embeddings, nombre de textes encodés par le modèle)
+        """
+        if self.embedding_cache is None:
+            return self.model.encode(texts), len(texts)
+        
+        cached, missing = self.embedding_cache.get_many(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = self.model.encode(missing_texts)
+            self.embedding_cache.put_many(missing_texts, computed)
+            for i, embedding in zip(missing, computed):
+                cached[i] = embedding
+        return np.array([cached[i] for i in range(len(texts))], dtype=np.float32), len(missing)
+    
+    def compute_page_embeddings(self, pages):
+        """Calculer les embeddings de pages découpées en passages (voir _content_passages et _encode_pages)"""
+        passages = sum(len(page) for page in pages)
+        print(f"Calcul des embeddings pour {len(pages)} pages ({passages} passages)...")
+        start_time = time.time()
+        
+        embeddings, computed = self._encode_pages(pages)
+        if self.embedding_cache is not None:
+            print(f"Passages trouvés dans le cache: {passages - computed}, à calculer: {computed}")
+            if computed:
+                self.embedding_cache.flush()
+        
         end_time = time.time()
         print(f"Embeddings calculés en {end_time - start_time:.2f} secondes")
         return embeddings
     
+    def _encode_pages(self, pages):
+        """
+        Encoder des pages découpées en passages (chaque page doit avoir au moins un passage)
+        
+        Les passages de toutes les pages sont encodés en un seul appel (voir _encode). En mode
+        'passages', les embeddings des passages sont normalisés puis moyennés par page, pondérés
+        par leur nombre de jetons.
+        
+        Returns:
+            Tuple (embeddings des pages, nombre de passages encodés par le modèle)
+        """
+        texts = [text for passages in pages for text, _ in passages]
+        embeddings, computed = self._encode(texts)
+        if self.content_mode == 'summary':
+            return embeddings, computed
+        
+        weights = np.array([tokens for passages in pages for _, tokens in passages], dtype=np.float32)
+        starts = np.cumsum([0] + [len(passages) for passages in pages[:-1]])
+        pooled = np.add.reduceat(self._normalize_embeddings(embeddings) * weights[:, None], starts)
+        return pooled / np.add.reduceat(weights, starts)[:, None], computed
+    
+    async def iter_embed_pages_async(self, pages, content_embeddings, batch_size=64, max_pending_batches=2):
+        """
+        Calculer les embeddings de contenu au fil du scraping
+        
+        Les pages sont produites telles quelles. Leur contenu est regroupé en micro-lots de
+        batch_size pages, encodés par le modèle (dans un thread) pendant que le scraping
+        continue. La file des lots à encoder est bornée: si le modèle est plus lent que le
+        scraping, la lecture des pages s'arrête, et avec elle le scraping
+        (voir WebScraper.iter_scrape_urls_async).
+        
+        Args:
+            pages: Itérateur asynchrone de tuples (URL, données scrapées), par exemple
+                WebScraper.iter_scrape_urls_async
+            content_embeddings: Dictionnaire URL -> embedding, complété au fil de l'eau
+                (complet à la fin de l'itération), utilisable par analyze_keywords
+            batch_size: Nombre de pages par micro-lot
+            max_pending_batches: Nombre maximum de micro-lots en attente d'encodage
+        """
+        queue = asyncio.Queue(maxsize=max_pending_batches)
+        loop = asyncio.get_running_loop()
+        stats = {'batches': 0, 'texts': 0, 'computed': 0}
+        start_time = time.time()
+        
+        async def encode():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                urls, contents = batch
+                embeddings, computed = await loop.run_in_executor(None, self._encode_pages, contents)
+                content_embeddings.update(zip(urls, embeddings))
+                stats['batches'] += 1
+                stats['texts'] += len(contents)
+                stats['computed'] += computed
+        
+        encoder = asyncio.create_task(encode())
+        
+        async def submit(batch):
+            # Attendre une place dans la file, sauf si l'encodage s'est arrêté sur une erreur
+            put = asyncio.ensure_future(queue.put(batch))
+            await asyncio.wait({put, encoder}, return_when=asyncio.FIRST_COMPLETED)
+            if not put.done():
+                put.cancel()
+                encoder.result()
+        
+        try:
+            urls, contents = [], []
+            async for url, data in pages:
+                passages = self._page_passages(url, data)
+                if passages:
+                    urls.append(url)
+                    contents.append(passages)
+                    if len(contents) >= batch_size:
+                        await submit((urls, contents))
+                        urls, contents = [], []
+                yield url, data
+            
+            if contents:
+                await submit((urls, contents))
+            await submit(None)
+            await encoder
+        finally:
+            if not encoder.done():
+                encoder.cancel()
+            await asyncio.gather(encoder, return_exceptions=True)
+            # Enregistrer les embeddings déjà calculés, même si l'itération est interrompue
+            # (client déconnecté, erreur sur une page)
+            if self.embedding_cache is not None and stats['computed']:
+                await loop.run_in_executor(None, self.embedding_cache.flush)
+        
+        print(
+            f"Embeddings calculés au fil du scraping pour {stats['texts']} pages en {stats['batches']} lots "
+            f"({stats['computed']} passages encodés par le modèle, {time.time() - start_time:.2f} secondes)"
+        )
+    
     async def compute_embeddings_async(self, texts):
         """Calculer les embeddings pour une liste de textes de manière asynchrone"""
         # Utiliser un thread séparé pour l'encodage car sentence-transformers n'est pas nativement asynchrone
@@ -37,233 +314,837 @@ class SimilarityAnalyzer:
         # Cette opération est légère, donc nous pouvons simplement appeler la méthode synchrone
         return self.compute_similarity(embedding1, embedding2)
     
-    def analyze_keywords(self, keywords_data, similarity_threshold=0.8, primary_keyword_only=False, scraped_data=None, min_clicks=0, min_impressions=0):
+    def analyze_keywords(self, keywords_data, similarity_threshold=0.8, primary_keyword_only=False, scraped_data=None, min_clicks=0, min_impressions=0, compact_pairs=False, store_scores=False, content_embeddings=None):
         """
         Analyser les données de mots-clés pour trouver la cannibalisation
         
         Args:
-            keywords_data: Liste des données de mots-clés
+            keywords_data: Données de mots-clés (KeywordFrame ou liste de dictionnaires)
             similarity_threshold: Seuil de similarité pour considérer qu'il y a cannibalisation
             primary_keyword_only: Si True, ne considère que les URLs dont le mot-clé principal est le même
             scraped_data: Données scrapées des pages (optionnel)
             min_clicks: Nombre minimum de clics pour inclure une URL dans l'analyse
             min_impressions: Nombre minimum d'impressions pour inclure une URL dans l'analyse
+            compact_pairs: Si True, les groupes référencent les paires par leur indice ('pair_ids')
+                dans la table 'pair_scores' au lieu de les contenir ('pairs'); les URLs d'une paire
+                de 'pair_scores' ne sont pas forcément dans l'ordre des URLs de chaque groupe
+            store_scores: Si True, les scores bruts sont conservés et les résultats contiennent un
+                'analysis_id' utilisable avec rethreshold_analysis
+            content_embeddings: Embeddings de contenu déjà calculés (URL -> embedding, voir
+                iter_embed_pages_async); calculés à partir de scraped_data si absents
+        """
+        keyword_frame, content_embeddings = self._prepare_analysis(
+            keywords_data, similarity_threshold, scraped_data, min_clicks, min_impressions, content_embeddings
+        )
+        keyword_groups, total_keywords, analysis_type = self._group_keywords(keyword_frame, primary_keyword_only)
+        content_index, content_matrix = self._build_content_index(content_embeddings)
+        pair_table = PairScoreTable()
+        scored_groups = [] if store_scores else None
+        
+        results = self._analyze_groups(
+            keyword_groups, total_keywords, similarity_threshold, content_index, content_matrix,
+            pair_table, analysis_type, compact_pairs, scored_groups
+        )
+        
+        if store_scores:
+            results['analysis_id'] = self._store_scores(
+                keyword_frame, primary_keyword_only, similarity_threshold, min_clicks, min_impressions,
+                content_index, content_matrix, pair_table, self._scored_view(keyword_frame, primary_keyword_only, scored_groups)
+            )
+        return results
+    
+    def iter_analyze_keywords(self, keywords_data, similarity_threshold=0.8, primary_keyword_only=False, scraped_data=None, min_clicks=0, min_impressions=0, store_scores=False, content_embeddings=None):
+        """
+        Version incrémentale de analyze_keywords: produire des événements au fil de l'analyse
+        
+        Chaque groupe cannibalisé est produit dès que ses paires sont évaluées, sans attendre
+        la fin de l'analyse ni conserver la liste des groupes.
+        
+        Yields:
+            Dictionnaires d'événements, selon leur 'type':
+            - 'progress': étape terminée ('embeddings', 'grouped') et ses compteurs
+            - 'group': un groupe cannibalisé (même format que dans analyze_keywords)
+            - 'summary': les totaux de l'analyse (mêmes clés que analyze_keywords, sans 'groups')
+        """
+        keyword_frame, content_embeddings = self._prepare_analysis(
+            keywords_data, similarity_threshold, scraped_data, min_clicks, min_impressions, content_embeddings
+        )
+        yield {'type': 'progress', 'stage': 'embeddings', 'count': len(content_embeddings)}
+        
+        keyword_groups, total_keywords, analysis_type = self._group_keywords(keyword_frame, primary_keyword_only)
+        yield {'type': 'progress', 'stage': 'grouped', 'total_keywords': total_keywords, 'analyzed_keywords': len(keyword_groups)}
+        
+        content_index, content_matrix = self._build_content_index(content_embeddings)
+        pair_table = PairScoreTable()
+        scored_groups = [] if store_scores else None
+        cannibalized_keywords = 0
+        for group, pair_ids in self._iter_cannibalized_groups(
+            keyword_groups, similarity_threshold, content_index, content_matrix, pair_table, scored_groups
+        ):
+            cannibalized_keywords += 1
+            yield {'type': 'group', 'group': dict(group, pairs=self._group_pairs(group, pair_ids, pair_table.records.__getitem__))}
+        
+        summary = {
+            'type': 'summary',
+            'total_keywords': total_keywords,
+            'similarity_threshold': similarity_threshold,
+            'analyzed_keywords': len(keyword_groups),
+            'cannibalized_keywords': cannibalized_keywords,
+            'analysis_type': analysis_type
+        }
+        if store_scores:
+            summary['analysis_id'] = self._store_scores(
+                keyword_frame, primary_keyword_only, similarity_threshold, min_clicks, min_impressions,
+                content_index, content_matrix, pair_table, self._scored_view(keyword_frame, primary_keyword_only, scored_groups)
+            )
+        yield summary
+    
+    def rethreshold_analysis(self, analysis_id, similarity_threshold, min_clicks=None, min_impressions=None, risk_margin=0.1, compact_pairs=False, histogram_bins=20):
+        """
+        Ré-appliquer un seuil, des niveaux de risque ou des filtres plus stricts à une analyse enregistrée
+        
+        Aucune donnée n'est récupérée, scrapée ni encodée: seuls les scores enregistrés sont utilisés.
+        Un simple changement de seuil ne fait que comparer la similarité maximale de chaque groupe;
+        des filtres plus stricts reconstituent les groupes, les paires éventuellement nouvelles
+        (mot-clé principal modifié) étant calculées à partir des embeddings enregistrés.
+        
+        Args:
+            analysis_id: Identifiant retourné par analyze_keywords(store_scores=True)
+            similarity_threshold: Nouveau seuil de similarité
+            min_clicks: Nombre minimum de clics (au moins celui de l'analyse enregistrée)
+            min_impressions: Nombre minimum d'impressions (au moins celui de l'analyse enregistrée)
+            risk_margin: Écart au seuil délimitant les niveaux de risque (voir _assess_risk)
+            compact_pairs: Même signification que dans analyze_keywords
+            histogram_bins: Nombre d'intervalles de l'histogramme des seuils
+        
+        Returns:
+            Résultats au format de analyze_keywords, avec 'analysis_id' et 'threshold_histogram'
+            (nombre de mots-clés cannibalisés pour chaque seuil)
+        
+        Raises:
+            KeyError: Analyse inconnue ou expirée
+            ValueError: Filtres moins stricts que ceux de l'analyse enregistrée
+        """
+        entry = self.score_store.get(analysis_id)
+        if entry is None:
+            raise KeyError(f"Analyse inconnue ou expirée: {analysis_id}")
+        
+        stored_clicks, stored_impressions = entry['filters']
+        min_clicks = stored_clicks if min_clicks is None else min_clicks
+        min_impressions = stored_impressions if min_impressions is None else min_impressions
+        if min_clicks < stored_clicks or min_impressions < stored_impressions:
+            raise ValueError(
+                f"Les filtres ne peuvent être que plus stricts que ceux de l'analyse enregistrée "
+                f"(clics >= {stored_clicks}, impressions >= {stored_impressions})"
+            )
+        
+        with entry['lock']:
+            view = entry['views'].get((min_clicks, min_impressions))
+            if view is None:
+                keyword_frame = entry['keyword_frame'].filter(min_clicks, min_impressions)
+                keyword_groups, _, _ = self._group_keywords(keyword_frame, entry['primary_keyword_only'])
+                pair_table = PairScoreTable.from_arrays(
+                    entry['pair_scores'], lambda similarity: self._assess_risk(similarity, entry['similarity_threshold'])
+                )
+                scored_groups = []
+                for _ in self._iter_cannibalized_groups(
+                    keyword_groups, entry['similarity_threshold'], entry.get('content_index', {}),
+                    entry.get('content_matrix'), pair_table, scored_groups
+                ):
+                    pass
+                if len(pair_table.records) > len(entry['pair_scores']['similarity']):
+                    entry['pair_scores'] = pair_table.to_arrays()
+                view = self._scored_view(keyword_frame, entry['primary_keyword_only'], scored_groups)
+                # Ne conserver que la vue de l'analyse d'origine et la dernière vue filtrée
+                entry['views'] = {entry['filters']: entry['views'][entry['filters']], (min_clicks, min_impressions): view}
+            pair_scores = entry['pair_scores']
+        
+        # Le niveau de risque dépend du seuil: il est recalculé une seule fois par paire
+        rescored = {}
+        
+        def assess_risk(similarity):
+            return self._assess_risk(similarity, similarity_threshold, risk_margin)
+        
+        def rescore(pair_id):
+            record = rescored.get(pair_id)
+            if record is None:
+                record = rescored[pair_id] = PairScoreTable.pair_record(pair_scores, pair_id, assess_risk)
+            return record
+        
+        results = {
+            'total_keywords': view['total_keywords'],
+            'similarity_threshold': similarity_threshold,
+            'analyzed_keywords': len(view['max_similarities']),
+            'cannibalized_keywords': 0,
+            'groups': [],
+            'analysis_type': view['analysis_type'],
+            'analysis_id': analysis_id
+        }
+        selected = np.flatnonzero(view['max_similarities'] >= similarity_threshold)
+        offsets = view['pair_offsets']
+        self._attach_pairs(
+            results,
+            (
+                (group, view['pair_ids'][offsets[i]:offsets[i + 1]].tolist())
+                for group, i in zip(self._stored_groups(view, selected), selected.tolist())
+            ),
+            rescore,
+            compact_pairs
+        )
+        
+        bins = np.linspace(0.0, 1.0, histogram_bins + 1)
+        counts, _ = np.histogram(np.clip(view['max_similarities'], 0.0, 1.0), bins)
+        results['threshold_histogram'] = {
+            'thresholds': bins[:-1].round(6).tolist(),
+            'counts': counts.tolist(),
+            'cannibalized_keywords': counts[::-1].cumsum()[::-1].tolist()
+        }
+        return results
+    
+    def _prepare_analysis(self, keywords_data, similarity_threshold, scraped_data, min_clicks, min_impressions, content_embeddings=None):
+        """
+        Filtrer les données de mots-clés et calculer les embeddings de contenu
+        
+        Returns:
+            Tuple (KeywordFrame filtré, embeddings de contenu)
         """
         print(f"Démarrage de l'analyse de cannibalisation avec {len(keywords_data)} mots-clés...")
         print(f"Seuil de similarité: {similarity_threshold}")
         print(f"Analyse basée sur le contenu: {'Oui' if scraped_data else 'Non'}")
         
-        # Filtrer les données pour exclure les URLs contenant un # et appliquer les filtres de clics et impressions
-        filtered_keywords_data = []
-        for item in keywords_data:
-            # Nettoyer et convertir les valeurs en nombres entiers pour éviter les problèmes de type
-            clicks_str = str(item.get('clicks', 0) or 0).replace(' ', '')
-            impressions_str = str(item.get('impressions', 0) or 0).replace(' ', '')
-            
-            try:
-                clicks = int(float(clicks_str))
-                impressions = int(float(impressions_str))
-            except ValueError:
-                # En cas d'erreur, utiliser 0 comme valeur par défaut
-                print(f"Erreur de conversion pour les clics/impressions: {item.get('clicks')}/{item.get('impressions')}")
-                clicks = 0
-                impressions = 0
-            
-            if '#' not in item['url'] and clicks >= min_clicks and impressions >= min_impressions:
-                # Mettre à jour l'item avec les valeurs converties
-                item_copy = item.copy()
-                item_copy['clicks'] = clicks
-                item_copy['impressions'] = impressions
-                filtered_keywords_data.append(item_copy)
+        # Filtrer en une passe vectorisée (URLs contenant un #, clics et impressions minimum)
+        keyword_frame = KeywordFrame.from_records(keywords_data).filter(min_clicks, min_impressions)
+        print(f"Après filtrage: {len(keyword_frame)} mots-clés")
         
-        print(f"Après filtrage: {len(filtered_keywords_data)} mots-clés")
+        # Préparer les embeddings de contenu si des données scrapées sont fournies (sauf s'ils sont déjà calculés)
+        if content_embeddings is None:
+            content_embeddings = self._compute_content_embeddings(scraped_data)
+        else:
+            print(f"Embeddings de contenu déjà calculés pour {len(content_embeddings)} URLs")
         
-        # Préparer les embeddings de contenu si des données scrapées sont fournies
-        content_embeddings = {}
-        if scraped_data:
-            print(f"Préparation des embeddings de contenu pour {len(scraped_data)} URLs...")
-            for url, data in scraped_data.items():
-                # Ignorer les URLs contenant un #
-                if '#' in url:
-                    continue
-                content = self._prepare_content_for_embedding(data)
-                if content:
-                    print(f"Préparation du contenu pour l'embedding: {url[:50]}...")
-            
-            # Calculer tous les embeddings en une seule fois pour plus d'efficacité
-            urls = []
-            contents = []
-            for url, data in scraped_data.items():
-                if '#' not in url:
-                    content = self._prepare_content_for_embedding(data)
-                    if content:
-                        urls.append(url)
-                        contents.append(content)
-            
-            if contents:
-                print(f"Calcul des embeddings pour {len(contents)} URLs...")
-                embeddings = self.compute_embeddings(contents)
-                for i, url in enumerate(urls):
-                    content_embeddings[url] = embeddings[i]
-                print(f"Embeddings calculés pour {len(content_embeddings)} URLs")
-            else:
-                print("Aucun contenu valide trouvé pour calculer les embeddings")
+        return keyword_frame, content_embeddings
+    
+    def _group_keywords(self, keyword_frame, primary_keyword_only):
+        """
+        Constituer les groupes de mots-clés à analyser
+        
+        Returns:
+            Tuple (groupes de mots-clés, nombre total de mots-clés, type d'analyse)
+        """
+        grouping_frame, analysis_type = self._grouping_frame(keyword_frame, primary_keyword_only)
+        return grouping_frame.keyword_groups(), grouping_frame.keyword_count(), analysis_type
+    
+    def _grouping_frame(self, keyword_frame, primary_keyword_only):
+        """
+        Données regroupées par mot-clé pour l'analyse
         
+        Returns:
+            Tuple (KeywordFrame à regrouper, type d'analyse)
+        """
         if primary_keyword_only:
-            # Identifier le mot-clé principal pour chaque URL
-            url_to_primary_keyword = self._identify_primary_keywords(filtered_keywords_data)
-            
-            # Regrouper par mot-clé principal
-            primary_keyword_to_urls = defaultdict(list)
-            for url, keyword_data in url_to_primary_keyword.items():
-                keyword = keyword_data['keyword']
-                primary_keyword_to_urls[keyword].append(keyword_data)
-            
-            # Analyser chaque groupe de mot-clé principal
-            results = {
-                'total_keywords': len(primary_keyword_to_urls),
-                'similarity_threshold': similarity_threshold,
-                'analyzed_keywords': 0,
-                'cannibalized_keywords': 0,
-                'groups': [],
-                'analysis_type': 'primary_keyword'
-            }
-            
-            for keyword, urls_data in primary_keyword_to_urls.items():
-                # Ne considérer que les mots-clés avec au moins 2 URLs
-                if len(urls_data) < 2:
-                    continue
-                
-                results['analyzed_keywords'] += 1
-                
-                # Trier par position (meilleur classement en premier)
-                urls_data = sorted(urls_data, key=lambda x: x['position'])
-                
-                # Créer un groupe pour ce mot-clé
-                group = {
-                    'keyword': keyword,
-                    'url_count': len(urls_data),
-                    'urls': [],
-                    'pairs': []
-                }
-                
-                # Ajouter les URLs au groupe
-                for data in urls_data:
-                    group['urls'].append({
-                        'url': data['url'],
-                        'position': data['position'],
-                        'clicks': data.get('clicks', 0),
-                        'impressions': data.get('impressions', 0),
-                        'ctr': data.get('ctr', 0)
-                    })
-                
-                # Calculer la similarité entre chaque paire d'URLs
-                has_cannibalization = False
-                for i in range(len(urls_data)):
-                    for j in range(i + 1, len(urls_data)):
-                        url1 = urls_data[i]['url']
-                        url2 = urls_data[j]['url']
-                        
-                        # Calculer la similarité en combinant URL et contenu si disponible
-                        similarity, similarity_details = self._calculate_combined_similarity(
-                            url1, url2, content_embeddings
-                        )
-                        
-                        pair = {
-                            'url1': url1,
-                            'url2': url2,
-                            'similarity': similarity,
-                            'similarity_details': similarity_details,
-                            'risk': self._assess_risk(similarity, similarity_threshold)
-                        }
-                        
-                        group['pairs'].append(pair)
-                        
-                        if similarity >= similarity_threshold:
-                            has_cannibalization = True
-                
-                if has_cannibalization:
-                    results['cannibalized_keywords'] += 1
-                    results['groups'].append(group)
+            # Identifier le mot-clé principal pour chaque URL, puis regrouper par mot-clé principal
+            return keyword_frame.primary_keywords(), 'primary_keyword'
+        
+        # Comportement original - regrouper par mot-clé exact
+        return keyword_frame, 'exact_keyword'
+    
+    def _store_scores(self, keyword_frame, primary_keyword_only, similarity_threshold, min_clicks, min_impressions, content_index, content_matrix, pair_table, view):
+        """
+        Conserver les scores bruts d'une analyse dans le ScoreStore et retourner son identifiant
+        
+        Seul ce dont rethreshold_analysis a besoin est conservé: les données filtrées, les scores
+        des paires en tableaux et la vue compacte des groupes évalués. Les embeddings de contenu
+        ne sont conservés qu'en mode mot-clé principal, où des filtres plus stricts peuvent changer
+        le mot-clé principal d'une URL et former des paires à calculer; par mot-clé exact, les
+        groupes filtrés ne contiennent que des paires déjà évaluées.
+        """
+        filters = (min_clicks, min_impressions)
+        entry = {
+            'keyword_frame': keyword_frame,
+            'primary_keyword_only': primary_keyword_only,
+            'similarity_threshold': similarity_threshold,
+            'filters': filters,
+            'pair_scores': pair_table.to_arrays(),
+            'views': {filters: view},
+            'lock': threading.Lock()
+        }
+        if primary_keyword_only:
+            entry['content_index'] = content_index
+            entry['content_matrix'] = content_matrix
+        return self.score_store.put(entry)
+    
+    def _scored_view(self, keyword_frame, primary_keyword_only, scored_groups):
+        """
+        Vue compacte des groupes évalués et de leur similarité maximale, pour ré-appliquer un seuil en bloc
+        
+        Les groupes ne sont pas conservés, seulement leurs lignes dans les données regroupées
+        (dans l'ordre de _group_keywords) et les indices de leurs paires, mis bout à bout:
+        _stored_groups reconstitue les groupes retenus par un nouveau seuil.
+        """
+        grouping_frame, analysis_type = self._grouping_frame(keyword_frame, primary_keyword_only)
+        rows, boundaries = grouping_frame.keyword_group_rows()
+        return {
+            'total_keywords': grouping_frame.keyword_count(),
+            'analysis_type': analysis_type,
+            'frame': grouping_frame,
+            'rows': rows,
+            'boundaries': boundaries,
+            'pair_ids': np.fromiter(itertools.chain.from_iterable(pair_ids for pair_ids, _ in scored_groups), dtype=np.int32),
+            'pair_offsets': np.cumsum([0] + [len(pair_ids) for pair_ids, _ in scored_groups]),
+            'max_similarities': np.array([max_similarity for _, max_similarity in scored_groups], dtype=np.float64)
+        }
+    
+    def _stored_groups(self, view, selected):
+        """Reconstituer (sans leurs paires) les groupes d'indices selected d'une vue, en une seule conversion des lignes"""
+        starts = view['boundaries'][selected]
+        ends = view['boundaries'][selected + 1]
+        rows = [view['rows'][start:end] for start, end in zip(starts.tolist(), ends.tolist())]
+        rows = np.concatenate(rows) if rows else view['rows'][:0]
+        boundaries = np.concatenate([[0], np.cumsum(ends - starts)])
+        return [self._make_group(keyword, urls_data) for keyword, urls_data in view['frame'].split_groups(rows, boundaries)]
+    
+    def _analyze_groups(self, keyword_groups, total_keywords, similarity_threshold, content_index, content_matrix, pair_table, analysis_type, compact_pairs=False, scored_groups=None):
+        """
+        Analyser chaque groupe de mot-clé et calculer la similarité de ses paires d'URLs
+        
+        Args:
+            keyword_groups: Liste de tuples (mot-clé, lignes du groupe triées par position),
+                limitée aux mots-clés ayant au moins 2 URLs
+            total_keywords: Nombre total de mots-clés (avant exclusion des groupes d'une seule URL)
+            scored_groups: Liste (optionnelle) complétée pour tous les groupes évalués, cannibalisés ou non
+                (voir _iter_cannibalized_groups)
+        
+        Les embeddings de contenu sont normalisés une seule fois, puis chaque groupe
+        est évalué en bloc (un produit matriciel pour le contenu, une matrice
+        d'incidence des segments pour la similarité d'URL). Le score d'une paire
+        d'URLs ne dépend pas du mot-clé: il est calculé une seule fois par analyse
+        et tous les groupes partagent le même enregistrement de paire.
+        """
+        results = {
+            'total_keywords': total_keywords,
+            'similarity_threshold': similarity_threshold,
+            'analyzed_keywords': len(keyword_groups),
+            'cannibalized_keywords': 0,
+            'groups': [],
+            'analysis_type': analysis_type
+        }
+        
+        cannibalized_groups = self._iter_cannibalized_groups(
+            keyword_groups, similarity_threshold, content_index, content_matrix, pair_table, scored_groups
+        )
+        self._attach_pairs(results, cannibalized_groups, pair_table.records.__getitem__, compact_pairs)
+        
+        print(f"Paires d'URLs évaluées: {len(pair_table.records)} uniques pour {pair_table.references} références")
+        return results
+    
+    def _attach_pairs(self, results, groups, pair_record, compact_pairs):
+        """
+        Ajouter aux résultats les groupes retenus avec leurs paires
+        
+        Args:
+            groups: Itérable de tuples (groupe, indices de ses paires)
+            pair_record: Fonction indice de paire -> enregistrement de la paire
+        """
+        for group, pair_ids in groups:
+            if compact_pairs:
+                group = dict(group, pair_ids=pair_ids)
+            else:
+                group = dict(group, pairs=self._group_pairs(group, pair_ids, pair_record))
+            results['groups'].append(group)
+        results['cannibalized_keywords'] = len(results['groups'])
+        
+        if compact_pairs:
+            # Ne transmettre que les paires référencées par les groupes retenus
+            remapped = {}
+            for group in results['groups']:
+                group['pair_ids'] = [remapped.setdefault(pair_id, len(remapped)) for pair_id in group['pair_ids']]
+            results['pair_scores'] = [pair_record(pair_id) for pair_id in remapped]
+    
+    def _group_pairs(self, group, pair_ids, pair_record):
+        """
+        Paires d'un groupe, url1 et url2 dans l'ordre des URLs du groupe (url1 la mieux positionnée)
+        
+        L'enregistrement d'une paire est partagé par tous les groupes qui la contiennent (voir
+        PairScoreTable): ses URLs sont dans l'ordre du premier groupe évalué, et sont inversées
+        si besoin pour ce groupe (le score ne dépend pas de l'ordre).
+        """
+        urls = [data['url'] for data in group['urls']]
+        rows, cols = np.triu_indices(len(urls), 1)
+        pairs = []
+        for pair_id, i, j in zip(pair_ids, rows.tolist(), cols.tolist()):
+            record = pair_record(pair_id)
+            if record['url1'] != urls[i]:
+                record = dict(record, url1=urls[i], url2=urls[j])
+            pairs.append(record)
+        return pairs
+    
+    def _iter_cannibalized_groups(self, keyword_groups, similarity_threshold, content_index, content_matrix, pair_table, scored_groups=None):
+        """
+        Évaluer les groupes un par un et produire ceux qui sont cannibalisés
+        
+        Args:
+            scored_groups: Liste (optionnelle) complétée avec un tuple (indices des paires, similarité
+                maximale) pour chaque groupe évalué, cannibalisé ou non
+        
+        Yields:
+            Tuples (groupe sans ses paires, indices de ses paires dans pair_table.records)
+        """
+        # En mode 'process', les scores des paires nouvelles (absentes de la table et des groupes
+        # précédents) sont calculés par lots dans les processus de calcul
+        groups_scores = None
+        new_pairs = None
+        total_pairs = sum(len(urls_data) * (len(urls_data) - 1) // 2 for _, urls_data in keyword_groups)
+        if self.execution_backend.distributes(total_pairs):
+            new_pairs = self._select_new_pairs(keyword_groups, pair_table)
+            dispatched = [group_pairs for group_pairs in new_pairs if len(group_pairs[1])]
+            if self.execution_backend.distributes(sum(len(rows) for _, rows, _ in dispatched)):
+                positions = [content_index.get(url, -1) for url in pair_table.urls]
+                groups_scores = self.execution_backend.score_groups(dispatched, pair_table.urls, positions, content_matrix)
+        
+        for g, (keyword, urls_data) in enumerate(keyword_groups):
+            # Calculer la similarité des paires du groupe qui n'ont pas encore été évaluées
+            urls = [data['url'] for data in urls_data]
+            scores = None
+            if groups_scores is not None and len(new_pairs[g][1]):
+                scores = next(groups_scores)
+            pair_ids = self._score_group_pairs(urls, pair_table, content_index, content_matrix, similarity_threshold, scores)
             
-            return results
+            max_similarity = max(pair_table.records[pair_id]['similarity'] for pair_id in pair_ids)
+            if scored_groups is not None:
+                scored_groups.append((pair_ids, max_similarity))
+            if max_similarity >= similarity_threshold:
+                yield self._make_group(keyword, urls_data), pair_ids
+    
+    def _make_group(self, keyword, urls_data):
+        """Créer le groupe d'un mot-clé (sans ses paires) à partir de ses lignes triées par position"""
+        group = {
+            'keyword': keyword,
+            'url_count': len(urls_data),
+            'urls': []
+        }
+        
+        # Ajouter les URLs au groupe
+        for data in urls_data:
+            group['urls'].append({
+                'url': data['url'],
+                'position': data['position'],
+                'clicks': data.get('clicks', 0),
+                'impressions': data.get('impressions', 0),
+                'ctr': data.get('ctr', 0)
+            })
+        
+        return group
+    
+    def _select_new_pairs(self, keyword_groups, pair_table):
+        """
+        Paires de chaque groupe à calculer: absentes de la table et des groupes précédents
+        
+        Même sélection que _score_group_pairs lorsque les groupes sont évalués dans l'ordre:
+        les scores calculés par les processus de calcul correspondent aux paires manquantes.
+        
+        Returns:
+            Liste (un élément par groupe) de tuples (identifiants des URLs, indices i, indices j)
+        """
+        seen = set()
+        new_pairs = []
+        for _, urls_data in keyword_groups:
+            ids = [pair_table.intern(data['url']) for data in urls_data]
+            rows, cols = np.triu_indices(len(ids), 1)
+            keep = []
+            for k, (i, j) in enumerate(zip(rows.tolist(), cols.tolist())):
+                key = (ids[i], ids[j]) if ids[i] < ids[j] else (ids[j], ids[i])
+                if key not in seen and pair_table.lookup(ids[i], ids[j]) is None:
+                    seen.add(key)
+                    keep.append(k)
+            new_pairs.append((np.array(ids, dtype=np.int64), rows[keep], cols[keep]))
+        return new_pairs
+    
+    def _build_content_index(self, content_embeddings):
+        """
+        Normaliser une seule fois les embeddings de contenu
+        
+        La matrice est en float64: les similarités de contenu des paires sont des produits
+        scalaires en double précision, qui ne dépendent pas de l'ordre des calculs vectorisés
+        (écart à la similarité cosinus d'origine, calculée paire par paire en float32, de
+        l'ordre de l'arrondi float32).
+        
+        Returns:
+            Tuple (index URL -> ligne, matrice float64 des embeddings normalisés)
+        """
+        if not content_embeddings:
+            return {}, None
+        
+        urls = list(content_embeddings.keys())
+        matrix = self._normalize_embeddings([content_embeddings[url] for url in urls], dtype=np.float64)
+        
+        return {url: i for i, url in enumerate(urls)}, matrix
+    
+    def _score_group_pairs(self, urls, pair_table, content_index, content_matrix, similarity_threshold, scores=None):
+        """
+        Évaluer les paires (i < j) d'un groupe d'URLs de manière vectorisée
+        
+        Seules les paires absentes de la table sont calculées (en bloc, avec les mêmes
+        valeurs que _calculate_combined_similarity). Les autres réutilisent
+        l'enregistrement déjà calculé pour un autre groupe. Si scores est fourni
+        (calcul déjà fait par un processus de calcul pour les paires manquantes du
+        groupe, voir _select_new_pairs), il est utilisé directement.
+        
+        Returns:
+            Liste des indices des paires du groupe dans pair_table.records
+        """
+        ids = [pair_table.intern(url) for url in urls]
+        rows, cols = np.triu_indices(len(urls), 1)
+        
+        pair_ids = []
+        missing = []
+        first = {}  # paire manquante -> première occurrence dans le groupe
+        duplicates = []  # une même paire peut apparaître deux fois dans un groupe contenant des URLs en double
+        for k, (i, j) in enumerate(zip(rows.tolist(), cols.tolist())):
+            pair_id = pair_table.lookup(ids[i], ids[j])
+            pair_ids.append(pair_id)
+            if pair_id is None:
+                key = (ids[i], ids[j]) if ids[i] < ids[j] else (ids[j], ids[i])
+                if key in first:
+                    duplicates.append((k, first[key]))
+                else:
+                    first[key] = k
+                    missing.append(k)
+        
+        pair_table.references += len(pair_ids)
+        if not missing:
+            return pair_ids
+        
+        missing = np.asarray(missing)
+        rows = rows[missing]
+        cols = cols[missing]
+        if scores is not None:
+            similarities, url_similarities, content_similarities, has_content = scores
+        else:
+            positions = [content_index.get(url, -1) for url in urls]
+            similarities, url_similarities, content_similarities, has_content = score_group(
+                urls, positions, content_matrix, rows, cols
+            )
+        
+        for k, i, j, similarity, url_similarity, content_similarity, with_content in zip(
+            missing.tolist(),
+            rows.tolist(),
+            cols.tolist(),
+            similarities.tolist(),
+            url_similarities.tolist(),
+            content_similarities.tolist(),
+            has_content.tolist()
+        ):
+            pair_ids[k] = pair_table.add(ids[i], ids[j], {
+                'url1': urls[i],
+                'url2': urls[j],
+                'similarity': similarity,
+                'similarity_details': {
+                    'url_similarity': url_similarity,
+                    'content_similarity': content_similarity if with_content else None,
+                    'combined_similarity': similarity
+                },
+                'risk': self._assess_risk(similarity, similarity_threshold)
+            })
+        
+        for k, original in duplicates:
+            pair_ids[k] = pair_ids[original]
+        
+        return pair_ids
+    
+    def _compute_content_embeddings(self, scraped_data):
+        """
+        Calculer les embeddings de contenu des pages scrapées
+        
+        Returns:
+            Dictionnaire URL -> embedding (vide si aucune donnée scrapée exploitable)
+        """
+        content_embeddings = {}
+        if not scraped_data:
+            return content_embeddings
+        
+        print(f"Préparation des embeddings de contenu pour {len(scraped_data)} URLs...")
+        
+        # Calculer tous les embeddings en une seule fois pour plus d'efficacité
+        urls = []
+        contents = []
+        for url, data in scraped_data.items():
+            passages = self._page_passages(url, data)
+            if passages:
+                urls.append(url)
+                contents.append(passages)
+        
+        if contents:
+            print(f"Calcul des embeddings pour {len(contents)} URLs...")
+            embeddings = self.compute_page_embeddings(contents)
+            for i, url in enumerate(urls):
+                content_embeddings[url] = embeddings[i]
+            print(f"Embeddings calculés pour {len(content_embeddings)} URLs")
         else:
-            # Comportement original - regrouper par mot-clé exact
-            keyword_to_urls = defaultdict(list)
-            for data in filtered_keywords_data:
-                keyword = data['keyword']
-                keyword_to_urls[keyword].append(data)
+            print("Aucun contenu valide trouvé pour calculer les embeddings")
+        
+        return content_embeddings
+    
+    def _page_passages(self, url, data):
+        """Passages à encoder pour une page scrapée (aucun pour les URLs contenant un # et les pages sans contenu)"""
+        if '#' in url:
+            return []
+        return self._content_passages(data)
+    
+    def _content_passages(self, scraped_data):
+        """
+        Découper le contenu d'une page en passages à encoder
+        
+        En mode 'summary', un seul passage: le texte de _prepare_content_for_embedding. En mode
+        'passages', ce texte suivi du corps de la page (clé 'content'), découpé en passages d'au
+        plus passage_tokens jetons, dans la limite de max_page_tokens jetons pour la page.
+        
+        Returns:
+            Liste de tuples (passage, nombre de jetons), vide si la page n'a pas de contenu
+        """
+        content = self._prepare_content_for_embedding(scraped_data)
+        if self.content_mode == 'summary':
+            return [(content, 1)] if content else []
+        
+        body = scraped_data.get('content', '') if scraped_data else ''
+        # Sans titres (fichier de contenu envoyé), le texte préparé est déjà le corps de la page
+        if body and body != content:
+            content = f"{content} {body}"
+        # Chaque mot compte au moins un jeton: inutile de compter au-delà du budget
+        words = content.split()[:self.max_page_tokens]
+        passages = []
+        start = length = total = 0
+        for end, tokens in enumerate(self._count_tokens(words)):
+            total += tokens
+            if total > self.max_page_tokens:
+                break
+            if length + tokens > self.passage_tokens and end > start:
+                passages.append((' '.join(words[start:end]), length))
+                start, length = end, 0
+            length += tokens
+        else:
+            end = len(words)
+        if end > start:
+            passages.append((' '.join(words[start:end]), length))
+        return passages
+    
+    def _count_tokens(self, words):
+        """Nombre de jetons de chaque mot (tokenizer du modèle, sinon estimation à 4 caractères par jeton)"""
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        if tokenizer is None or not words:
+            return [len(word) // 4 + 1 for word in words]
+        return [max(len(ids), 1) for ids in tokenizer(words, add_special_tokens=False)['input_ids']]
+    
+    def analyze_site_content(self, scraped_data, similarity_threshold=0.8, keywords_data=None, min_clicks=0, min_impressions=0, index_type='ivf', index_path=None, content_embeddings=None):
+        """
+        Rechercher les paires de pages au contenu proche sur tout le site, quel que soit le mot-clé
+        
+        Les embeddings de contenu sont indexés (index ANN, voir ann_index.py) puis chaque page
+        est interrogée par rayon de similarité. Les pages reliées forment des groupes
+        (composantes connexes), présentés comme les groupes de mots-clés.
+        
+        Args:
+            scraped_data: Données scrapées des pages
+            similarity_threshold: Seuil de similarité de contenu
+            keywords_data: Données de mots-clés (optionnel) pour les métriques et le libellé des groupes
+            min_clicks: Nombre minimum de clics pour inclure une URL dans l'analyse
+            min_impressions: Nombre minimum d'impressions pour inclure une URL dans l'analyse
+            index_type: Type d'index ('ivf' approximatif ou 'exact')
+            index_path: Fichier .npz où sauvegarder l'index construit (optionnel)
+            content_embeddings: Embeddings de contenu déjà calculés (URL -> embedding, voir
+                iter_embed_pages_async); calculés à partir de scraped_data si absents
+        """
+        print(f"Démarrage de l'analyse de similarité de contenu sur tout le site ({index_type})...")
+        
+        # Métriques et mot-clé principal de chaque URL
+        url_metrics = {}
+        url_to_primary_keyword = {}
+        if keywords_data is not None and len(keywords_data):
+            keyword_frame = KeywordFrame.from_records(keywords_data).filter(min_clicks, min_impressions)
+            url_to_primary_keyword = self._identify_primary_keywords(keyword_frame)
+            url_metrics = self._aggregate_url_metrics(keyword_frame)
+        
+        if content_embeddings is None:
+            content_embeddings = self._compute_content_embeddings(scraped_data)
+        if keywords_data is not None and len(keywords_data):
+            content_embeddings = {url: embedding for url, embedding in content_embeddings.items() if url in url_metrics}
+        
+        results = {
+            'total_keywords': len(content_embeddings),
+            'similarity_threshold': similarity_threshold,
+            'analyzed_keywords': len(content_embeddings),
+            'cannibalized_keywords': 0,
+            'groups': [],
+            'analysis_type': 'site_content'
+        }
+        if len(content_embeddings) < 2:
+            return results
+        
+        urls = list(content_embeddings.keys())
+        embeddings = np.asarray([content_embeddings[url] for url in urls], dtype=np.float32)
+        
+        start_time = time.time()
+        index = create_index(index_type).build(embeddings)
+        if index_path:
+            index.save(index_path)
+        neighbors = index.query_radius(embeddings, similarity_threshold)
+        print(f"Recherche des voisins terminée en {time.time() - start_time:.2f} secondes")
+        
+        results['index'] = {'type': index_type, 'size': len(index)}
+        if index_type != 'exact':
+            results['index'].update(measure_recall(index, embeddings, similarity_threshold))
+            print(f"Rappel de l'index par rapport à la recherche exacte: {results['index']['recall']:.3f}")
+        
+        # Paires (i < j) et composantes connexes (union-find). Avec un index approximatif, une
+        # paire peut n'être trouvée qu'en cherchant les voisins de l'une de ses deux pages
+        parents = list(range(len(urls)))
+        
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+        
+        edges = {}
+        for i, (ids, similarities) in enumerate(neighbors):
+            for j, similarity in zip(ids.tolist(), similarities.tolist()):
+                if j == i:
+                    continue
+                pair = (i, j) if i < j else (j, i)
+                if pair not in edges:
+                    edges[pair] = similarity
+                    parents[find(i)] = find(j)
+        
+        components = defaultdict(list)
+        for i in range(len(urls)):
+            components[find(i)].append(i)
+        component_edges = defaultdict(list)
+        for (i, j), similarity in edges.items():
+            component_edges[find(i)].append((i, j, similarity))
+        
+        for root, members in components.items():
+            if len(members) < 2:
+                continue
             
-            # Analyser chaque groupe de mot-clé
-            results = {
-                'total_keywords': len(keyword_to_urls),
-                'similarity_threshold': similarity_threshold,
-                'analyzed_keywords': 0,
-                'cannibalized_keywords': 0,
-                'groups': [],
-                'analysis_type': 'exact_keyword'
+            # L'URL de référence est celle qui génère le plus de clics
+            members = sorted(members, key=lambda i: (-url_metrics.get(urls[i], {}).get('clicks', 0), i))
+            reference_url = urls[members[0]]
+            group = {
+                'keyword': url_to_primary_keyword.get(reference_url, {}).get('keyword', reference_url),
+                'url_count': len(members),
+                'urls': [],
+                'pairs': []
             }
+            for i in members:
+                metrics = url_metrics.get(urls[i], {})
+                group['urls'].append({
+                    'url': urls[i],
+                    'position': metrics.get('position', 0),
+                    'clicks': metrics.get('clicks', 0),
+                    'impressions': metrics.get('impressions', 0),
+                    'ctr': metrics.get('ctr', 0)
+                })
             
-            for keyword, urls_data in keyword_to_urls.items():
-                # Ne considérer que les mots-clés avec au moins 2 URLs
-                if len(urls_data) < 2:
-                    continue
-                
-                results['analyzed_keywords'] += 1
-                
-                # Trier par position (meilleur classement en premier)
-                urls_data = sorted(urls_data, key=lambda x: x['position'])
-                
-                # Créer un groupe pour ce mot-clé
-                group = {
-                    'keyword': keyword,
-                    'url_count': len(urls_data),
-                    'urls': [],
-                    'pairs': []
-                }
-                
-                # Ajouter les URLs au groupe
-                for data in urls_data:
-                    group['urls'].append({
-                        'url': data['url'],
-                        'position': data['position'],
-                        'clicks': data.get('clicks', 0),
-                        'impressions': data.get('impressions', 0),
-                        'ctr': data.get('ctr', 0)
-                    })
-                
-                # Calculer la similarité entre chaque paire d'URLs
-                has_cannibalization = False
-                for i in range(len(urls_data)):
-                    for j in range(i + 1, len(urls_data)):
-                        url1 = urls_data[i]['url']
-                        url2 = urls_data[j]['url']
-                        
-                        # Calculer la similarité en combinant URL et contenu si disponible
-                        similarity, similarity_details = self._calculate_combined_similarity(
-                            url1, url2, content_embeddings
-                        )
-                        
-                        pair = {
-                            'url1': url1,
-                            'url2': url2,
-                            'similarity': similarity,
-                            'similarity_details': similarity_details,
-                            'risk': self._assess_risk(similarity, similarity_threshold)
-                        }
-                        
-                        group['pairs'].append(pair)
-                        
-                        if similarity >= similarity_threshold:
-                            has_cannibalization = True
-                
-                if has_cannibalization:
-                    results['cannibalized_keywords'] += 1
-                    results['groups'].append(group)
+            for i, j, similarity in sorted(component_edges[root], key=lambda edge: -edge[2]):
+                url_similarity = self._calculate_url_similarity(urls[i], urls[j])
+                group['pairs'].append({
+                    'url1': urls[i],
+                    'url2': urls[j],
+                    'similarity': similarity,
+                    'similarity_details': {
+                        'url_similarity': float(url_similarity),
+                        'content_similarity': similarity,
+                        'combined_similarity': similarity
+                    },
+                    'risk': self._assess_risk(similarity, similarity_threshold)
+                })
             
-            return results
+            results['groups'].append(group)
+        
+        results['cannibalized_keywords'] = len(results['groups'])
+        print(f"{len(results['groups'])} groupes de pages au contenu similaire trouvés")
+        
+        return results
     
-    async def analyze_keywords_async(self, keywords_data, similarity_threshold=0.8, primary_keyword_only=False, scraped_data=None, min_clicks=0, min_impressions=0):
+    async def analyze_site_content_async(self, scraped_data, similarity_threshold=0.8, keywords_data=None, min_clicks=0, min_impressions=0, index_type='ivf', index_path=None, content_embeddings=None):
+        """Rechercher les paires de pages au contenu proche sur tout le site de manière asynchrone"""
+        return await self.execution_backend.run(self.analyze_site_content, scraped_data, similarity_threshold, keywords_data, min_clicks, min_impressions, index_type, index_path, content_embeddings)
+    
+    def _aggregate_url_metrics(self, keyword_frame):
+        """Agréger clics, impressions, CTR et position moyenne (pondérée par les impressions) par URL"""
+        df = keyword_frame.df.assign(weighted_position=keyword_frame.df['position'] * keyword_frame.df['impressions'])
+        totals = df.groupby('url', observed=True, sort=False).agg(
+            clicks=('clicks', 'sum'),
+            impressions=('impressions', 'sum'),
+            weighted_position=('weighted_position', 'sum'),
+            mean_position=('position', 'mean')
+        )
+        
+        impressions = totals['impressions'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ctr = np.where(impressions > 0, totals['clicks'].to_numpy() / impressions, 0)
+            position = np.where(impressions > 0, totals['weighted_position'].to_numpy() / impressions, totals['mean_position'].to_numpy())
+        
+        return {
+            url: {'clicks': url_clicks, 'impressions': url_impressions, 'ctr': url_ctr, 'position': url_position}
+            for url, url_clicks, url_impressions, url_ctr, url_position in zip(
+                totals.index.astype(str).tolist(),
+                totals['clicks'].tolist(),
+                impressions.tolist(),
+                ctr.tolist(),
+                position.tolist()
+            )
+        }
+    
+    async def ingest_keyword_batches_async(self, batches, max_rows=None, report=None):
+        """
+        Construire les données de mots-clés à partir de lots produits au fil de la récupération
+        
+        Chaque lot est ajouté à un KeywordIndex dès son arrivée: l'agrégation se fait pendant
+        la récupération et la mémoire est bornée par le nombre de couples mot-clé / URL
+        distincts, et non par l'export brut.
+        
+        Args:
+            batches: Itérateur asynchrone de tuples (rang de la première ligne du lot, KeywordFrame),
+                par exemple SearchConsoleService.iter_keyword_batches
+            max_rows: Nombre maximum de couples conservés (les plus cliqués)
+            report: Dictionnaire complété par le nombre de couples agrégés ('merged_rows'), conservés
+                ('rows') et écartés par max_rows ('dropped_rows'), par exemple le rapport de
+                SearchConsoleService.iter_keyword_batches
+        
+        Returns:
+            KeywordFrame agrégé, utilisable par analyze_keywords
+        """
+        keyword_index = KeywordIndex()
+        batch_count = 0
+        async for order_start, batch in batches:
+            keyword_index.add(batch, order_start)
+            batch_count += 1
+        
+        print(f"{keyword_index.rows} lignes reçues en {batch_count} lots, {len(keyword_index)} couples mot-clé/URL distincts")
+        keywords_frame = keyword_index.to_frame(max_rows)
+        dropped_rows = len(keyword_index) - len(keywords_frame)
+        if report is not None:
+            report.update(merged_rows=len(keyword_index), rows=len(keywords_frame), dropped_rows=dropped_rows)
+        if dropped_rows:
+            print(f"⚠️ {dropped_rows} paires mot-clé/URL écartées par la limite de {max_rows} lignes")
+        return keywords_frame
+    
+    async def iter_analyze_keywords_async(self, keywords_data, similarity_threshold=0.8, primary_keyword_only=False, scraped_data=None, min_clicks=0, min_impressions=0, store_scores=False, content_embeddings=None):
+        """Version asynchrone de iter_analyze_keywords (le calcul s'exécute selon le backend d'exécution)"""
+        async for event in self.execution_backend.iterate(
+            self.iter_analyze_keywords,
+            keywords_data,
+            similarity_threshold,
+            primary_keyword_only,
+            scraped_data,
+            min_clicks,
+            min_impressions,
+            store_scores,
+            content_embeddings
+        ):
+            yield event
+    
+    async def analyze_keywords_async(self, keywords_data, similarity_threshold=0.8, primary_keyword_only=False, scraped_data=None, min_clicks=0, min_impressions=0, compact_pairs=False, store_scores=False, content_embeddings=None):
         """
         Analyser les données de mots-clés pour trouver la cannibalisation de manière asynchrone
         
@@ -274,11 +1155,25 @@ class SimilarityAnalyzer:
             scraped_data: Données scrapées des pages (optionnel)
             min_clicks: Nombre minimum de clics pour inclure une URL dans l'analyse
             min_impressions: Nombre minimum d'impressions pour inclure une URL dans l'analyse
+            compact_pairs: Si True, les groupes référencent les paires de la table 'pair_scores'
+            store_scores: Si True, les scores bruts sont conservés pour rethreshold_analysis
+            content_embeddings: Embeddings de contenu déjà calculés (optionnel, voir iter_embed_pages_async)
         """
-        # Pour cette méthode, nous pouvons simplement appeler la méthode synchrone car le traitement est principalement CPU-bound
-        # et n'implique pas d'opérations d'I/O qui bénéficieraient de l'asynchronisme
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self.analyze_keywords, keywords_data, similarity_threshold, primary_keyword_only, scraped_data, min_clicks, min_impressions)
+        # Le traitement est CPU-bound: il est confié au backend d'exécution (thread, processus ou inline)
+        return await self.execution_backend.run(self.analyze_keywords, keywords_data, similarity_threshold, primary_keyword_only, scraped_data, min_clicks, min_impressions, compact_pairs, store_scores, content_embeddings)
+    
+    async def rethreshold_analysis_async(self, analysis_id, similarity_threshold, min_clicks=None, min_impressions=None, risk_margin=0.1, compact_pairs=False, histogram_bins=20):
+        """Version asynchrone de rethreshold_analysis"""
+        return await self.execution_backend.run(
+            self.rethreshold_analysis,
+            analysis_id,
+            similarity_threshold,
+            min_clicks,
+            min_impressions,
+            risk_margin,
+            compact_pairs,
+            histogram_bins
+        )
     
     def _identify_primary_keywords(self, keywords_data):
         """
@@ -287,25 +1182,8 @@ class SimilarityAnalyzer:
         Le mot-clé principal est celui qui génère le plus de clics pour une URL donnée.
         En cas d'égalité, on utilise le nombre d'impressions comme critère secondaire.
         """
-        # Regrouper les données par URL
-        url_to_keywords = defaultdict(list)
-        for data in keywords_data:
-            url = data['url']
-            url_to_keywords[url].append(data)
-        
-        # Pour chaque URL, trouver le mot-clé principal
-        url_to_primary_keyword = {}
-        for url, keywords in url_to_keywords.items():
-            # Trier par clics (ou impressions si pas de clics)
-            sorted_keywords = sorted(
-                keywords, 
-                key=lambda x: (x.get('clicks', 0), x.get('impressions', 0)), 
-                reverse=True
-            )
-            if sorted_keywords:
-                url_to_primary_keyword[url] = sorted_keywords[0]
-        
-        return url_to_primary_keyword
+        primary_frame = KeywordFrame.from_records(keywords_data).primary_keywords()
+        return {data['url']: data for data in primary_frame.to_records()}
     
     def _calculate_url_similarity(self, url1, url2):
         """Calculer une similarité simple basée sur les URLs"""
@@ -401,70 +1279,180 @@ class SimilarityAnalyzer:
         
         # Donner plus de poids aux éléments importants en les répétant
         content = f"{title} {title} {meta_description} {meta_description} {h1} {h1} {h2}"
-        return content.strip()
+        # Fichier de contenu envoyé (voir format_content_data): seulement le texte de la page
+        return content.strip() or scraped_data.get('content', '')
     
-    def _assess_risk(self, similarity, threshold):
-        """Évaluer le niveau de risque basé sur la similarité"""
-        if similarity >= threshold + 0.1:
+    def _assess_risk(self, similarity, threshold, margin=0.1):
+        """Évaluer le niveau de risque basé sur la similarité (niveaux espacés de margin autour du seuil)"""
+        if similarity >= threshold + margin:
             return "ÉLEVÉ"
         elif similarity >= threshold:
             return "MOYEN"
-        elif similarity >= threshold - 0.1:
+        elif similarity >= threshold - margin:
             return "FAIBLE"
         else:
             return "AUCUN"
     
-    def analyze_content_similarity(self, scraped_data):
-        """Analyser la similarité de contenu entre les pages scrapées"""
+    def analyze_content_similarity(self, scraped_data, top_k=None, min_similarity=None, block_size=1024):
+        """
+        Analyser la similarité de contenu entre les pages scrapées
+        
+        Args:
+            scraped_data: Données scrapées des pages
+            top_k: Si fourni, ne conserver que les k voisins les plus proches de chaque URL
+            min_similarity: Si fourni, ne conserver que les paires au-dessus de ce seuil
+            block_size: Taille des blocs de calcul en mode creux
+        
+        Returns:
+            Sans top_k ni min_similarity: matrice de similarité complète (DataFrame n x n).
+            Sinon: liste d'arêtes (DataFrame avec les colonnes url1, url2, similarity).
+        """
         urls = list(scraped_data.keys())
-        contents = []
+        pages = []
         
         for url in urls:
-            content = self._prepare_content_for_embedding(scraped_data[url])
-            contents.append(content)
+            passages = self._content_passages(scraped_data[url])
+            pages.append(passages or [("", 1)])
         
         # Calculer les embeddings
-        embeddings = self.compute_embeddings(contents)
-        
-        # Calculer la matrice de similarité
-        similarity_matrix = np.zeros((len(urls), len(urls)))
-        for i in range(len(urls)):
-            for j in range(len(urls)):
-                if i == j:
-                    similarity_matrix[i][j] = 1.0
-                else:
-                    similarity_matrix[i][j] = self.compute_similarity(embeddings[i], embeddings[j])
+        embeddings = self.compute_page_embeddings(pages)
         
-        # Créer un DataFrame pour faciliter l'analyse
-        df = pd.DataFrame(similarity_matrix, index=urls, columns=urls)
-        
-        return df
+        return self._content_similarity_frame(urls, embeddings, top_k, min_similarity, block_size)
     
-    async def analyze_content_similarity_async(self, scraped_data):
+    async def analyze_content_similarity_async(self, scraped_data, top_k=None, min_similarity=None, block_size=1024):
         """Analyser la similarité de contenu entre les pages scrapées de manière asynchrone"""
         urls = list(scraped_data.keys())
-        contents = []
+        pages = []
         
         for url in urls:
-            content = self._prepare_content_for_embedding(scraped_data[url])
-            contents.append(content)
+            passages = self._content_passages(scraped_data[url])
+            pages.append(passages or [("", 1)])
         
-        # Calculer les embeddings de manière asynchrone
-        embeddings = await self.compute_embeddings_async(contents)
+        # Calculer les embeddings de manière asynchrone (sentence-transformers n'est pas nativement asynchrone)
+        embeddings = await asyncio.get_running_loop().run_in_executor(None, self.compute_page_embeddings, pages)
         
-        # Calculer la matrice de similarité
-        similarity_matrix = np.zeros((len(urls), len(urls)))
-        for i in range(len(urls)):
-            for j in range(len(urls)):
-                if i == j:
-                    similarity_matrix[i][j] = 1.0
+        return await self.execution_backend.run(
+            self._content_similarity_frame, urls, embeddings, top_k, min_similarity, block_size
+        )
+    
+    def _content_similarity_frame(self, urls, embeddings, top_k, min_similarity, block_size):
+        """Construire le DataFrame de similarité (dense ou liste d'arêtes) à partir des embeddings"""
+        if top_k is None and min_similarity is None:
+            # Matrice dense: à réserver aux petits ensembles d'URLs (O(n²) en mémoire)
+            normalized = self._normalize_embeddings(embeddings)
+            similarity_matrix = (normalized @ normalized.T).astype(np.float64)
+            np.fill_diagonal(similarity_matrix, 1.0)
+            return pd.DataFrame(similarity_matrix, index=urls, columns=urls)
+        
+        rows, cols, similarities = self.compute_similarity_edges(
+            embeddings, top_k=top_k, min_similarity=min_similarity, block_size=block_size
+        )
+        urls = np.asarray(urls, dtype=object)
+        return pd.DataFrame({
+            'url1': urls[rows],
+            'url2': urls[cols],
+            'similarity': similarities
+        })
+    
+    def _normalize_embeddings(self, embeddings, dtype=np.float32):
+        """Normaliser les embeddings (norme L2), en float32 par défaut"""
+        matrix = np.asarray(embeddings, dtype=dtype)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def iter_similarity_blocks(self, embeddings, top_k=None, min_similarity=None, block_size=1024):
+        """
+        Parcourir les arêtes de similarité par blocs de lignes, sans matrice n x n
+        
+        Chaque bloc de lignes est comparé à la matrice par tuiles de block_size
+        colonnes: la mémoire de travail est bornée par block_size² (+ block_size x top_k).
+        
+        - Avec top_k: les k plus proches voisins de chaque URL (arêtes orientées i -> j),
+          éventuellement restreints à min_similarity.
+        - Avec min_similarity seul: toutes les paires i < j au-dessus du seuil.
+        
+        Yields:
+            Tuples (rows, cols, similarities) de tableaux NumPy pour chaque bloc de lignes
+        """
+        if top_k is None and min_similarity is None:
+            raise ValueError("top_k ou min_similarity doit être fourni pour le calcul par blocs")
+        
+        normalized = self._normalize_embeddings(embeddings)
+        n = len(normalized)
+        
+        for row_start in range(0, n, block_size):
+            row_end = min(row_start + block_size, n)
+            row_block = normalized[row_start:row_end]
+            row_ids = np.arange(row_start, row_end)
+            
+            if top_k is not None:
+                k = min(top_k, n - 1)
+                best_similarities = np.full((len(row_block), k), -np.inf, dtype=np.float32)
+                best_cols = np.full((len(row_block), k), -1, dtype=np.int64)
+                if k <= 0:
+                    continue
+            else:
+                block_rows, block_cols, block_similarities = [], [], []
+            
+            # En mode seuil, la symétrie permet de ne calculer que le triangle supérieur
+            col_origin = 0 if top_k is not None else row_start
+            for col_start in range(col_origin, n, block_size):
+                col_end = min(col_start + block_size, n)
+                tile = row_block @ normalized[col_start:col_end].T
+                col_ids = np.arange(col_start, col_end)
+                
+                if top_k is not None:
+                    # Exclure la similarité d'une URL avec elle-même
+                    tile[row_ids[:, None] == col_ids[None, :]] = -np.inf
+                    
+                    candidates = np.concatenate([best_similarities, tile], axis=1)
+                    candidate_cols = np.concatenate(
+                        [best_cols, np.broadcast_to(col_ids, tile.shape)], axis=1
+                    )
+                    keep = np.argpartition(-candidates, k - 1, axis=1)[:, :k]
+                    best_similarities = np.take_along_axis(candidates, keep, axis=1)
+                    best_cols = np.take_along_axis(candidate_cols, keep, axis=1)
                 else:
-                    similarity_matrix[i][j] = self.compute_similarity(embeddings[i], embeddings[j])
+                    mask = (tile >= min_similarity) & (row_ids[:, None] < col_ids[None, :])
+                    local_rows, local_cols = np.nonzero(mask)
+                    block_rows.append(row_ids[local_rows])
+                    block_cols.append(col_ids[local_cols])
+                    block_similarities.append(tile[local_rows, local_cols])
+            
+            if top_k is not None:
+                # Trier les voisins de chaque ligne par similarité décroissante
+                order = np.argsort(-best_similarities, axis=1)
+                best_similarities = np.take_along_axis(best_similarities, order, axis=1)
+                best_cols = np.take_along_axis(best_cols, order, axis=1)
+                
+                mask = best_cols >= 0
+                if min_similarity is not None:
+                    mask &= best_similarities >= min_similarity
+                local_rows, local_ranks = np.nonzero(mask)
+                yield row_ids[local_rows], best_cols[local_rows, local_ranks], best_similarities[local_rows, local_ranks]
+            else:
+                yield np.concatenate(block_rows), np.concatenate(block_cols), np.concatenate(block_similarities)
+    
+    def compute_similarity_edges(self, embeddings, top_k=None, min_similarity=None, block_size=1024):
+        """
+        Calculer la liste creuse (COO) des arêtes de similarité de contenu
+        
+        Returns:
+            Tuple (rows, cols, similarities) de tableaux NumPy
+        """
+        rows, cols, similarities = [], [], []
+        for block_rows, block_cols, block_similarities in self.iter_similarity_blocks(
+            embeddings, top_k=top_k, min_similarity=min_similarity, block_size=block_size
+        ):
+            rows.append(block_rows)
+            cols.append(block_cols)
+            similarities.append(block_similarities)
         
-        # Créer un DataFrame pour faciliter l'analyse
-        df = pd.DataFrame(similarity_matrix, index=urls, columns=urls)
+        if not rows:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float32)
         
-        return df
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(similarities)
     
     def generate_report(self, analysis_results):
         """Générer un rapport de cannibalisation"""
@@ -490,8 +1478,14 @@ class SimilarityAnalyzer:
                 'pairs': []
             }
             
+            # Les résultats compacts référencent les paires de la table partagée
+            if 'pair_ids' in group:
+                pairs = self._group_pairs(group, group['pair_ids'], analysis_results['pair_scores'].__getitem__)
+            else:
+                pairs = group['pairs']
+            
             # Ne garder que les paires avec une similarité au-dessus du seuil
-            for pair in group['pairs']:
+            for pair in pairs:
                 if pair['similarity'] >= analysis_results['similarity_threshold']:
                     report_group['pairs'].append(pair)
             
@@ -504,6 +1498,6 @@ class SimilarityAnalyzer:
     
     async def generate_report_async(self, analysis_results):
         """Générer un rapport de cannibalisation de manière asynchrone"""
-        # Cette méthode est légère en termes de calcul, donc nous pouvons simplement appeler la méthode synchrone
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self.generate_report, analysis_results)
+        # Cette méthode est légère en termes de calcul: en mode 'process', elle reste dans un thread
+        # car sérialiser les résultats vers un autre processus coûterait plus cher que le tri lui-même
+        return await self.execution_backend.run(self.generate_report, analysis_results)
@@ -0,0 +1,412 @@
+import io
+import os
+import csv
+import gzip
+import codecs
+import pandas as pd
+from server.services.keyword_frame import KeywordFrame
+from server.services.keyword_index import KeywordIndex
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow est optionnel: les fichiers Parquet et Arrow sont alors refusés
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard est optionnel: les fichiers compressés avec zstd sont alors refusés
+    zstandard = None
+
+# Taille de l'échantillon lu en tête de fichier pour détecter l'encodage, le séparateur et les colonnes
+SAMPLE_SIZE = 64 * 1024
+
+# Séparateurs reconnus, dans l'ordre de préférence en cas d'égalité
+DELIMITERS = (';', ',', '\t', '|')
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16')
+)
+
+# Signatures (premiers octets) des formats acceptés en plus du CSV
+MAGIC_NUMBERS = (
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),
+    (b'\xff\xff\xff\xff', 'arrow_stream'),
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd')
+)
+
+FORMAT_LABELS = {
+    'csv': 'CSV',
+    'gzip': 'CSV (gzip)',
+    'zstd': 'CSV (zstd)',
+    'parquet': 'Parquet',
+    'arrow': 'Arrow',
+    'arrow_stream': 'Arrow'
+}
+
+# Formats en colonnes typées, lus avec pyarrow
+ARROW_FORMATS = ('parquet', 'arrow', 'arrow_stream')
+
+# Mappings de colonnes possibles du fichier de mots-clés (pour différents formats d'export)
+KEYWORD_COLUMN_MAPPINGS = {
+    # Format attendu par défaut
+    'standard': {
+        'Mot-clé': 'keyword',
+        'URL': 'url',
+        'Position': 'position',
+        'Clics': 'clicks'
+    },
+    # Format Google Search Console
+    'gsc': {
+        'Query': 'keyword',
+        'Page': 'url',
+        'Position': 'position',
+        'Clicks': 'clicks'
+    }
+}
+
+# Mappings de colonnes possibles du fichier de contenu
+CONTENT_COLUMN_MAPPINGS = {
+    # Format attendu par défaut
+    'standard': {
+        'URL': 'url',
+        'Contenu': 'content'
+    },
+    # Format alternatif (en minuscules)
+    'alt': {
+        'url': 'url',
+        'content': 'content'
+    },
+    # Format spécifique avec Adresse et Extracteurs
+    'extracteur': {
+        'Adresse': 'url',
+        'Extracteur 1 1': 'content'
+    }
+}
+
+def open_upload(file):
+    """
+    Détecter le format d'un fichier envoyé d'après ses premiers octets
+    
+    Returns:
+        Tuple (format, flux à lire): le flux décompressé pour un CSV compressé (gzip, zstd),
+        le fichier lui-même (rembobiné) sinon
+    
+    Raises:
+        ValueError: Le module nécessaire au format (pyarrow, zstandard) n'est pas installé
+    """
+    file.seek(0)
+    head = file.read(8)
+    file.seek(0)
+    file_format = next((name for magic, name in MAGIC_NUMBERS if head.startswith(magic)), 'csv')
+    
+    if file_format in ARROW_FORMATS and pa is None:
+        raise ValueError(f"Fichier {FORMAT_LABELS[file_format]}: le module pyarrow n'est pas installé.")
+    if file_format == 'gzip':
+        return file_format, gzip.GzipFile(fileobj=file, mode='rb')
+    if file_format == 'zstd':
+        if zstandard is None:
+            raise ValueError("Fichier compressé avec zstd: le module zstandard n'est pas installé.")
+        return file_format, zstandard.ZstdDecompressor().stream_reader(file)
+    return file_format, file
+
+class _ReplayReader(io.RawIOBase):
+    """Flux non rembobinable précédé des octets déjà lus (l'échantillon de détection)"""
+    
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        if self.head:
+            size = min(len(buffer), len(self.head))
+            buffer[:size] = self.head[:size]
+            self.head = self.head[size:]
+            return size
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def sniff_csv(sample):
+    """
+    Détecter l'encodage, le séparateur et les colonnes d'un fichier CSV à partir de son début
+    
+    BOM éventuel, sinon UTF-8 s'il est valide, sinon cp1252 ou latin1; séparateur détecté
+    sur les premières lignes complètes.
+    
+    Args:
+        sample (bytes): Premiers octets du fichier (au plus SAMPLE_SIZE)
+    
+    Returns:
+        Dictionnaire {'encoding', 'sep', 'columns'}
+    """
+    encoding = _detect_encoding(sample)
+    # Le dernier caractère ou la dernière ligne de l'échantillon peuvent être tronqués
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+    if len(sample) == SAMPLE_SIZE and '\n' in text:
+        text = text[:text.rindex('\n')]
+    lines = text.splitlines()[:100]
+    if not lines:
+        raise ValueError("Le fichier CSV est vide.")
+    
+    sep = _detect_delimiter(lines)
+    columns = list(pd.read_csv(io.StringIO('\n'.join(lines)), sep=sep, nrows=0).columns)
+    return {'encoding': encoding, 'sep': sep, 'columns': columns}
+
+def _detect_encoding(sample):
+    """Encodage du fichier: BOM, sinon le premier encodage qui décode l'échantillon"""
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    for encoding in ('utf-8', 'cp1252'):
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            pass
+    # latin1 décode n'importe quel octet
+    return 'latin1'
+
+def _detect_delimiter(lines):
+    """Séparateur des lignes d'échantillon (csv.Sniffer, sinon le plus fréquent dans l'en-tête)"""
+    try:
+        return csv.Sniffer().sniff('\n'.join(lines), delimiters=''.join(DELIMITERS)).delimiter
+    except csv.Error:
+        return max(DELIMITERS, key=lines[0].count)
+
+def select_column_mapping(columns, mappings, label="CSV"):
+    """
+    Premier mapping de colonnes dont toutes les colonnes sont présentes
+    
+    Raises:
+        ValueError: Aucun mapping ne correspond (le message liste les formats acceptés)
+    """
+    for mapping_name, mapping in mappings.items():
+        if all(col in columns for col in mapping):
+            print(f"Utilisation du mapping de colonnes '{mapping_name}' ({label})")
+            return mapping
+    
+    # Aucun mapping ne correspond, afficher un message d'erreur détaillé
+    all_possible_columns = set()
+    for mapping in mappings.values():
+        all_possible_columns.update(mapping)
+    missing_columns = [col for col in all_possible_columns if col not in columns]
+    print(f"Colonnes manquantes ({label}): {missing_columns}")
+    
+    error_message = f"Format de fichier {label} non reconnu. Le fichier doit contenir l'un des ensembles de colonnes suivants :\n"
+    for mapping_name, mapping in mappings.items():
+        error_message += f"- Format {mapping_name}: {', '.join(mapping)}\n"
+    raise ValueError(error_message)
+
+def read_csv(file, mappings, label="CSV", mapped_columns_only=False, chunksize=None):
+    """
+    Lire un fichier CSV en une seule passe, avec l'encodage et le séparateur détectés
+    
+    Le mapping de colonnes est choisi d'après l'en-tête de l'échantillon, avant la lecture:
+    un fichier au format non reconnu est rejeté sans être analysé.
+    
+    Args:
+        file: Fichier binaire, au début des données (rembobiné après l'échantillon s'il le permet,
+            sinon l'échantillon est relu avant la suite: flux décompressé, par exemple)
+        mappings (dict): Mappings de colonnes possibles (voir select_column_mapping)
+        label (str): Nom du fichier dans les messages
+        mapped_columns_only (bool): Ne lire que les colonnes du mapping
+        chunksize (int): Si fourni, le fichier est lu par paquets de chunksize lignes
+    
+    Returns:
+        Tuple (DataFrame ou itérateur de DataFrames si chunksize est fourni, mapping de colonnes sélectionné)
+    """
+    sample = file.read(SAMPLE_SIZE)
+    if file.seekable():
+        file.seek(0)
+    else:
+        file = io.BufferedReader(_ReplayReader(sample, file))
+    dialect = sniff_csv(sample)
+    print(f"Colonnes trouvées ({label}): {dialect['columns']}")
+    mapping = select_column_mapping(dialect['columns'], mappings, label)
+    df = pd.read_csv(
+        file,
+        encoding=dialect['encoding'],
+        sep=dialect['sep'],
+        usecols=list(mapping) if mapped_columns_only else None,
+        on_bad_lines='skip',
+        # Un octet invalide après l'échantillon ne doit pas faire échouer toute la lecture
+        encoding_errors='replace',
+        chunksize=chunksize
+    )
+    if chunksize is None:
+        print(f"Fichier {label} lu avec l'encodage {dialect['encoding']} et le séparateur '{dialect['sep']}' ({len(df)} lignes)")
+    else:
+        print(f"Lecture du fichier {label} par paquets de {chunksize} lignes (encodage {dialect['encoding']}, séparateur '{dialect['sep']}')")
+    return df, mapping
+
+def read_table(file, file_format, mappings, label, mapped_columns_only=False, categorical=False):
+    """
+    Lire un fichier Parquet ou Arrow (IPC, fichier ou flux) avec pyarrow
+    
+    Les colonnes sont typées: ni encodage, ni séparateur, ni nombres à analyser. Le mapping
+    de colonnes est choisi d'après le schéma, avant la lecture des données.
+    
+    Args:
+        file: Fichier binaire positionnable
+        file_format (str): 'parquet', 'arrow' ou 'arrow_stream' (voir open_upload)
+        mappings (dict): Mappings de colonnes possibles (voir select_column_mapping)
+        label (str): Nom du fichier dans les messages
+        mapped_columns_only (bool): Ne lire que les colonnes du mapping
+        categorical (bool): Convertir les colonnes de texte en catégories (chaque chaîne
+            distincte n'est alors convertie qu'une fois)
+    
+    Returns:
+        Tuple (DataFrame, mapping de colonnes sélectionné)
+    """
+    if file_format == 'parquet':
+        source = pq.ParquetFile(file)
+        schema = source.schema_arrow
+    else:
+        source = pa.ipc.open_file(file) if file_format == 'arrow' else pa.ipc.open_stream(file)
+        schema = source.schema
+    print(f"Colonnes trouvées ({label}): {schema.names}")
+    mapping = select_column_mapping(schema.names, mappings, label)
+    
+    columns = list(mapping) if mapped_columns_only else None
+    if file_format == 'parquet':
+        if categorical:
+            # Colonnes de texte décodées directement en dictionnaire, sans chaîne par ligne
+            source = pq.ParquetFile(file, read_dictionary=[
+                field.name for field in schema
+                if (columns is None or field.name in columns) and (pa.types.is_string(field.type) or pa.types.is_large_string(field.type))
+            ])
+        table = source.read(columns=columns)
+    else:
+        table = source.read_all()
+        if columns:
+            table = table.select(columns)
+    df = table.to_pandas(strings_to_categorical=categorical)
+    print(f"Fichier {label} lu ({len(df)} lignes)")
+    return df, mapping
+
+def read_keywords_file(file, min_clicks=0, min_impressions=0, chunk_rows=None, chunked_min_bytes=None):
+    """
+    Lire le fichier de mots-clés (seules les colonnes du mapping sont analysées)
+    
+    Le fichier peut être un CSV, un CSV compressé (gzip, zstd), un fichier Parquet ou Arrow
+    (voir open_upload). Quel que soit le format, les lignes sont filtrées (URLs contenant
+    un #, min_clicks, min_impressions) puis ajoutées à un KeywordIndex, qui agrège les
+    couples mot-clé / URL en double: le résultat ne dépend ni du format ni de la taille du
+    fichier. Un CSV d'au moins chunked_min_bytes octets, ou compressé (sa taille décompressée
+    n'est pas connue), est lu par paquets de chunk_rows lignes: la mémoire est alors bornée
+    par le nombre de couples retenus, et non par la taille du fichier.
+    
+    Args:
+        file: Fichier binaire positionnable
+        min_clicks (int): Nombre minimum de clics d'une ligne
+        min_impressions (int): Nombre minimum d'impressions d'une ligne
+        chunk_rows (int): Nombre de lignes par paquet (par défaut: CSV_CHUNK_ROWS, 100000)
+        chunked_min_bytes (int): Taille à partir de laquelle le fichier est lu par paquets
+            (par défaut: CSV_CHUNKED_MIN_BYTES, 64 Mo)
+    
+    Returns:
+        KeywordFrame des couples mot-clé / URL, dans l'ordre de leur première ligne dans le fichier
+    """
+    chunk_rows = chunk_rows or int(os.getenv('CSV_CHUNK_ROWS', 100000))
+    if chunked_min_bytes is None:
+        chunked_min_bytes = int(os.getenv('CSV_CHUNKED_MIN_BYTES', 64 * 1024 * 1024))
+    file_format, stream = open_upload(file)
+    label = FORMAT_LABELS[file_format]
+    
+    if file_format in ARROW_FORMATS:
+        df, mapping = read_table(file, file_format, KEYWORD_COLUMN_MAPPINGS, label, mapped_columns_only=True, categorical=True)
+        return _aggregate_keywords([_to_keyword_frame(df, mapping)], min_clicks, min_impressions)
+    
+    if file_format == 'csv':
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(0)
+        if size < chunked_min_bytes:
+            df, mapping = read_csv(file, KEYWORD_COLUMN_MAPPINGS, label, mapped_columns_only=True)
+            return _aggregate_keywords([_to_keyword_frame(df, mapping)], min_clicks, min_impressions)
+    
+    chunks, mapping = read_csv(stream, KEYWORD_COLUMN_MAPPINGS, label, mapped_columns_only=True, chunksize=chunk_rows)
+    with chunks:
+        return _aggregate_keywords((_to_keyword_frame(chunk, mapping) for chunk in chunks), min_clicks, min_impressions)
+
+def _aggregate_keywords(frames, min_clicks, min_impressions):
+    """Filtrer chaque paquet de lignes (KeywordFrame) puis agréger les couples mot-clé / URL dans un KeywordIndex"""
+    keyword_index = KeywordIndex()
+    rows = 0
+    for frame in frames:
+        rows += len(frame)
+        keyword_index.add(frame.filter(min_clicks, min_impressions))
+    print(f"{rows} lignes lues, {keyword_index.rows} retenues, {len(keyword_index)} couples mot-clé/URL distincts")
+    return keyword_index.to_frame(sort=False)
+
+def _to_keyword_frame(df, mapping):
+    """KeywordFrame des colonnes renommées selon le mapping"""
+    try:
+        return KeywordFrame.from_dataframe(df.rename(columns=mapping))
+    except Exception as e:
+        print(f"Erreur lors de la conversion du DataFrame: {str(e)}")
+        raise ValueError(f"Erreur lors du traitement des données CSV: {str(e)}")
+
+def read_content_file(file):
+    """
+    Lire le fichier de contenu (CSV, CSV compressé, Parquet ou Arrow: voir open_upload)
+    
+    Returns:
+        Dictionnaire URL -> contenu (colonne de contenu suivie des autres colonnes non vides)
+    """
+    file_format, stream = open_upload(file)
+    label = f"de contenu {FORMAT_LABELS[file_format]}"
+    if file_format in ARROW_FORMATS:
+        content_df, selected_content_mapping = read_table(file, file_format, CONTENT_COLUMN_MAPPINGS, label)
+    else:
+        content_df, selected_content_mapping = read_csv(stream, CONTENT_COLUMN_MAPPINGS, label)
+    
+    # Déterminer les noms de colonnes réels à utiliser
+    url_column = next(old_col for old_col, new_col in selected_content_mapping.items() if new_col == 'url')
+    content_column = next(old_col for old_col, new_col in selected_content_mapping.items() if new_col == 'content')
+    content_data = assemble_content(content_df, url_column, content_column)
+    print(f"Nombre d'URLs avec contenu: {len(content_data)}")
+    return content_data
+
+def assemble_content(content_df, url_column, content_column):
+    """
+    Contenu de chaque URL: la colonne de contenu (vide si absente) suivie des valeurs non vides
+    des autres colonnes (extracteurs supplémentaires), séparées par des espaces
+    
+    L'assemblage est fait colonne par colonne, sans boucle sur les lignes. Si une URL apparaît
+    plusieurs fois, la dernière ligne est retenue.
+    
+    Returns:
+        Dictionnaire URL -> contenu
+    """
+    content = content_df[content_column]
+    parts = [content.astype(object).where(content.notna(), '').astype(str)]
+    for column in content_df.columns:
+        if column in (url_column, content_column):
+            continue
+        values = content_df[column]
+        parts.append((' ' + values.astype(str)).where(values.notna(), ''))
+    contents = parts[0].str.cat(parts[1:]) if len(parts) > 1 else parts[0]
+    return dict(zip(content_df[url_column].tolist(), contents.tolist()))
+
+def format_content_data(content_data):
+    """Convertir les données de contenu fournies au format des pages scrapées attendu par le service d'analyse"""
+    return {
+        url: {
+            'title': "",  # Par défaut, titre vide
+            'meta_description': "",  # Par défaut, meta description vide
+            'h1': [],  # Par défaut, h1 vide
+            'h2': [],  # Par défaut, h2 vide
+            'content': content  # Le contenu fusionné
+        }
+        for url, content in content_data.items()
+    }
@@ -0,0 +1,36 @@
+import numpy as np
+
+from server.services.embedding_cache import EmbeddingCache
+
+
+def reopen(cache, cache_dir):
+    """Simuler un nouveau lancement: libérer le verrou du répertoire et recharger le cache"""
+    cache._lock_file.close()
+    return EmbeddingCache(cache_dir, 'model', max_entries=2)
+
+
+def test_eviction_without_flush_does_not_serve_overwritten_vectors(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model', max_entries=2)
+    cache.put_many(['a', 'b'], np.array([[1, 1], [3, 3]], dtype=np.float32))
+    cache.flush()
+    # Le cache est plein: 'c' prend l'emplacement de 'a', sans flush avant l'arrêt
+    cache.put_many(['c'], np.array([[5, 5]], dtype=np.float32))
+    
+    cache = reopen(cache, str(tmp_path))
+    found, missing = cache.get_many(['a', 'b', 'c'])
+    assert missing == [0, 2]
+    np.testing.assert_array_equal(found[1], [3, 3])
+
+
+def test_flush_after_eviction_keeps_the_new_entry(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model', max_entries=2)
+    cache.put_many(['a', 'b'], np.array([[1, 1], [3, 3]], dtype=np.float32))
+    cache.flush()
+    cache.put_many(['c'], np.array([[5, 5]], dtype=np.float32))
+    cache.flush()
+    
+    cache = reopen(cache, str(tmp_path))
+    found, missing = cache.get_many(['a', 'b', 'c'])
+    assert missing == [0]
+    np.testing.assert_array_equal(found[1], [3, 3])
+    np.testing.assert_array_equal(found[2], [5, 5])